@@ -69,9 +69,109 @@ INSTALLED_APPS = [
 CELERY_BROKER_URL = 'redis://redis:6379/0'  # nome do serviço no docker-compose
 CELERY_TIMEZONE = 'America/Sao_Paulo'
 
+# Cache (dados de referência e fragmentos, ver manutencao/cache.py): Redis quando
+# REDIS_CACHE_URL existe; senão memória local, que é por processo — a invalidação
+# não chega aos outros workers, por isso o TIMEOUT curto (serve para desenvolvimento)
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL', '')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '3600')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '60')),
+        }
+    }
+
+# Painel de gestão aberto em várias telas: o estado é calculado no máximo uma vez a
+# cada N segundos (ou quando algo muda) e servido igual para todas (manutencao/painel.py)
+PAINEL_SNAPSHOT_SEGUNDOS = int(os.getenv('PAINEL_SNAPSHOT_SEGUNDOS', '10'))
+
+# Eventos ao vivo dos dashboards (SSE, ver manutencao/eventos.py): Redis pub/sub como
+# barramento entre quem grava (web, Celery) e o servidor ASGI. Vazio desliga
+EVENTOS_REDIS_URL = os.getenv('EVENTOS_REDIS_URL', REDIS_CACHE_URL)
+
+# Rotinas preventivas: fatias processadas em paralelo e política para execuções perdidas
+ROTINAS_SHARDS = int(os.getenv('ROTINAS_SHARDS', '4'))
+ROTINAS_POLITICA_ATRASO = os.getenv('ROTINAS_POLITICA_ATRASO', 'todas')  # 'todas' ou 'ultima'
+ROTINAS_MAX_ATRASADAS = int(os.getenv('ROTINAS_MAX_ATRASADAS', '31'))  # teto de chamados atrasados por rotina
+ROTINAS_HORIZONTE_DIAS = int(os.getenv('ROTINAS_HORIZONTE_DIAS', '90'))  # alcance do calendário de ocorrências
+
+# Paginação das listas de chamados: 'paginas' (número de página + COUNT) ou 'cursor'
+# (keyset: página N custa o mesmo que a 1). Contagem 'estimada' usa o EXPLAIN do PostgreSQL.
+PAGINACAO_MODO = os.getenv('PAGINACAO_MODO', 'paginas')
+PAGINACAO_CONTAGEM = os.getenv('PAGINACAO_CONTAGEM', 'exata')
+
+# Indicadores (MTTR, MTBF, parada): dias recalculados a cada execução do Celery
+INDICADORES_JANELA_DIAS = int(os.getenv('INDICADORES_JANELA_DIAS', '2'))
+
+# Outbox de notificações (ntfy) drenado pelo Celery
+NOTIFICACOES_LOTE = int(os.getenv('NOTIFICACOES_LOTE', '50'))
+NOTIFICACOES_MAX_TENTATIVAS = int(os.getenv('NOTIFICACOES_MAX_TENTATIVAS', '6'))
+NOTIFICACOES_BACKOFF_SEGUNDOS = 30  # 30s, 60s, 120s... até o máximo abaixo
+NOTIFICACOES_BACKOFF_MAXIMO_SEGUNDOS = 3600
+NOTIFICACOES_LEASE_SEGUNDOS = 300  # tempo que um lote fica reservado para um worker (sempre > NOTIFICACOES_TIMEOUT)
+
+# Backend de entrega: NtfyBackend (HTTP com pool keep-alive), MemoriaBackend ou ArquivoBackend
+NOTIFICACOES_BACKEND = os.getenv('NOTIFICACOES_BACKEND', 'manutencao.notificacoes.NtfyBackend')
+NOTIFICACOES_ARQUIVO = os.getenv('NOTIFICACOES_ARQUIVO', os.path.join(BASE_DIR, 'notificacoes.jsonl'))
+NOTIFICACOES_TIMEOUT = 10
+NOTIFICACOES_POOL_TAMANHO = int(os.getenv('NOTIFICACOES_POOL_TAMANHO', '20'))
+NOTIFICACOES_MAX_PARALELO = int(os.getenv('NOTIFICACOES_MAX_PARALELO', '8'))  # envios simultâneos por processo
+NOTIFICACOES_PRAZO_LOTE_SEGUNDOS = 15  # tempo máximo de espera por um lote inteiro
+NTFY_BASE_URL = os.getenv('NTFY_BASE_URL', 'https://ntfy.sh')
+NTFY_TOPICO_PREFIXO = os.getenv('NTFY_TOPICO_PREFIXO', 'manutencao_lynd')
+
+# Métricas por requisição (manutencao/metricas.py): consultas, tempo no banco e em
+# Python, bytes e consultas lentas por view, em /metricas/ (Prometheus) e no log JSON
+METRICAS_CONSULTA_LENTA_MS = int(os.getenv('METRICAS_CONSULTA_LENTA_MS', '200'))
+METRICAS_INTERVALO_SEGUNDOS = int(os.getenv('METRICAS_INTERVALO_SEGUNDOS', '10'))  # descarga dos contadores no cache
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')  # "Authorization: Bearer <token>" do Prometheus
+# Passou do orçamento: loga como warning; com ESTRITO o excesso de consultas vira erro
+# (os testes ligam com override_settings, em DadosChamadosMixin)
+METRICAS_ORCAMENTO_ESTRITO = os.getenv('METRICAS_ORCAMENTO_ESTRITO', 'False') == 'True'
+METRICAS_ORCAMENTOS = {
+    # nome da rota: {'consultas': máximo por requisição (com sessão e usuário), 'ms': tempo total}
+    'mecanico_dashboard': {'consultas': 4, 'ms': 300},
+    'dashboard_admin_manutencao': {'consultas': 10, 'ms': 300},
+    'fragmentos_chamados': {'consultas': 10, 'ms': 300},  # no admin, o retrato do painel pode ter expirado
+    'solicitante_dashboard': {'consultas': 5, 'ms': 300},
+    'historicos': {'consultas': 8, 'ms': 500},
+    'historico_equipamento': {'consultas': 7, 'ms': 500},
+    'historico_setor': {'consultas': 7, 'ms': 500},
+    'busca': {'consultas': 5, 'ms': 500},
+    'indicadores': {'consultas': 4, 'ms': 500},
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'manutencao.metricas.FormatadorJSON'},
+    },
+    'handlers': {
+        'metricas': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'manutencao.metricas': {
+            'handlers': ['metricas'],
+            # INFO = uma linha por requisição; WARNING = só consultas lentas e orçamentos
+            'level': os.getenv('METRICAS_LOG_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_USER_MODEL = 'manutencao.Usuario'
 
 MIDDLEWARE = [
+    'manutencao.metricas.MetricasMiddleware',  # primeiro: mede a requisição inteira
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -162,13 +262,33 @@ LOGOUT_REDIRECT_URL = 'login'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Quem entrega os bytes das fotos depois da checagem de login:
+# 'django' -> o próprio gunicorn (desenvolvimento)
+# 'nginx'  -> X-Accel-Redirect; o nginx precisa de uma location interna apontando para o MEDIA_ROOT:
+#     location /media-interna/ { internal; alias /app/media/; }
+MEDIA_SERVIDOR = os.getenv('MEDIA_SERVIDOR', 'django')
+MEDIA_ACCEL_PREFIXO = os.getenv('MEDIA_ACCEL_PREFIXO', '/media-interna/')
+
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760
+# Checkpoint do backfill de imagens (manage.py compactar_imagens)
+IMAGENS_CHECKPOINT = os.path.join(MEDIA_ROOT, '.compactar_imagens.json')
+
+# Uploads de arquivo vão sempre direto para um arquivo temporário em disco
+# (nada de segurar fotos de 10MB na memória de cada thread do gunicorn)
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR') or None
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760
 
+# Resolução máxima aceita no upload (só o cabeçalho é lido para validar)
+IMAGENS_MAX_PIXELS = 50_000_000
+
+# Cache em disco das miniaturas geradas sob demanda (media/derivados/)
+DERIVADOS_LIMITE_BYTES = int(os.getenv('DERIVADOS_LIMITE_BYTES', str(500 * 1024 * 1024)))
+
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 USE_X_FORWARDED_HOST = True
 
@@ -1,7 +1,7 @@
 # ==================== ADMIN.PY ====================
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Setor, Equipamento, Chamado, ImagemChamado , Energia
+from .models import Usuario, Setor, Equipamento, Chamado, ImagemChamado , Energia, NotificacaoOutbox, ArquivoMidia
 
 @admin.register(Usuario)
 class UsuarioAdmin(UserAdmin):
@@ -34,7 +34,30 @@ class ChamadoAdmin(admin.ModelAdmin):
 
 @admin.register(ImagemChamado)
 class ImagemChamadoAdmin(admin.ModelAdmin):
-    list_display = ['id', 'chamado', 'descricao', 'enviado_em']
-    list_filter = ['enviado_em']
+    list_display = ['id', 'chamado', 'descricao', 'enviado_em', 'processada']
+    list_filter = ['enviado_em', 'processada']
 
-admin.site.register(Energia)
\ No newline at end of file
+admin.site.register(Energia)
+
+
+@admin.register(NotificacaoOutbox)
+class NotificacaoOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'chamado', 'mecanico', 'status', 'tentativas', 'proxima_tentativa', 'enviado_em']
+    list_filter = ['status', 'tipo']
+    search_fields = ['topico', 'ultimo_erro']
+    actions = ['reenfileirar']
+
+    @admin.action(description='Reenfileirar notificações selecionadas')
+    def reenfileirar(self, request, queryset):
+        from django.utils import timezone
+        total = queryset.exclude(status='enviado').update(
+            status='pendente', tentativas=0, proxima_tentativa=timezone.now()
+        )
+        self.message_user(request, f"{total} notificação(ões) reenfileirada(s).")
+
+
+@admin.register(ArquivoMidia)
+class ArquivoMidiaAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'tamanho', 'referencias', 'criado_em']
+    search_fields = ['hash_sha256', 'nome']
+    readonly_fields = ['hash_sha256', 'nome', 'tamanho', 'referencias', 'criado_em']
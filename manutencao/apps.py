@@ -6,9 +6,15 @@ class ManutencaoConfig(AppConfig):
     name = 'manutencao'
 
     def ready(self):
+        from . import signals  # noqa: F401 (registra os receivers)
+
         if any(cmd in sys.argv for cmd in ['migrate', 'makemigrations', 'collectstatic', 'shell']):
             return
         self._registrar_schedule_rotinas()
+        self._registrar_schedule_notificacoes()
+        self._registrar_schedule_derivados()
+        self._registrar_schedule_calendario_rotinas()
+        self._registrar_schedule_indicadores()
 
     def _registrar_schedule_rotinas(self):
         try:
@@ -30,3 +36,86 @@ class ManutencaoConfig(AppConfig):
             )
         except Exception:
             pass  # Ignora se o banco ainda não existir (primeiro migrate)
+
+    def _registrar_schedule_notificacoes(self):
+        try:
+            from django_celery_beat.models import PeriodicTask, IntervalSchedule
+            import json
+
+            # Rede de segurança do outbox: drena o que ficou para trás
+            # (broker fora do ar no commit, reenvios com backoff etc.)
+            schedule, _ = IntervalSchedule.objects.get_or_create(
+                every=1, period=IntervalSchedule.MINUTES
+            )
+            PeriodicTask.objects.get_or_create(
+                name='Drenar Outbox de Notificações',
+                defaults={
+                    'interval': schedule,
+                    'task': 'manutencao.tasks.drenar_notificacoes',
+                    'args': json.dumps([]),
+                }
+            )
+        except Exception:
+            pass  # Ignora se o banco ainda não existir (primeiro migrate)
+
+    def _registrar_schedule_derivados(self):
+        try:
+            from django_celery_beat.models import PeriodicTask, CrontabSchedule
+            import json
+
+            # Limpeza do cache de miniaturas, todo dia às 03:00
+            schedule, _ = CrontabSchedule.objects.get_or_create(
+                hour=3, minute=0,
+                timezone='America/Sao_Paulo'
+            )
+            PeriodicTask.objects.get_or_create(
+                name='Limpar Cache de Miniaturas',
+                defaults={
+                    'crontab': schedule,
+                    'task': 'manutencao.tasks.limpar_cache_derivados',
+                    'args': json.dumps([]),
+                }
+            )
+        except Exception:
+            pass  # Ignora se o banco ainda não existir (primeiro migrate)
+
+    def _registrar_schedule_calendario_rotinas(self):
+        try:
+            from django_celery_beat.models import PeriodicTask, CrontabSchedule
+            import json
+
+            # Empurra o horizonte do calendário de rotinas, todo dia às 00:30
+            schedule, _ = CrontabSchedule.objects.get_or_create(
+                hour=0, minute=30,
+                timezone='America/Sao_Paulo'
+            )
+            PeriodicTask.objects.get_or_create(
+                name='Reconstruir Calendário de Rotinas',
+                defaults={
+                    'crontab': schedule,
+                    'task': 'manutencao.tasks.reconstruir_calendario_rotinas',
+                    'args': json.dumps([]),
+                }
+            )
+        except Exception:
+            pass  # Ignora se o banco ainda não existir (primeiro migrate)
+
+    def _registrar_schedule_indicadores(self):
+        try:
+            from django_celery_beat.models import PeriodicTask, IntervalSchedule
+            import json
+
+            # Rollups de KPIs dos últimos dias, a cada 15 minutos
+            schedule, _ = IntervalSchedule.objects.get_or_create(
+                every=15, period=IntervalSchedule.MINUTES
+            )
+            PeriodicTask.objects.get_or_create(
+                name='Atualizar Indicadores de Manutenção',
+                defaults={
+                    'interval': schedule,
+                    'task': 'manutencao.tasks.atualizar_indicadores',
+                    'args': json.dumps([]),
+                }
+            )
+        except Exception:
+            pass  # Ignora se o banco ainda não existir (primeiro migrate)
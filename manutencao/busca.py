@@ -0,0 +1,253 @@
+# manutencao/busca.py
+import re
+
+from django.apps import apps as apps_globais
+from django.db import connection, transaction
+from django.db.models import Q
+
+# Tabela FTS5 usada quando o banco é SQLite (criada na migration 0016)
+TABELA_FTS = 'manutencao_documentobusca_fts'
+
+# Trigramas: abaixo disso o título não conta como parecido (padrão do pg_trgm é 0.3)
+LIMIAR_SIMILARIDADE = 0.3
+
+
+# ==================== MONTAGEM DOS DOCUMENTOS ====================
+
+def _juntar(*partes):
+    return ' '.join(str(parte) for parte in partes if parte)
+
+
+def documento_equipamento(eq, DocumentoBusca):
+    energia = eq.energia.numero if eq.energia_id else ''
+    return DocumentoBusca(
+        tipo='equipamento',
+        objeto_id=eq.id,
+        titulo=_juntar(eq.nome, eq.codigo)[:300],
+        conteudo=_juntar(eq.descricao, eq.setor.nome, eq.setor.energia.numero, energia),
+        equipamento_id=eq.id,
+        setor_id=eq.setor_id,
+    )
+
+
+def documento_chamado(chamado, DocumentoBusca):
+    if chamado.equipamento_id:
+        local = chamado.equipamento.nome
+        setor_id = chamado.equipamento.setor_id
+    else:
+        local = chamado.setor_avulso.nome if chamado.setor_avulso_id else 'Sem local'
+        setor_id = chamado.setor_avulso_id
+    concluido_por = ''
+    if chamado.concluido_por_id:
+        # Campos direto (os modelos históricos da migration não têm get_full_name)
+        usuario = chamado.concluido_por
+        concluido_por = _juntar(usuario.first_name, usuario.last_name) or usuario.username
+    return DocumentoBusca(
+        tipo='chamado',
+        objeto_id=chamado.id,
+        titulo=f"Chamado #{chamado.id} - {local}"[:300],
+        conteudo=_juntar(chamado.descricao, chamado.observacoes_mecanico, concluido_por),
+        equipamento_id=chamado.equipamento_id,
+        setor_id=setor_id,
+    )
+
+
+def _gravar(documentos, DocumentoBusca):
+    # Upsert pela chave (tipo, objeto_id): reindexar é sempre seguro
+    DocumentoBusca.objects.bulk_create(
+        documentos,
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=['titulo', 'conteudo', 'equipamento', 'setor', 'atualizado_em'],
+    )
+
+
+def _indexar(queryset, montar, apps, lote):
+    DocumentoBusca = apps.get_model('manutencao', 'DocumentoBusca')
+    documentos = []
+    total = 0
+    for objeto in queryset.iterator(chunk_size=lote):
+        documentos.append(montar(objeto, DocumentoBusca))
+        if len(documentos) >= lote:
+            _gravar(documentos, DocumentoBusca)
+            total += len(documentos)
+            documentos = []
+    if documentos:
+        _gravar(documentos, DocumentoBusca)
+        total += len(documentos)
+    return total
+
+
+def indexar_equipamentos(ids=None, apps=None, lote=500):
+    """(Re)indexa os equipamentos informados (None = todos). Devolve quantos foram gravados."""
+    apps = apps or apps_globais
+    equipamentos = apps.get_model('manutencao', 'Equipamento').objects.select_related('setor__energia', 'energia')
+    if ids is not None:
+        equipamentos = equipamentos.filter(id__in=list(ids))
+    return _indexar(equipamentos, documento_equipamento, apps, lote)
+
+
+def indexar_chamados(ids=None, apps=None, lote=500):
+    """(Re)indexa os chamados informados (None = todos). Devolve quantos foram gravados."""
+    apps = apps or apps_globais
+    chamados = apps.get_model('manutencao', 'Chamado')._base_manager.select_related(
+        'equipamento', 'setor_avulso', 'concluido_por'
+    )
+    if ids is not None:
+        chamados = chamados.filter(id__in=list(ids))
+    return _indexar(chamados, documento_chamado, apps, lote)
+
+
+def remover_documentos(tipo, ids):
+    apps_globais.get_model('manutencao', 'DocumentoBusca').objects.filter(tipo=tipo, objeto_id__in=list(ids)).delete()
+
+
+INDEXADORES = {
+    'equipamento': indexar_equipamentos,
+    'chamado': indexar_chamados,
+}
+
+
+def agendar_indexacao(tipo, ids):
+    """Reindexa depois do COMMIT (ids None/vazios são ignorados)."""
+    ids = {id_ for id_ in ids if id_}
+    if ids:
+        transaction.on_commit(lambda: INDEXADORES[tipo](ids))
+
+
+def agendar_remocao(tipo, ids):
+    ids = {id_ for id_ in ids if id_}
+    if ids:
+        transaction.on_commit(lambda: remover_documentos(tipo, ids))
+
+
+# ==================== CONSULTA ====================
+
+def _tokens(termo):
+    return re.findall(r'\w+', termo or '')
+
+
+def _limite(limite, parametros):
+    # limite None: sem LIMIT (filtro id__in de listagem paginada não pode perder linhas)
+    if limite is None:
+        return ''
+    parametros.append(limite)
+    return 'LIMIT %s'
+
+
+def consulta_prefixos(termo):
+    """
+    tsquery com cada palavra como prefixo ("cmp:* & 45:*"): código ou número de
+    poste pela metade ainda acha o equipamento, como no FTS5 e no icontains antigo.
+    Os tokens são só letras, dígitos e _, então nada do usuário vira operador do tsquery.
+    """
+    return ' & '.join(f'{token}:*' for token in _tokens(termo))
+
+
+def _buscar_postgres(termo, tipos, setor_id, limite, DocumentoBusca):
+    # Texto completo por prefixo (coluna vetor + GIN) ou título parecido (pg_trgm, pega erro de digitação)
+    filtros, parametros = [], [termo, consulta_prefixos(termo), termo]
+    if tipos:
+        filtros.append('AND d.tipo = ANY(%s)')
+        parametros.append(list(tipos))
+    if setor_id:
+        filtros.append('AND d.setor_id = %s')
+        parametros.append(setor_id)
+    limite_sql = _limite(limite, parametros)
+    sql = f"""
+        SELECT d.id, ts_rank_cd(d.vetor, q) + similarity(d.titulo, %s) AS rank
+          FROM {DocumentoBusca._meta.db_table} d, to_tsquery('portuguese', %s) q
+         WHERE (d.vetor @@ q OR d.titulo %% %s) {' '.join(filtros)}
+         ORDER BY rank DESC, d.id DESC
+         {limite_sql}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL pg_trgm.similarity_threshold = {LIMIAR_SIMILARIDADE}")
+        cursor.execute(sql, parametros)
+        return cursor.fetchall()
+
+
+def _buscar_sqlite(termo, tipos, setor_id, limite, DocumentoBusca):
+    # Cada palavra vira um prefixo entre aspas ("bomb"* acha "bomba"): nada do usuário vira sintaxe FTS
+    consulta = ' '.join(f'"{token}"*' for token in _tokens(termo))
+    filtros, parametros = [], [consulta]
+    if tipos:
+        filtros.append(f"AND d.tipo IN ({', '.join(['%s'] * len(tipos))})")
+        parametros.extend(tipos)
+    if setor_id:
+        filtros.append('AND d.setor_id = %s')
+        parametros.append(setor_id)
+    limite_sql = _limite(limite, parametros)
+    # bm25 é menor quanto mais relevante; o título pesa mais que o conteúdo
+    sql = f"""
+        SELECT d.id, -bm25({TABELA_FTS}, 10.0, 1.0) AS rank
+          FROM {TABELA_FTS}
+          JOIN {DocumentoBusca._meta.db_table} d ON d.id = {TABELA_FTS}.rowid
+         WHERE {TABELA_FTS} MATCH %s {' '.join(filtros)}
+         ORDER BY rank DESC, d.id DESC
+         {limite_sql}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.fetchall()
+
+
+def _buscar_generico(termo, tipos, setor_id, limite, DocumentoBusca):
+    # Sem índice de texto: todas as palavras precisam aparecer no título ou no conteúdo
+    documentos = DocumentoBusca.objects.all()
+    for token in _tokens(termo):
+        documentos = documentos.filter(Q(titulo__icontains=token) | Q(conteudo__icontains=token))
+    if tipos:
+        documentos = documentos.filter(tipo__in=tipos)
+    if setor_id:
+        documentos = documentos.filter(setor_id=setor_id)
+    return [(id_, 0) for id_ in documentos.order_by('-atualizado_em', '-id').values_list('id', flat=True)[:limite]]
+
+
+def _tem_fts_sqlite():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [TABELA_FTS])
+        return cursor.fetchone() is not None
+
+
+def _linhas(termo, tipos, setor_id, limite, DocumentoBusca):
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():  # SET LOCAL só vale dentro da transação
+            return _buscar_postgres(termo, tipos, setor_id, limite, DocumentoBusca)
+    if connection.vendor == 'sqlite' and _tem_fts_sqlite():
+        return _buscar_sqlite(termo, tipos, setor_id, limite, DocumentoBusca)
+    return _buscar_generico(termo, tipos, setor_id, limite, DocumentoBusca)
+
+
+def buscar(termo, tipos=None, setor_id=None, limite=50):
+    """
+    Busca ranqueada no índice. Devolve DocumentoBusca em ordem de relevância,
+    cada um com o atributo `rank`.
+    PostgreSQL: tsvector (dicionário portuguese, palavras como prefixo) + similaridade de trigramas.
+    SQLite: FTS5 com bm25. Outros bancos: icontains, sem ranking.
+    """
+    if not _tokens(termo):
+        return []
+    DocumentoBusca = apps_globais.get_model('manutencao', 'DocumentoBusca')
+    linhas = _linhas(termo, tipos, setor_id, limite, DocumentoBusca)
+
+    documentos = DocumentoBusca.objects.select_related('equipamento', 'setor').in_bulk([id_ for id_, _ in linhas])
+    resultado = []
+    for id_, rank in linhas:
+        if id_ in documentos:
+            documentos[id_].rank = rank
+            resultado.append(documentos[id_])
+    return resultado
+
+
+def buscar_ids(termo, tipo, limite=None):
+    """
+    Só os ids dos objetos encontrados (ex.: equipamentos), em ordem de relevância.
+    Sem limite por padrão: o resultado vira filtro id__in de listas paginadas.
+    """
+    if not _tokens(termo):
+        return []
+    DocumentoBusca = apps_globais.get_model('manutencao', 'DocumentoBusca')
+    linhas = _linhas(termo, [tipo], None, limite, DocumentoBusca)
+    objeto_ids = dict(DocumentoBusca.objects.filter(id__in=[id_ for id_, _ in linhas]).values_list('id', 'objeto_id'))
+    return [objeto_ids[id_] for id_, _ in linhas if id_ in objeto_ids]
@@ -0,0 +1,196 @@
+# manutencao/cache.py
+import json
+import time
+import zlib
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Equipamento, Setor, Usuario
+
+PREFIXO = 'manutencao'
+
+# Cada valor em cache depende de um ou mais "namespaces". Invalidar um namespace
+# só incrementa a versão dele: as chaves antigas deixam de ser lidas e expiram
+# sozinhas (nada de varrer o Redis atrás de chaves).
+# Além destes há um por setor e um por equipamento (ns_setor/ns_equipamento),
+# usados nas APIs JSON e nos ETags.
+NAMESPACES = ('setores', 'equipamentos', 'energias', 'usuarios', 'chamados')
+
+# Nomes que aparecem nas estatísticas (os fragmentos de template entram ao serem usados)
+NOMES = {'setores_ordenados', 'mecanicos', 'setores_com_equipamentos', 'contagens'}
+
+_AUSENTE = object()
+
+
+def _chave_versao(namespace):
+    return f'{PREFIXO}:versao:{namespace}'
+
+
+def versoes(namespaces):
+    """Versão atual de cada namespace, numa ida só ao cache."""
+    chaves = {_chave_versao(ns): ns for ns in namespaces}
+    encontradas = cache.get_many(list(chaves))
+    resultado = {}
+    for chave, ns in chaves.items():
+        if encontradas.get(chave) is None:
+            # Versão sumiu (cache novo ou despejada): começa de um número que nunca foi
+            # usado, senão chaves antigas com a mesma versão voltariam a valer
+            inicial = time.time_ns() // 1000
+            cache.add(chave, inicial, timeout=None)
+            encontradas[chave] = cache.get(chave) or inicial  # DummyCache não guarda nada
+        resultado[ns] = encontradas[chave]
+    return resultado
+
+
+def ns_setor(setor_id):
+    return f'setor{setor_id}'
+
+
+def ns_equipamento(equipamento_id):
+    return f'equipamento{equipamento_id}'
+
+
+def etag(*namespaces):
+    """ETag a partir das versões: muda exatamente quando algum namespace é invalidado."""
+    return '-'.join(f'{ns}.{v}' for ns, v in sorted(versoes(namespaces).items()))
+
+
+def montar_chave(namespaces, nome, *partes):
+    return ':'.join([PREFIXO, nome, etag(*namespaces), *map(str, partes)])
+
+
+def _contar(nome, evento):
+    chave = f'{PREFIXO}:stats:{nome}:{evento}'
+    try:
+        cache.incr(chave)
+    except ValueError:
+        if not cache.add(chave, 1, timeout=None):
+            cache.incr(chave)
+
+
+def obter(namespaces, nome, calcular, *partes, timeout=None):
+    """
+    Lê do cache ou calcula e guarda. `partes` entram na chave (ex.: setor filtrado).
+    timeout=None usa o TIMEOUT do settings.CACHES.
+    """
+    NOMES.add(nome)
+    chave = montar_chave(namespaces, nome, *partes)
+    valor = cache.get(chave, _AUSENTE)
+    if valor is _AUSENTE:
+        _contar(nome, 'miss')
+        valor = calcular()
+        if timeout is None:
+            cache.set(chave, valor)
+        else:
+            cache.set(chave, valor, timeout)
+    else:
+        _contar(nome, 'hit')
+    return valor
+
+
+# Snapshot: enquanto um processo calcula, os outros esperam por ele em vez de
+# repetirem as mesmas consultas. A trava expira sozinha se o processo morrer no meio
+TRAVA_SEGUNDOS = 30
+ESPERA_SEGUNDOS = 5
+INTERVALO_ESPERA = 0.05
+
+
+def _compactar(valor):
+    return zlib.compress(json.dumps(valor, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+
+
+def _descompactar(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def obter_snapshot(namespaces, nome, calcular, segundos):
+    """
+    Como obter(), para estados caros lidos por muitas telas ao mesmo tempo:
+    `calcular` devolve dados JSON (datas viram texto ISO) e o resultado é
+    guardado como um blob zlib, o mesmo para todos, por no máximo `segundos`
+    (ou até um namespace mudar). Com o cache vazio só um processo calcula
+    (single-flight via cache.add); os demais esperam o blob aparecer.
+    """
+    NOMES.add(nome)
+    chave = montar_chave(namespaces, nome)
+    blob = cache.get(chave)
+    if blob is not None:
+        _contar(nome, 'hit')
+        return _descompactar(blob)
+
+    trava = f'{chave}:calculando'
+    dono = cache.add(trava, 1, timeout=TRAVA_SEGUNDOS)
+    if not dono:
+        limite = time.monotonic() + ESPERA_SEGUNDOS
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA)
+            blob = cache.get(chave)
+            if blob is not None:
+                _contar(nome, 'hit')
+                return _descompactar(blob)
+            if cache.get(trava) is None:
+                break  # quem calculava falhou: calcula aqui mesmo
+        # demorou demais: segue sem a trava para não deixar a tela sem resposta
+
+    try:
+        _contar(nome, 'miss')
+        blob = _compactar(calcular())
+        cache.set(chave, blob, segundos)
+    finally:
+        if dono:
+            cache.delete(trava)
+    return _descompactar(blob)
+
+
+def invalidar(*namespaces):
+    """Troca a versão dos namespaces depois do COMMIT (rollback não invalida nada)."""
+    def trocar():
+        for ns in namespaces:
+            try:
+                cache.incr(_chave_versao(ns))
+            except ValueError:
+                pass  # sem versão ainda: a primeira leitura cria uma nova
+    transaction.on_commit(trocar)
+
+
+def estatisticas():
+    """{nome: {'hit': n, 'miss': n, 'taxa': %}}, somando todos os processos (contadores no próprio cache)."""
+    chaves = [f'{PREFIXO}:stats:{nome}:{evento}' for nome in sorted(NOMES) for evento in ('hit', 'miss')]
+    valores = cache.get_many(chaves)
+    resultado = {}
+    for nome in sorted(NOMES):
+        hits = valores.get(f'{PREFIXO}:stats:{nome}:hit', 0)
+        misses = valores.get(f'{PREFIXO}:stats:{nome}:miss', 0)
+        total = hits + misses
+        resultado[nome] = {'hit': hits, 'miss': misses, 'taxa': round(100 * hits / total, 1) if total else None}
+    return resultado
+
+
+# ==================== DADOS DE REFERÊNCIA ====================
+# Listas que quase nunca mudam e aparecem em várias telas
+
+def setores_ordenados():
+    return obter(('setores', 'energias'), 'setores_ordenados',
+                 lambda: list(Setor.objects.select_related('energia').order_by('nome')))
+
+
+def lista_mecanicos(*tipos):
+    """Só os campos de exibição (dicts), nunca o Usuario inteiro com hash de senha e afins."""
+    tipos = tipos or ('mecanico',)
+    return obter(('usuarios',), 'mecanicos',
+                 lambda: list(Usuario.objects.filter(tipo__in=tipos).order_by('first_name', 'username')
+                              .values('id', 'first_name', 'last_name', 'username')),
+                 *sorted(tipos))
+
+
+def setores_com_equipamentos():
+    """Setores que têm ao menos um equipamento (select do gerador de etiquetas)."""
+    return obter(('setores', 'equipamentos'), 'setores_com_equipamentos',
+                 lambda: list(Equipamento.objects.values('setor__id', 'setor__nome').distinct().order_by('setor__nome')))
+
+
+def contagens():
+    return obter(('setores', 'equipamentos'), 'contagens',
+                 lambda: {'setores': Setor.objects.count(), 'equipamentos': Equipamento.objects.count()})
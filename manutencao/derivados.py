@@ -0,0 +1,99 @@
+# manutencao/derivados.py
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .imagens import abrir_reduzida
+
+# Tamanhos disponíveis (lado maior em px, já pensando em tela 2x)
+PRESETS = {
+    'mini': (128, 128),      # listas e miniaturas de 55-64px
+    'pequeno': (320, 320),   # grade de fotos dos chamados
+    'medio': (640, 640),     # preview do equipamento
+}
+
+PASTA_DERIVADOS = 'derivados'
+
+
+def url_derivado(nome, preset):
+    return reverse('imagem_derivada', args=[preset, nome])
+
+
+def caminho_derivado(nome, preset):
+    base = os.path.splitext(nome)[0]
+    return os.path.join(settings.MEDIA_ROOT, PASTA_DERIVADOS, preset, f"{base}.webp")
+
+
+def obter_derivado(nome, preset):
+    """
+    Devolve o caminho do derivado em disco, gerando na primeira vez que for pedido.
+    Como os nomes são o hash do conteúdo, o derivado nunca fica desatualizado.
+    """
+    destino = caminho_derivado(nome, preset)
+    try:
+        estatistica = os.stat(destino)
+    except FileNotFoundError:
+        gerar_derivado(os.path.join(settings.MEDIA_ROOT, nome), destino, PRESETS[preset])
+    else:
+        # Marca o uso para a limpeza por LRU (no máximo uma escrita por hora)
+        if time.time() - estatistica.st_mtime > 3600:
+            os.utime(destino)
+    return destino
+
+
+def gerar_derivado(origem, destino, tamanho):
+    with abrir_reduzida(origem, tamanho) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail(tamanho, Image.LANCZOS)
+
+        # Grava num temporário e renomeia: duas requisições simultâneas
+        # nunca entregam um arquivo pela metade
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                img.save(arquivo, format='WEBP', quality=75)
+            os.replace(temporario, destino)
+        except Exception:
+            os.remove(temporario)
+            raise
+
+
+def limpar_derivados(limite_bytes=None):
+    """
+    Remove os derivados menos usados até o cache caber em DERIVADOS_LIMITE_BYTES.
+    Retorna (arquivos removidos, bytes liberados).
+    """
+    if limite_bytes is None:
+        limite_bytes = settings.DERIVADOS_LIMITE_BYTES
+
+    arquivos = []
+    total = 0
+    for raiz, _, nomes in os.walk(os.path.join(settings.MEDIA_ROOT, PASTA_DERIVADOS)):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            try:
+                estatistica = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            arquivos.append((estatistica.st_mtime, estatistica.st_size, caminho))
+            total += estatistica.st_size
+
+    removidos = liberados = 0
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        removidos += 1
+        liberados += tamanho
+    return removidos, liberados
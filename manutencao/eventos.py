@@ -0,0 +1,121 @@
+# manutencao/eventos.py
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Eventos de chamado (criado, atribuído, mudou de status) para as telas abertas.
+# O Redis pub/sub é o barramento: quem grava publica depois do COMMIT, e cada
+# conexão SSE do servidor ASGI assina o canal e repassa só o que interessa ao
+# usuário dela. O evento leva só id, status e equipe: a tela pede o HTML das linhas
+# desse chamado em views.fragmentos_chamados e troca só elas, sem refazer a página.
+# Sem EVENTOS_REDIS_URL nada é publicado e as telas ficam como antes.
+CANAL = 'manutencao:eventos'
+INTERVALO_PING = 15  # segundos sem mandar nada antes de um comentário ": ping" (proxies cortam conexão parada)
+RECONEXAO_MS = 5000
+
+_cliente = None
+
+
+def ativo():
+    return bool(settings.EVENTOS_REDIS_URL)
+
+
+def _redis():
+    global _cliente
+    if _cliente is None:
+        import redis
+        _cliente = redis.Redis.from_url(settings.EVENTOS_REDIS_URL)
+    return _cliente
+
+
+def montar_eventos(tipo, chamado_ids, afetados=()):
+    """Lê status e equipe como ficaram no banco (uma consulta para cada) e monta um evento por chamado."""
+    from .models import Chamado
+
+    equipes = {}
+    for chamado_id, usuario_id in Chamado.mecanicos.through.objects.filter(
+        chamado_id__in=chamado_ids
+    ).values_list('chamado_id', 'usuario_id'):
+        equipes.setdefault(chamado_id, []).append(usuario_id)
+
+    return [
+        {
+            'tipo': tipo,
+            'chamado': chamado['id'],
+            'status': chamado['status'],
+            'prioridade': chamado['prioridade'],
+            'producao_parada': chamado['producao_parada'],
+            'mecanicos': equipes.get(chamado['id'], []),
+            # quem saiu da equipe também precisa tirar o chamado da tela
+            'afetados': sorted(afetados),
+        }
+        for chamado in Chamado.objects.filter(id__in=chamado_ids).values(
+            'id', 'status', 'prioridade', 'producao_parada'
+        )
+    ]
+
+
+def publicar(tipo, chamado_ids, afetados=()):
+    """Agenda a publicação para depois do COMMIT (rollback não avisa ninguém)."""
+    chamado_ids = [id_ for id_ in chamado_ids if id_]
+    if not ativo() or not chamado_ids:
+        return
+    afetados = set(afetados)
+
+    def enviar():
+        try:
+            eventos = montar_eventos(tipo, chamado_ids, afetados)
+            pipe = _redis().pipeline(transaction=False)
+            for evento in eventos:
+                pipe.publish(CANAL, json.dumps(evento))
+            pipe.execute()
+        except Exception:
+            # Evento perdido não desfaz nada: a tela se acerta no próximo carregamento
+            logger.exception("Erro ao publicar eventos de chamado %s", chamado_ids)
+
+    transaction.on_commit(enviar)
+
+
+def visivel_para(evento, usuario):
+    """Admins veem tudo; o mecânico só o que é (ou era) da equipe dele, como no dashboard."""
+    if usuario.tipo in ('mecanico_admin', 'solicitante_admin'):
+        return True
+    return usuario.id in evento['mecanicos'] or usuario.id in evento['afetados']
+
+
+def formatar_sse(evento):
+    return f"event: chamado\ndata: {json.dumps(evento)}\n\n"
+
+
+async def fluxo_eventos(usuario):
+    """
+    Gerador assíncrono do text/event-stream de um usuário. Fica parado no
+    Redis (nenhuma consulta ao banco) até chegar evento; se o cliente
+    desconecta, o Django cancela o gerador e o finally solta a assinatura.
+    """
+    import redis.asyncio as aioredis
+
+    cliente = aioredis.Redis.from_url(settings.EVENTOS_REDIS_URL)
+    pubsub = cliente.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(CANAL)
+    try:
+        yield f"retry: {RECONEXAO_MS}\n\n"
+        ultimo_envio = time.monotonic()
+        while True:
+            mensagem = await pubsub.get_message(timeout=INTERVALO_PING)
+            if mensagem is not None:
+                evento = json.loads(mensagem['data'])
+                if visivel_para(evento, usuario):
+                    ultimo_envio = time.monotonic()
+                    yield formatar_sse(evento)
+            if time.monotonic() - ultimo_envio >= INTERVALO_PING:
+                ultimo_envio = time.monotonic()
+                yield ": ping\n\n"
+    finally:
+        await pubsub.aclose()
+        await cliente.aclose()
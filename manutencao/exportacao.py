@@ -0,0 +1,86 @@
+# manutencao/exportacao.py
+import csv
+
+from django.utils import timezone
+
+# Um lote por ida ao banco: no PostgreSQL o iterator() usa cursor no servidor,
+# então a memória fica em um lote por vez, seja um mês ou dez anos de chamados
+TAMANHO_LOTE = 2000
+
+
+class _Eco:
+    """Buffer de mentira para o csv.writer: devolve a linha em vez de guardar."""
+
+    def write(self, valor):
+        return valor
+
+
+def _minutos(inicio, fim):
+    if not inicio or not fim:
+        return ''
+    return max(0, round((fim - inicio).total_seconds() / 60))
+
+
+def _data(valor):
+    return timezone.localtime(valor).strftime('%d/%m/%Y %H:%M') if valor else ''
+
+
+def _nome(usuario):
+    if usuario is None:
+        return ''
+    return usuario.get_full_name() or usuario.username
+
+
+def _local(chamado):
+    if chamado.equipamento_id:
+        return chamado.equipamento.setor.nome, chamado.equipamento.nome, chamado.equipamento.codigo or ''
+    return (chamado.setor_avulso.nome if chamado.setor_avulso_id else ''), '', ''
+
+
+# (cabeçalho, valor) — as durações saem em minutos, prontas para somar na planilha
+COLUNAS = [
+    ('Chamado', lambda c: c.id),
+    ('Tipo', lambda c: c.get_tipo_display()),
+    ('Setor', lambda c: _local(c)[0]),
+    ('Equipamento', lambda c: _local(c)[1]),
+    ('Código', lambda c: _local(c)[2]),
+    ('Status', lambda c: c.get_status_display()),
+    ('Prioridade', lambda c: c.get_prioridade_display()),
+    ('Produção parada', lambda c: 'Sim' if c.producao_parada else 'Não'),
+    ('Rotina', lambda c: 'Sim' if c.is_rotina else 'Não'),
+    ('Solicitante', lambda c: _nome(c.solicitante)),
+    ('Mecânicos', lambda c: ', '.join(_nome(m) for m in c.mecanicos.all())),
+    ('Concluído por', lambda c: _nome(c.concluido_por)),
+    ('Aberto em', lambda c: _data(c.criado_em)),
+    ('Iniciado em', lambda c: _data(c.iniciado_em)),
+    ('Concluído em', lambda c: _data(c.concluido_em)),
+    ('Resposta (min)', lambda c: _minutos(c.criado_em, c.iniciado_em)),
+    ('Execução (min)', lambda c: _minutos(c.iniciado_em, c.concluido_em)),
+    ('Tempo aberto (min)', lambda c: _minutos(c.criado_em, c.concluido_em)),
+    ('Descrição', lambda c: c.descricao),
+    ('Observações do mecânico', lambda c: c.observacoes_mecanico),
+]
+
+
+def preparar_exportacao(chamados):
+    """Tudo que as colunas usam vem junto: nenhuma consulta extra por linha."""
+    return (
+        chamados
+        .select_related('solicitante', 'equipamento__setor', 'setor_avulso', 'concluido_por')
+        .prefetch_related('mecanicos')
+        .order_by('criado_em', 'id')
+    )
+
+
+def linhas_csv(chamados, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gerador de linhas CSV (str) do queryset: o cabeçalho e depois um chamado por
+    linha, lendo do banco em lotes. Nada é acumulado, serve tanto para o
+    StreamingHttpResponse quanto para gravar arquivo no comando.
+    Separador ';' e BOM no início: é o que o Excel em português abre direto.
+    """
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + escritor.writerow([cabecalho for cabecalho, _ in COLUNAS])
+    # prefetch_related junto com iterator() é feito a cada lote
+    for chamado in preparar_exportacao(chamados).iterator(chunk_size=tamanho_lote):
+        yield escritor.writerow([valor(chamado) for _, valor in COLUNAS])
@@ -0,0 +1,172 @@
+# manutencao/imagens.py
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Fotos dos chamados: limite de 800px e WebP qualidade 70
+TAMANHO_MAXIMO_CHAMADO = (800, 800)
+QUALIDADE_WEBP_CHAMADO = 70
+
+
+def abrir_reduzida(arquivo, tamanho_max):
+    """
+    Abre a imagem pedindo ao decodificador JPEG a menor escala (1/2, 1/4, 1/8)
+    que ainda cubra tamanho_max: o bitmap em resolução cheia nunca é montado.
+    Para outros formatos o draft() não faz nada e a imagem abre normalmente.
+    """
+    img = Image.open(arquivo)
+    img.draft('RGB', tamanho_max)
+    return img
+
+
+def memoria_decodificada(img):
+    # Bytes do bitmap que o Pillow vai alocar ao decodificar (largura x altura x canais)
+    return img.width * img.height * len(img.getbands())
+
+
+def arquivo_temporario_imagem():
+    # Fica em memória até 1MB e depois vai para o disco
+    return tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+
+def transcodificar_para_webp(caminho, tamanho_max=TAMANHO_MAXIMO_CHAMADO, qualidade=QUALIDADE_WEBP_CHAMADO):
+    """
+    Lê a imagem do disco e devolve os bytes já convertidos para WebP.
+    Não mexe no banco nem no storage, então pode rodar em outro processo.
+    """
+    with abrir_reduzida(caminho, tamanho_max) as original:
+        logger.debug("Decodificando %s: %d bytes", caminho, memoria_decodificada(original))
+
+        #Girar a foto que vem girada do celular
+        img = ImageOps.exif_transpose(original)
+
+        #aqui ele garante que a imagem seja no modo RGB
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        # Redimensionar (Mantendo a proporção)
+        img.thumbnail(tamanho_max, Image.LANCZOS)
+
+        buffer = BytesIO()
+        img.save(buffer, format='WEBP', quality=qualidade)
+        return buffer.getvalue()
+
+
+def nome_webp(nome):
+    # chamados/foto.jpg -> foto.webp (o upload_to do campo devolve para a pasta certa)
+    return os.path.splitext(os.path.basename(nome))[0] + ".webp"
+
+
+def transcodificar_arquivo(item):
+    """
+    Versão para o pool de processos: recebe (id, caminho) e devolve
+    (id, bytes_webp, bytes_antes, erro). Nunca levanta exceção.
+    """
+    imagem_id, caminho = item
+    try:
+        antes = os.path.getsize(caminho)
+        return imagem_id, transcodificar_para_webp(caminho), antes, None
+    except Exception as e:
+        return imagem_id, None, 0, str(e)
+
+
+def ler_checkpoint(caminho):
+    """Devolve (ultimo_id, falhas): até onde o cursor chegou e os ids que falharam no caminho."""
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        return dados.get('ultimo_id', 0), list(dados.get('falhas', []))
+    except (OSError, ValueError):
+        return 0, []
+
+
+def gravar_checkpoint(caminho, ultimo_id, falhas, estatisticas):
+    # Grava num arquivo temporário e renomeia: o checkpoint nunca fica pela metade
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({'ultimo_id': ultimo_id, 'falhas': sorted(falhas), **estatisticas}, arquivo)
+    os.replace(temporario, caminho)
+
+
+def compactar_acervo(checkpoint, processos=None, tamanho_lote=200, reiniciar=False, ao_concluir_lote=None):
+    """
+    Converte para WebP todas as fotos de chamado ainda não processadas,
+    em lotes por ordem de id, usando um processo por núcleo de CPU.
+    O checkpoint guarda o último id visitado e os ids que falharam: uma execução
+    interrompida continua de onde parou e começa tentando de novo as falhas
+    anteriores (as que falharem outra vez continuam na lista).
+    """
+    from .models import ImagemChamado
+
+    processos = processos or os.cpu_count() or 1
+    ultimo_id, pendentes = (0, []) if reiniciar else ler_checkpoint(checkpoint)
+    falhas = set()
+    estatisticas = {'imagens': 0, 'ignoradas': 0, 'erros': 0, 'bytes_antes': 0, 'bytes_depois': 0}
+    inicio = time.perf_counter()
+
+    def converter(lote):
+        # 1. Separa o que precisa de conversão do que só precisa ser marcado
+        por_id = {}
+        for img_obj in lote:
+            nome = img_obj.imagem.name if img_obj.imagem else ''
+            if not nome or nome.lower().endswith('.webp') or not img_obj.imagem.storage.exists(nome):
+                img_obj.marcar_processada()
+                estatisticas['ignoradas'] += 1
+            else:
+                por_id[img_obj.id] = img_obj
+        itens = [(imagem_id, img_obj.imagem.path) for imagem_id, img_obj in por_id.items()]
+
+        # 2. Converte em paralelo; o banco/storage só é tocado aqui no processo principal
+        if executor:
+            resultados = executor.map(transcodificar_arquivo, itens, chunksize=max(1, len(itens) // (processos * 4)))
+        else:
+            resultados = map(transcodificar_arquivo, itens)
+
+        for imagem_id, conteudo, antes, erro in resultados:
+            if erro:
+                logger.warning("Erro ao converter imagem #%s: %s", imagem_id, erro)
+                estatisticas['erros'] += 1
+                falhas.add(imagem_id)
+                continue
+            por_id[imagem_id].salvar_webp(conteudo)
+            estatisticas['imagens'] += 1
+            estatisticas['bytes_antes'] += antes
+            estatisticas['bytes_depois'] += len(conteudo)
+
+    def concluir_lote(restantes=()):
+        # restantes: falhas antigas ainda não retentadas, para não se perderem se parar no meio
+        gravar_checkpoint(checkpoint, ultimo_id, falhas.union(restantes), estatisticas)
+        if ao_concluir_lote:
+            ao_concluir_lote(estatisticas, time.perf_counter() - inicio)
+
+    executor = ProcessPoolExecutor(max_workers=processos) if processos > 1 else None
+    try:
+        # Falhas da execução anterior (ficam atrás do cursor, o laço abaixo não as vê)
+        for i in range(0, len(pendentes), tamanho_lote):
+            ids = pendentes[i:i + tamanho_lote]
+            converter(ImagemChamado.objects.filter(id__in=ids, processada=False).order_by('id'))
+            concluir_lote(pendentes[i + tamanho_lote:])
+
+        while True:
+            lote = list(
+                ImagemChamado.objects.filter(processada=False, id__gt=ultimo_id).order_by('id')[:tamanho_lote]
+            )
+            if not lote:
+                break
+            converter(lote)
+            ultimo_id = lote[-1].id
+            concluir_lote()
+    finally:
+        if executor:
+            executor.shutdown()
+
+    estatisticas['segundos'] = time.perf_counter() - inicio
+    return estatisticas
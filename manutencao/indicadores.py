@@ -0,0 +1,179 @@
+# manutencao/indicadores.py
+import calendar
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.apps import apps as apps_globais
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, NullIf, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+ESCOPOS = ('equipamento', 'setor', 'mecanico')
+
+SOMAS = ('abertos', 'falhas', 'iniciados', 'concluidos',
+         'tempo_resposta_total', 'tempo_reparo_total', 'tempo_parada_total')
+
+
+def _chave(escopo):
+    # Coluna que identifica o equipamento/setor/mecânico de cada chamado
+    if escopo == 'equipamento':
+        return F('equipamento')
+    if escopo == 'setor':
+        # Chamado de equipamento conta no setor do equipamento
+        return Coalesce('equipamento__setor', 'setor_avulso', output_field=BigIntegerField())
+    return F('mecanicos')
+
+
+def _eventos():
+    # (coluna que data o evento, somas calculadas naquele dia)
+    reparo = F('concluido_em') - F('criado_em')
+    return [
+        ('criado_em', {
+            'abertos': Count('id'),
+            'falhas': Count('id', filter=Q(is_rotina=False)),
+        }),
+        ('iniciado_em', {
+            'iniciados': Count('id'),
+            'tempo_resposta_total': Sum(F('iniciado_em') - F('criado_em')),
+        }),
+        ('concluido_em', {
+            'concluidos': Count('id'),
+            'tempo_reparo_total': Sum(reparo),
+            'tempo_parada_total': Sum(reparo, filter=Q(producao_parada=True)),
+        }),
+    ]
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def recalcular_indicadores(inicio=None, fim=None, apps=None):
+    """
+    Refaz os rollups de [inicio, fim] (datas locais; None = desde o primeiro
+    chamado / até hoje). Tudo set-based: um GROUP BY (dia, objeto) por evento e
+    escopo, e o resultado troca as linhas do período numa transação só.
+    Como cada evento conta no dia em que aconteceu, recalcular só os últimos
+    dias já cobre tudo o que mudou neles. Devolve quantas linhas gravou.
+    `apps` permite usar os modelos históricos dentro de uma migration.
+    """
+    apps = apps or apps_globais
+    Chamado = apps.get_model('manutencao', 'Chamado')
+    IndicadorDiario = apps.get_model('manutencao', 'IndicadorDiario')
+    chamados = Chamado._base_manager.all()
+
+    fim = fim or timezone.localdate()
+    if inicio is None:
+        primeiro = chamados.order_by('criado_em').values_list('criado_em', flat=True).first()
+        if primeiro is None:
+            IndicadorDiario.objects.filter(data__lte=fim).delete()
+            return 0
+        inicio = timezone.localtime(primeiro).date()
+    de, ate = _inicio_do_dia(inicio), _inicio_do_dia(fim + timedelta(days=1))
+
+    linhas = defaultdict(dict)
+    for escopo in ESCOPOS:
+        for campo, somas in _eventos():
+            grupos = (
+                chamados
+                .filter(**{f'{campo}__gte': de, f'{campo}__lt': ate})
+                .annotate(dia=TruncDate(campo), chave=_chave(escopo))
+                .filter(chave__isnull=False)
+                .values('dia', 'chave')
+                .annotate(**somas)
+                .order_by()
+            )
+            for grupo in grupos:
+                linha = linhas[(escopo, grupo.pop('dia'), grupo.pop('chave'))]
+                linha.update({nome: valor for nome, valor in grupo.items() if valor is not None})
+
+    indicadores = [
+        IndicadorDiario(data=dia, escopo=escopo, **{f'{escopo}_id': chave}, **valores)
+        for (escopo, dia, chave), valores in linhas.items()
+    ]
+    with transaction.atomic():
+        IndicadorDiario.objects.filter(data__gte=inicio, data__lte=fim).delete()
+        IndicadorDiario.objects.bulk_create(indicadores, batch_size=1000)
+    return len(indicadores)
+
+
+# ==================== LEITURA ====================
+
+def _horas(duracao):
+    return duracao.total_seconds() / 3600 if duracao else 0
+
+
+def _derivar(linha, horas_periodo=None):
+    """Médias e MTBF a partir das somas (linha = dict com os campos de SOMAS)."""
+    concluidos, iniciados, falhas = linha['concluidos'], linha['iniciados'], linha['falhas']
+    parada = _horas(linha['tempo_parada_total'])
+    linha['mttr_horas'] = _horas(linha['tempo_reparo_total']) / concluidos if concluidos else None
+    linha['resposta_horas'] = _horas(linha['tempo_resposta_total']) / iniciados if iniciados else None
+    linha['parada_minutos'] = round(parada * 60)
+    # MTBF: tempo em operação dividido pelo número de falhas (só faz sentido para um objeto)
+    linha['mtbf_horas'] = (horas_periodo - parada) / falhas if horas_periodo and falhas else None
+    return linha
+
+
+def _somas():
+    return {nome: Sum(nome) for nome in SOMAS}
+
+
+def ranking_indicadores(escopo, inicio, fim, limite=20):
+    """Totais do período por equipamento/setor/mecânico, os de maior parada primeiro."""
+    IndicadorDiario = apps_globais.get_model('manutencao', 'IndicadorDiario')
+    if escopo == 'mecanico':
+        nome = Coalesce(NullIf('mecanico__first_name', Value('')), 'mecanico__username')
+    else:
+        nome = F(f'{escopo}__nome')
+    linhas = (
+        IndicadorDiario.objects
+        .filter(escopo=escopo, data__gte=inicio, data__lte=fim)
+        .values(objeto_id=F(escopo), nome=nome)
+        .annotate(**_somas())
+        .order_by(F('tempo_parada_total').desc(), F('falhas').desc(), 'objeto_id')[:limite]
+    )
+    horas_periodo = ((fim - inicio).days + 1) * 24
+    return [_derivar(linha, horas_periodo) for linha in linhas]
+
+
+PERIODOS = {
+    'dia': None,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+
+def _fim_do_periodo(comeco, periodo):
+    if periodo == 'semana':
+        return comeco + timedelta(days=6)
+    if periodo == 'mes':
+        return comeco.replace(day=calendar.monthrange(comeco.year, comeco.month)[1])
+    return comeco
+
+
+def serie_indicadores(escopo, inicio, fim, objeto_id=None, periodo='mes'):
+    """
+    Série temporal (por dia, semana ou mês) somando os rollups do escopo, ou só
+    de um objeto. Um ano inteiro são no máximo 365 linhas por objeto: nunca lê os chamados.
+    """
+    IndicadorDiario = apps_globais.get_model('manutencao', 'IndicadorDiario')
+    indicadores = IndicadorDiario.objects.filter(escopo=escopo, data__gte=inicio, data__lte=fim)
+    if objeto_id:
+        indicadores = indicadores.filter(**{escopo: objeto_id})
+
+    truncar = PERIODOS[periodo]
+    linhas = (
+        indicadores
+        .values(periodo=truncar('data') if truncar else F('data'))
+        .annotate(**_somas())
+        .order_by('periodo')
+    )
+    serie = []
+    for linha in linhas:
+        comeco = linha['periodo']
+        # O primeiro e o último período podem estar cortados pelo intervalo pedido
+        dias = (min(_fim_do_periodo(comeco, periodo), fim) - max(comeco, inicio)).days + 1
+        serie.append(_derivar(linha, dias * 24 if objeto_id else None))
+    return serie
@@ -0,0 +1,151 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from manutencao.models import Usuario, Energia, Setor, Equipamento, Chamado, RotinaManutencao
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula uma massa de chamados/rotinas, mede as consultas das telas com e sem os '
+        'índices do Meta (plano + latência) e desfaz tudo no final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chamados', type=int, default=50000)
+        parser.add_argument('--rotinas', type=int, default=2000)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--planos', action='store_true', help='Mostra o EXPLAIN de cada consulta')
+        parser.add_argument('--confirmar', action='store_true',
+                            help='Roda mesmo com DEBUG desligado (use só numa cópia do banco)')
+
+    def handle(self, *args, **options):
+        # Mesmo revertido no final, o DROP INDEX trava as tabelas de chamados e rotinas
+        # (no PostgreSQL, até para leitura) enquanto a medição roda
+        if not settings.DEBUG and not options['confirmar']:
+            raise CommandError(
+                'O benchmark remove índices e popula o banco atual dentro de uma transação longa. '
+                'Rode numa cópia do banco com DEBUG=True ou passe --confirmar.'
+            )
+        # Tudo numa transação revertida: o banco fica como estava
+        with transaction.atomic():
+            dados = self.popular(options['chamados'], options['rotinas'])
+            self.analisar()
+            consultas = self.consultas(dados)
+
+            depois = self.medir(consultas, options)
+
+            # Sem os índices: remove dentro de um savepoint e desfaz em seguida
+            with transaction.atomic():
+                self.remover_indices()
+                self.analisar()
+                antes = self.medir(consultas, options)
+                transaction.set_rollback(True)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"\n{'Consulta':<28} {'sem índices':>12} {'com índices':>12} {'ganho':>8}")
+        for nome in consultas:
+            ganho = antes[nome] / depois[nome] if depois[nome] else 0
+            self.stdout.write(f"{nome:<28} {antes[nome]:>10.2f}ms {depois[nome]:>10.2f}ms {ganho:>7.1f}x")
+
+    def popular(self, quantidade, quantidade_rotinas):
+        self.stdout.write(f"Populando {quantidade} chamados e {quantidade_rotinas} rotinas...")
+        aleatorio = random.Random(42)  # mesma massa a cada execução
+        agora = timezone.now()
+        hoje = timezone.localdate()
+
+        energia = Energia.objects.create(numero='BENCH')
+        setores = Setor.objects.bulk_create([Setor(nome=f'Setor {i}', energia=energia) for i in range(20)])
+        equipamentos = Equipamento.objects.bulk_create([
+            Equipamento(nome=f'Equipamento {i}', codigo=f'BENCH{i}', setor=setores[i % len(setores)])
+            for i in range(400)
+        ])
+        solicitantes = Usuario.objects.bulk_create([
+            Usuario(username=f'bench_solicitante_{i}', tipo='solicitante') for i in range(200)
+        ])
+
+        # Datas espalhadas por dois anos; a maioria dos chamados já está concluída
+        campo = Chamado._meta.get_field('criado_em')
+        campo.auto_now_add = False
+        try:
+            chamados = []
+            for i in range(quantidade):
+                equipamento = aleatorio.choice(equipamentos) if aleatorio.random() < 0.7 else None
+                status = aleatorio.choices(['pendente', 'em_progresso', 'concluido'], weights=[5, 5, 90])[0]
+                chamados.append(Chamado(
+                    solicitante=aleatorio.choice(solicitantes),
+                    tipo='equipamento' if equipamento else 'avulso',
+                    equipamento=equipamento,
+                    setor_avulso=None if equipamento else aleatorio.choice(setores),
+                    descricao=f'Chamado de benchmark {i}',
+                    status=status,
+                    prioridade=aleatorio.randint(1, 3),
+                    producao_parada=aleatorio.random() < 0.1,
+                    is_rotina=aleatorio.random() < 0.3,
+                    criado_em=agora - timedelta(minutes=aleatorio.randint(0, 2 * 365 * 24 * 60)),
+                ))
+            Chamado.objects.bulk_create(chamados, batch_size=2000)
+        finally:
+            campo.auto_now_add = True
+
+        RotinaManutencao.objects.bulk_create([
+            RotinaManutencao(
+                tipo='setor', nome_rotina=f'Rotina {i}', setor=aleatorio.choice(setores), descricao='benchmark',
+                frequencia='diario', ativo=aleatorio.random() < 0.5,
+                proxima_execucao=hoje + timedelta(days=aleatorio.randint(-5, 60)),
+            )
+            for i in range(quantidade_rotinas)
+        ], batch_size=2000)
+
+        return {
+            'solicitante': solicitantes[0],
+            'equipamento': equipamentos[0],
+            'setor': setores[0],
+            'hoje': hoje,
+            'corte': agora - timedelta(days=200),
+        }
+
+    def consultas(self, dados):
+        # As mesmas consultas que as views fazem (uma página de 12)
+        return {
+            'solicitante_dashboard': lambda: Chamado.objects.filter(solicitante=dados['solicitante']).order_by('-criado_em')[:12],
+            'historico_equipamento': lambda: Chamado.objects.filter(equipamento=dados['equipamento']).order_by('-criado_em')[:12],
+            'historico_setor': lambda: Chamado.objects.filter(setor_avulso=dados['setor'], tipo='avulso').order_by('-criado_em')[:12],
+            'filtro_status': lambda: Chamado.objects.filter(status='pendente').order_by('-criado_em')[:12],
+            'fila_abertos': lambda: Chamado.objects.filter(status__in=['pendente', 'em_progresso'])
+                .order_by('-producao_parada', 'prioridade', '-criado_em')[:12],
+            'pagina_cursor': lambda: Chamado.objects.filter(criado_em__lt=dados['corte']).order_by('-criado_em', '-id')[:12],
+            'rotinas_vencidas': lambda: RotinaManutencao.objects.filter(ativo=True, proxima_execucao__lte=dados['hoje']),
+        }
+
+    def medir(self, consultas, options):
+        resultados = {}
+        for nome, consulta in consultas.items():
+            if options['planos']:
+                self.stdout.write(f"\n[{nome}]\n{consulta().explain()}")
+            tempos = []
+            for _ in range(options['repeticoes']):
+                inicio = time.perf_counter()
+                list(consulta())
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nome] = statistics.median(tempos)
+        return resultados
+
+    def remover_indices(self):
+        # DROP INDEX direto (o schema_editor do SQLite não roda dentro de uma transação)
+        with connection.cursor() as cursor:
+            for modelo in (Chamado, RotinaManutencao):
+                for indice in modelo._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(indice.name)}')
+
+    def analisar(self):
+        # Atualiza as estatísticas para o planejador enxergar a massa nova
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
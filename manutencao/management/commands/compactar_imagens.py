@@ -0,0 +1,41 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from manutencao.imagens import compactar_acervo
+
+
+class Command(BaseCommand):
+    help = 'Converte para WebP todas as fotos de chamados ainda não processadas, usando todos os núcleos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=os.cpu_count(),
+                            help='Processos em paralelo (padrão: número de CPUs)')
+        parser.add_argument('--lote', type=int, default=200, help='Imagens lidas do banco por vez')
+        parser.add_argument('--checkpoint', default=settings.IMAGENS_CHECKPOINT)
+        parser.add_argument('--reiniciar', action='store_true', help='Ignora o checkpoint e começa do id 0')
+
+    def handle(self, *args, **options):
+        os.makedirs(os.path.dirname(options['checkpoint']) or '.', exist_ok=True)
+
+        def progresso(estatisticas, segundos):
+            self.stdout.write(self._resumo(estatisticas, segundos))
+
+        estatisticas = compactar_acervo(
+            checkpoint=options['checkpoint'],
+            processos=options['processos'],
+            tamanho_lote=options['lote'],
+            reiniciar=options['reiniciar'],
+            ao_concluir_lote=progresso,
+        )
+        self.stdout.write(self.style.SUCCESS('Concluído: ' + self._resumo(estatisticas, estatisticas['segundos'])))
+
+    def _resumo(self, estatisticas, segundos):
+        economizados = estatisticas['bytes_antes'] - estatisticas['bytes_depois']
+        taxa = estatisticas['imagens'] / segundos if segundos else 0
+        return (
+            f"{estatisticas['imagens']} convertidas, {estatisticas['ignoradas']} ignoradas, "
+            f"{estatisticas['erros']} erros | {taxa:.1f} imagens/s | "
+            f"{economizados / 1024 / 1024:.1f} MB economizados"
+        )
@@ -0,0 +1,50 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from manutencao.exportacao import TAMANHO_LOTE, linhas_csv
+from manutencao.models import Chamado
+
+
+class Command(BaseCommand):
+    help = 'Exporta o histórico de chamados em CSV (memória constante, qualquer período).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: stdout)')
+        parser.add_argument('--setor', type=int)
+        parser.add_argument('--inicio', help='Criados a partir de AAAA-MM-DD')
+        parser.add_argument('--fim', help='Criados até AAAA-MM-DD')
+        parser.add_argument('--status', choices=[valor for valor, _ in Chamado.STATUS_CHOICES])
+        parser.add_argument('--tipo-filtro', choices=['rotina', 'manual'])
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE)
+
+    def handle(self, *args, **options):
+        chamados = Chamado.objects.all()
+        if options['setor']:
+            chamados = chamados.filter(Q(equipamento__setor_id=options['setor']) | Q(setor_avulso_id=options['setor']))
+        if options['status']:
+            chamados = chamados.filter(status=options['status'])
+        if options['tipo_filtro']:
+            chamados = chamados.filter(is_rotina=options['tipo_filtro'] == 'rotina')
+        try:
+            if options['inicio']:
+                chamados = chamados.filter(criado_em__date__gte=datetime.strptime(options['inicio'], '%Y-%m-%d').date())
+            if options['fim']:
+                chamados = chamados.filter(criado_em__date__lte=datetime.strptime(options['fim'], '%Y-%m-%d').date())
+        except ValueError:
+            raise CommandError('Use datas no formato AAAA-MM-DD')
+
+        saida = open(options['saida'], 'w', encoding='utf-8', newline='') if options['saida'] else sys.stdout
+        total = -1  # o cabeçalho não conta
+        try:
+            for linha in linhas_csv(chamados, options['lote']):
+                saida.write(linha)
+                total += 1
+        finally:
+            if options['saida']:
+                saida.close()
+
+        if options['saida']:
+            self.stdout.write(f"{total} chamado(s) exportado(s) para {options['saida']}")
@@ -0,0 +1,53 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from manutencao.models import ArquivoMidia, Equipamento, ImagemChamado
+
+
+def tamanho_pasta(caminho):
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Move as imagens antigas para o storage endereçado por conteúdo, eliminando duplicatas.'
+
+    def handle(self, *args, **options):
+        antes = tamanho_pasta(settings.MEDIA_ROOT)
+        indexados = set(ArquivoMidia.objects.values_list('nome', flat=True))
+        movidos = ausentes = 0
+
+        for modelo in (ImagemChamado, Equipamento):
+            campo = modelo._meta.get_field('imagem')
+            storage = campo.storage
+            pendentes = modelo.objects.exclude(imagem='').exclude(imagem__isnull=True).exclude(imagem__in=indexados)
+
+            for obj in pendentes.iterator(chunk_size=500):
+                nome_antigo = obj.imagem.name
+                if not storage.exists(nome_antigo):
+                    ausentes += 1
+                    continue
+
+                with storage.open(nome_antigo, 'rb') as arquivo:
+                    novo_nome = storage.save(nome_antigo, File(arquivo, name=nome_antigo))
+
+                modelo.objects.filter(pk=obj.pk).update(imagem=novo_nome)
+                indexados.add(novo_nome)
+                if novo_nome != nome_antigo:
+                    storage.delete(nome_antigo)  # fora do índice: apaga o arquivo antigo direto
+                movidos += 1
+
+        depois = tamanho_pasta(settings.MEDIA_ROOT)
+        self.stdout.write(self.style.SUCCESS(
+            f"{movidos} imagens indexadas, {ausentes} arquivos ausentes | "
+            f"mídia: {antes / 1024 / 1024:.1f} MB -> {depois / 1024 / 1024:.1f} MB"
+        ))
@@ -0,0 +1,44 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageOps
+
+from manutencao.imagens import abrir_reduzida, memoria_decodificada
+
+
+class Command(BaseCommand):
+    help = 'Mede a memória usada para otimizar uma foto (decodificação reduzida x resolução cheia).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--tamanho', type=int, default=1024)
+        parser.add_argument('--cheia', action='store_true',
+                            help='Decodifica em resolução cheia (como era antes), para comparar')
+
+    def handle(self, *args, **options):
+        tamanho = (options['tamanho'], options['tamanho'])
+        rss_antes = self._pico_rss()
+        inicio = time.perf_counter()
+
+        if options['cheia']:
+            img = Image.open(options['arquivo'])
+        else:
+            img = abrir_reduzida(options['arquivo'], tamanho)
+        decodificado = memoria_decodificada(img)
+
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(tamanho, Image.LANCZOS)
+
+        duracao = time.perf_counter() - inicio
+        rss_depois = self._pico_rss()
+        self.stdout.write(
+            f"Bitmap decodificado: {decodificado / 1024 / 1024:.1f} MB | "
+            f"pico de RSS: +{(rss_depois - rss_antes) / 1024 / 1024:.1f} MB "
+            f"(total {rss_depois / 1024 / 1024:.1f} MB) | {duracao * 1000:.0f} ms"
+        )
+
+    @staticmethod
+    def _pico_rss():
+        # ru_maxrss vem em KB no Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from manutencao.notificacoes import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Mede a vazão (mensagens/s) do backend de notificações configurado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quantidade', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=settings.NOTIFICACOES_POOL_TAMANHO)
+        parser.add_argument('--topico', default=f"{settings.NTFY_TOPICO_PREFIXO}_carga")
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        quantidade = options['quantidade']
+        topico = options['topico']
+
+        def enviar(i):
+            try:
+                backend.enviar(topico, f"Mensagem de carga {i}", {"Title": "TESTE DE CARGA"})
+                return True
+            except Exception:
+                return False
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            resultados = list(executor.map(enviar, range(quantidade)))
+        duracao = time.perf_counter() - inicio
+
+        ok = sum(resultados)
+        self.stdout.write(
+            f"Backend: {backend.__class__.__name__} | enviadas: {ok}/{quantidade} | "
+            f"{duracao:.2f}s | {quantidade / duracao:.1f} msg/s"
+        )
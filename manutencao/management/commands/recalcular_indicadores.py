@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manutencao.indicadores import recalcular_indicadores
+
+
+class Command(BaseCommand):
+    help = 'Refaz os rollups diários de KPIs (MTTR, MTBF, parada). Sem datas, refaz todo o histórico.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--ate', help='Data final (AAAA-MM-DD), padrão hoje')
+
+    def handle(self, *args, **options):
+        try:
+            inicio = datetime.strptime(options['desde'], '%Y-%m-%d').date() if options['desde'] else None
+            fim = datetime.strptime(options['ate'], '%Y-%m-%d').date() if options['ate'] else None
+        except ValueError:
+            raise CommandError('Use datas no formato AAAA-MM-DD')
+
+        total = recalcular_indicadores(inicio, fim)
+        self.stdout.write(f"{total} linha(s) de indicadores gravada(s)")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from manutencao.busca import indexar_equipamentos, indexar_chamados
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca (equipamentos e chamados). Seguro de rodar a qualquer momento.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=['equipamento', 'chamado'], help='Reindexa só um tipo')
+        parser.add_argument('--lote', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tipo, lote = options['tipo'], options['lote']
+        if tipo in (None, 'equipamento'):
+            total = indexar_equipamentos(lote=lote)
+            self.stdout.write(f"{total} equipamento(s) indexado(s)")
+        if tipo in (None, 'chamado'):
+            total = indexar_chamados(lote=lote)
+            self.stdout.write(f"{total} chamado(s) indexado(s)")
@@ -0,0 +1,285 @@
+# manutencao/metricas.py
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger('manutencao.metricas')
+
+PREFIXO = 'manutencao:metricas'
+SEM_ROTA = 'sem_rota'
+
+# Limites (segundos) do histograma de duração das requisições
+FAIXAS_DURACAO = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Somas guardadas por view. Tempos e bytes em inteiros (microssegundos), porque
+# o cache.incr do Redis só soma inteiros
+CONTADORES = ('requisicoes', 'consultas', 'db_us', 'python_us', 'total_us', 'bytes', 'consultas_lentas',
+              'excedeu_consultas', 'excedeu_ms')
+
+
+class OrcamentoExcedido(AssertionError):
+    """View passou do orçamento de consultas (só levantada com METRICAS_ORCAMENTO_ESTRITO, nos testes)."""
+
+
+class Medicao:
+    """Consultas de uma requisição, via execute_wrapper (conta tudo, inclusive sessão e usuário)."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.lentas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            self.consultas += 1
+            self.tempo_db += duracao
+            if duracao * 1000 >= settings.METRICAS_CONSULTA_LENTA_MS:
+                self.lentas.append({'sql': sql[:500], 'ms': round(duracao * 1000, 1)})
+
+
+# ==================== ACUMULADOR ====================
+# Cada processo soma localmente e descarrega no cache de tempos em tempos: o
+# endpoint lê o total de todos os workers (gunicorn recicla processos, então
+# contador só em memória se perderia) sem uma ida ao Redis por requisição
+
+_trava = threading.Lock()
+_pendentes = {}
+_ultima_descarga = time.monotonic()
+
+
+def _chave(view, nome):
+    return f'{PREFIXO}:{view}:{nome}'
+
+
+def _somar(chave, valor):
+    try:
+        cache.incr(chave, valor)
+    except ValueError:
+        if not cache.add(chave, valor, timeout=None):
+            cache.incr(chave, valor)
+
+
+def descarregar():
+    """Manda as somas locais para o cache (e registra as views novas)."""
+    global _pendentes, _ultima_descarga
+    with _trava:
+        pendentes, _pendentes = _pendentes, {}
+        _ultima_descarga = time.monotonic()
+    if not pendentes:
+        return
+    try:
+        for (view, nome), valor in pendentes.items():
+            if valor:
+                _somar(_chave(view, nome), valor)
+        views = {view for view, _ in pendentes}
+        conhecidas = set(cache.get(f'{PREFIXO}:views') or ())
+        if not views <= conhecidas:
+            cache.set(f'{PREFIXO}:views', sorted(conhecidas | views), timeout=None)
+    except Exception:
+        # Métrica nunca derruba a requisição: as somas deste intervalo se perdem
+        logger.exception('erro_gravar_metricas')
+
+
+def registrar(view, valores):
+    with _trava:
+        for nome, valor in valores.items():
+            _pendentes[(view, nome)] = _pendentes.get((view, nome), 0) + valor
+        vencido = time.monotonic() - _ultima_descarga >= settings.METRICAS_INTERVALO_SEGUNDOS
+    if vencido:
+        descarregar()
+
+
+# ==================== MIDDLEWARE ====================
+
+def _orcamento(view):
+    return settings.METRICAS_ORCAMENTOS.get(view, {})
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição: consultas SQL, tempo no banco, tempo em Python,
+    tamanho da resposta e consultas lentas, separados pelo nome da rota.
+    Vai para os contadores do /metricas/ (formato Prometheus) e para o log
+    'manutencao.metricas' em JSON. Fica no topo do MIDDLEWARE para contar
+    também a sessão e o usuário. Respostas em streaming (CSV, SSE) contam só
+    até a view devolver a resposta: o que roda enquanto o corpo é enviado fica de fora.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Sob ASGI (uvicorn) a cadeia é assíncrona: o middleware também, senão o
+        # Django teria de adaptar (sync_to_async) toda requisição logo no topo
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao = Medicao()
+        inicio = time.perf_counter()
+        with self._medindo(medicao):
+            response = self.get_response(request)
+        return self._concluir(request, response, medicao, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicao = Medicao()
+        inicio = time.perf_counter()
+        with self._medindo(medicao):
+            response = await self.get_response(request)
+        total = time.perf_counter() - inicio
+        # Contadores e log podem ir ao Redis: fora do event loop
+        return await sync_to_async(self._concluir)(request, response, medicao, total)
+
+    @staticmethod
+    @contextmanager
+    def _medindo(medicao):
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medicao))
+            yield
+
+    def _concluir(self, request, response, medicao, total):
+        rota = request.resolver_match
+        view = (rota.view_name if rota else None) or SEM_ROTA
+        tamanho = 0 if response.streaming else len(response.content)
+        dados = {
+            'view': view,
+            'metodo': request.method,
+            'status': response.status_code,
+            'consultas': medicao.consultas,
+            'db_ms': round(medicao.tempo_db * 1000, 1),
+            'python_ms': round((total - medicao.tempo_db) * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'bytes': tamanho,
+        }
+        valores = {
+            'requisicoes': 1,
+            'consultas': medicao.consultas,
+            'db_us': round(medicao.tempo_db * 1_000_000),
+            'python_us': round((total - medicao.tempo_db) * 1_000_000),
+            'total_us': round(total * 1_000_000),
+            'bytes': tamanho,
+            'consultas_lentas': len(medicao.lentas),
+        }
+        for limite in FAIXAS_DURACAO:
+            if total <= limite:
+                valores[f'faixa_{limite}'] = 1
+
+        for lenta in medicao.lentas:
+            logger.warning('consulta_lenta', extra={'metricas': {'view': view, **lenta}})
+
+        orcamento = _orcamento(view)
+        excedido = []
+        if 'consultas' in orcamento and medicao.consultas > orcamento['consultas']:
+            valores['excedeu_consultas'] = 1
+            excedido.append(f"{medicao.consultas} consultas (orçamento {orcamento['consultas']})")
+        if 'ms' in orcamento and total * 1000 > orcamento['ms']:
+            valores['excedeu_ms'] = 1
+            excedido.append(f"{dados['total_ms']} ms (orçamento {orcamento['ms']})")
+
+        registrar(view, valores)
+        if excedido:
+            logger.warning('orcamento_excedido', extra={'metricas': {**dados, 'excedido': excedido}})
+            # Tempo varia com a máquina: nos testes só o número de consultas reprova
+            if settings.METRICAS_ORCAMENTO_ESTRITO and 'excedeu_consultas' in valores:
+                raise OrcamentoExcedido(f"{view}: {excedido[0]}")
+        else:
+            logger.info('requisicao', extra={'metricas': dados})
+        return response
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro: mensagem, nível e os campos passados em extra={'metricas': ...}."""
+
+    def format(self, record):
+        linha = {
+            'momento': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'evento': record.getMessage(),
+            **getattr(record, 'metricas', {}),
+        }
+        if record.exc_info:
+            linha['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+# ==================== PROMETHEUS ====================
+
+def _segundos(microssegundos):
+    return f'{microssegundos / 1_000_000:.6f}'
+
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def texto_prometheus():
+    """Todas as métricas no formato de texto do Prometheus (soma de todos os processos)."""
+    from .cache import estatisticas  # o LOGGING carrega este módulo antes dos models
+
+    descarregar()
+    views = sorted(cache.get(f'{PREFIXO}:views') or ())
+    nomes = [*CONTADORES, *(f'faixa_{limite}' for limite in FAIXAS_DURACAO)]
+    valores = cache.get_many([_chave(view, nome) for view in views for nome in nomes])
+
+    def valor(view, nome):
+        return valores.get(_chave(view, nome), 0)
+
+    linhas = []
+
+    def metrica(nome, tipo, ajuda, amostras):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        linhas.extend(amostras)
+
+    def por_view(sufixo, contador, converter=str):
+        return [f'{sufixo}{{view="{_rotulo(view)}"}} {converter(valor(view, contador))}' for view in views]
+
+    duracao = []
+    for view in views:
+        rotulo = _rotulo(view)
+        for limite in FAIXAS_DURACAO:
+            duracao.append(f'manutencao_http_duracao_segundos_bucket{{view="{rotulo}",le="{limite}"}} {valor(view, f"faixa_{limite}")}')
+        duracao.append(f'manutencao_http_duracao_segundos_bucket{{view="{rotulo}",le="+Inf"}} {valor(view, "requisicoes")}')
+        duracao.append(f'manutencao_http_duracao_segundos_sum{{view="{rotulo}"}} {_segundos(valor(view, "total_us"))}')
+        duracao.append(f'manutencao_http_duracao_segundos_count{{view="{rotulo}"}} {valor(view, "requisicoes")}')
+    metrica('manutencao_http_duracao_segundos', 'histogram', 'Duração das requisições por view.', duracao)
+
+    metrica('manutencao_db_consultas_total', 'counter', 'Consultas SQL executadas.',
+            por_view('manutencao_db_consultas_total', 'consultas'))
+    metrica('manutencao_db_tempo_segundos_total', 'counter', 'Tempo gasto no banco.',
+            por_view('manutencao_db_tempo_segundos_total', 'db_us', _segundos))
+    metrica('manutencao_python_tempo_segundos_total', 'counter', 'Tempo fora do banco (Python, templates).',
+            por_view('manutencao_python_tempo_segundos_total', 'python_us', _segundos))
+    metrica('manutencao_http_resposta_bytes_total', 'counter', 'Bytes de resposta (streaming não conta).',
+            por_view('manutencao_http_resposta_bytes_total', 'bytes'))
+    metrica('manutencao_db_consultas_lentas_total', 'counter',
+            f'Consultas acima de {settings.METRICAS_CONSULTA_LENTA_MS} ms.',
+            por_view('manutencao_db_consultas_lentas_total', 'consultas_lentas'))
+    metrica('manutencao_orcamento_excedido_total', 'counter', 'Requisições acima do orçamento da view.', [
+        f'manutencao_orcamento_excedido_total{{view="{_rotulo(view)}",limite="{limite}"}} {valor(view, f"excedeu_{limite}")}'
+        for view in views for limite in ('consultas', 'ms')
+    ])
+
+    cache_amostras = []
+    for nome, contagem in estatisticas().items():
+        for evento in ('hit', 'miss'):
+            cache_amostras.append(f'manutencao_cache_total{{nome="{_rotulo(nome)}",evento="{evento}"}} {contagem[evento]}')
+    metrica('manutencao_cache_total', 'counter', 'Leituras do cache de aplicação.', cache_amostras)
+
+    return '\n'.join(linhas) + '\n'
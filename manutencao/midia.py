@@ -0,0 +1,108 @@
+# manutencao/midia.py
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def responder_arquivo(request, caminho, nome_relativo, cache_control='private, max-age=86400'):
+    """
+    Entrega um arquivo de mídia já autorizado pela view.
+    Com MEDIA_SERVIDOR='nginx' só devolve o cabeçalho X-Accel-Redirect e o
+    nginx manda os bytes (a thread do gunicorn fica livre na hora).
+    Com 'django' serve direto, com ETag/Last-Modified e suporte a Range.
+    """
+    estatistica = os.stat(caminho)
+    etag = f'"{int(estatistica.st_mtime):x}-{estatistica.st_size:x}"'  # mesmo formato do nginx
+    ultima_modificacao = estatistica.st_mtime
+
+    # 304 Not Modified se o navegador já tem essa versão
+    response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if response is None:
+        tipo, _ = mimetypes.guess_type(caminho)
+        tipo = tipo or 'application/octet-stream'
+
+        if settings.MEDIA_SERVIDOR == 'nginx':
+            response = HttpResponse(content_type=tipo)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIXO + quote(nome_relativo)
+        else:
+            response = _resposta_com_range(request, caminho, estatistica.st_size, tipo, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacao)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _resposta_com_range(request, caminho, tamanho, tipo, etag):
+    intervalo = _ler_range(request, tamanho, etag)
+    if intervalo is None:
+        response = FileResponse(open(caminho, 'rb'), content_type=tipo)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if intervalo == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamanho}'
+        return response
+
+    inicio, fim = intervalo
+    arquivo = open(caminho, 'rb')
+    arquivo.seek(inicio)
+    response = FileResponse(_ler_pedaco(arquivo, fim - inicio + 1), status=206, content_type=tipo)
+    response['Content-Length'] = str(fim - inicio + 1)
+    response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _ler_range(request, tamanho, etag):
+    """
+    Devolve (inicio, fim) para um Range simples, 'invalido' para 416,
+    ou None quando deve mandar o arquivo inteiro.
+    """
+    cabecalho = request.headers.get('Range')
+    if not cabecalho:
+        return None
+
+    # If-Range com outra versão: ignora o Range e manda tudo
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+
+    encontrado = RANGE_RE.match(cabecalho.strip())
+    if not encontrado:
+        return None  # múltiplos intervalos ou formato desconhecido: manda tudo
+
+    inicio, fim = encontrado.groups()
+    if inicio == '':
+        if fim == '':
+            return 'invalido'
+        # bytes=-500 -> os últimos 500 bytes
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio = int(inicio)
+        fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+
+    if inicio >= tamanho or inicio > fim:
+        return 'invalido'
+    return inicio, fim
+
+
+def _ler_pedaco(arquivo, restante, tamanho_bloco=64 * 1024):
+    try:
+        while restante > 0:
+            bloco = arquivo.read(min(tamanho_bloco, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+    finally:
+        arquivo.close()
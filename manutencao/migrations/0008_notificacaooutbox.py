@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0007_alter_rotinamanutencao_ultima_execucao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('novo_chamado', 'Novo Chamado'), ('mecanico_designado', 'Mecânico Designado')], max_length=30)),
+                ('topico', models.CharField(max_length=200)),
+                ('corpo', models.TextField()),
+                ('cabecalhos', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviado', 'Enviado'), ('falhou', 'Falhou (descartado)')], default='pendente', max_length=20)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('proxima_tentativa', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('chamado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes', to='manutencao.chamado')),
+                ('mecanico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificacoes_recebidas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notificação (Outbox)',
+                'verbose_name_plural': 'Notificações (Outbox)',
+                'ordering': ['criado_em'],
+                'indexes': [models.Index(fields=['status', 'proxima_tentativa'], name='outbox_status_prox_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:28
+
+from django.db import migrations, models
+
+
+def marcar_webp_como_processadas(apps, schema_editor):
+    # Fotos que o save() antigo já converteu não precisam passar pelo pipeline de novo
+    ImagemChamado = apps.get_model('manutencao', 'ImagemChamado')
+    ImagemChamado.objects.filter(imagem__iendswith='.webp').update(processada=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0008_notificacaooutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagemchamado',
+            name='processada',
+            field=models.BooleanField(default=False, verbose_name='Convertida para WebP?'),
+        ),
+        migrations.AddField(
+            model_name='imagemchamado',
+            name='processada_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(marcar_webp_como_processadas, migrations.RunPython.noop),
+    ]
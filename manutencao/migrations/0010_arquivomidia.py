@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:30
+
+import manutencao.models
+import manutencao.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0009_imagemchamado_processada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoMidia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash_sha256', models.CharField(max_length=64, unique=True)),
+                ('nome', models.CharField(max_length=500, unique=True)),
+                ('tamanho', models.PositiveBigIntegerField(default=0)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Arquivo de Mídia',
+                'verbose_name_plural': 'Arquivos de Mídia',
+            },
+        ),
+        migrations.AlterField(
+            model_name='equipamento',
+            name='imagem',
+            field=models.ImageField(blank=True, max_length=500, null=True, storage=manutencao.storage.armazenamento_midia, upload_to=manutencao.models.caminho_imagem_equipamento, validators=[manutencao.models.validar_tamanho_imagem]),
+        ),
+        migrations.AlterField(
+            model_name='imagemchamado',
+            name='imagem',
+            field=models.ImageField(storage=manutencao.storage.armazenamento_midia, upload_to='chamados/'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:31
+
+import manutencao.models
+import manutencao.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0010_arquivomidia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='equipamento',
+            name='imagem',
+            field=models.ImageField(blank=True, max_length=500, null=True, storage=manutencao.storage.armazenamento_midia, upload_to=manutencao.models.caminho_imagem_equipamento, validators=[manutencao.models.validar_tamanho_imagem, manutencao.models.validar_dimensoes_imagem]),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0011_equipamento_validar_dimensoes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chamado',
+            name='data_execucao_rotina',
+            field=models.DateField(blank=True, null=True, verbose_name='Data prevista da rotina'),
+        ),
+        migrations.AddConstraint(
+            model_name='chamado',
+            constraint=models.UniqueConstraint(fields=('rotina_origem', 'data_execucao_rotina'), name='chamado_rotina_execucao_unica'),
+        ),
+    ]
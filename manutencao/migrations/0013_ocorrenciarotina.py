@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:36
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def preencher_calendario(apps, schema_editor):
+    # Monta o calendário inicial das rotinas ativas (depois disso é mantido pelo signal/tasks)
+    from manutencao.rotinas import ocorrencias_entre
+
+    RotinaManutencao = apps.get_model('manutencao', 'RotinaManutencao')
+    OcorrenciaRotina = apps.get_model('manutencao', 'OcorrenciaRotina')
+    ate = timezone.localdate() + timedelta(days=settings.ROTINAS_HORIZONTE_DIAS)
+
+    novas = []
+    for rotina in RotinaManutencao.objects.filter(ativo=True).select_related('equipamento'):
+        setor_id = rotina.setor_id or (rotina.equipamento.setor_id if rotina.equipamento_id else None)
+        novas.extend(
+            OcorrenciaRotina(rotina_id=rotina.id, data=data, setor_id=setor_id, equipamento_id=rotina.equipamento_id)
+            for data in ocorrencias_entre(rotina, rotina.proxima_execucao, ate)
+        )
+    OcorrenciaRotina.objects.bulk_create(novas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0012_chamado_data_execucao_rotina'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcorrenciaRotina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('equipamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ocorrencias_rotina', to='manutencao.equipamento')),
+                ('rotina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocorrencias', to='manutencao.rotinamanutencao')),
+                ('setor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ocorrencias_rotina', to='manutencao.setor')),
+            ],
+            options={
+                'verbose_name': 'Ocorrência de Rotina',
+                'verbose_name_plural': 'Ocorrências de Rotina',
+                'ordering': ['data'],
+                'indexes': [models.Index(fields=['data', 'setor'], name='ocorrencia_data_setor_idx'), models.Index(fields=['data', 'equipamento'], name='ocorrencia_data_equip_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rotina', 'data'), name='ocorrencia_rotina_data_unica')],
+            },
+        ),
+        migrations.RunPython(preencher_calendario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0013_ocorrenciarotina'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(fields=['solicitante', '-criado_em'], name='chamado_solicitante_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(fields=['equipamento', '-criado_em'], name='chamado_equip_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(fields=['setor_avulso', 'tipo', '-criado_em'], name='chamado_setor_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(fields=['status', '-criado_em'], name='chamado_status_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(fields=['-criado_em', '-id'], name='chamado_criado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chamado',
+            index=models.Index(condition=models.Q(('status__in', ['pendente', 'em_progresso'])), fields=['-producao_parada', 'prioridade', '-criado_em'], name='chamado_abertos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rotinamanutencao',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['proxima_execucao'], name='rotina_ativa_proxima_idx'),
+        ),
+    ]
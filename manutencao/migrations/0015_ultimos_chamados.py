@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def preencher_ultimos_chamados(apps, schema_editor):
+    # Calcula os ponteiros de todos os equipamentos e setores a partir dos chamados existentes
+    from manutencao.ultimos_chamados import atualizar_ultimos_chamados
+    atualizar_ultimos_chamados(None, None, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0014_indices_chamado_rotina'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultima_atividade',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultimo_chamado',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultimo_chamado_concluido',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultimo_chamado_em_progresso',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='equipamento',
+            name='ultimo_chamado_pendente',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='setor',
+            name='ultima_atividade_avulso',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='setor',
+            name='ultimo_avulso',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='setor',
+            name='ultimo_avulso_concluido',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='setor',
+            name='ultimo_avulso_em_progresso',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.AddField(
+            model_name='setor',
+            name='ultimo_avulso_pendente',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.chamado'),
+        ),
+        migrations.RunPython(preencher_ultimos_chamados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:49
+
+import logging
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+TABELA = 'manutencao_documentobusca'
+FTS = 'manutencao_documentobusca_fts'
+
+SQL_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    # Vetor gerado pelo próprio banco: o título pesa mais (A) que o conteúdo (B)
+    f"""ALTER TABLE {TABELA} ADD COLUMN vetor tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(conteudo, '')), 'B')
+    ) STORED""",
+    f'CREATE INDEX documento_busca_vetor_idx ON {TABELA} USING GIN (vetor)',
+    f'CREATE INDEX documento_busca_titulo_trgm_idx ON {TABELA} USING GIN (titulo gin_trgm_ops)',
+]
+
+SQL_SQLITE = [
+    # FTS5 "external content": o texto fica só na tabela normal, os triggers mantêm o índice
+    f"""CREATE VIRTUAL TABLE {FTS} USING fts5(
+        titulo, conteudo, content='{TABELA}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {TABELA}_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO {FTS}(rowid, titulo, conteudo) VALUES (new.id, new.titulo, new.conteudo);
+    END""",
+    f"""CREATE TRIGGER {TABELA}_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO {FTS}({FTS}, rowid, titulo, conteudo) VALUES ('delete', old.id, old.titulo, old.conteudo);
+    END""",
+    f"""CREATE TRIGGER {TABELA}_au AFTER UPDATE ON {TABELA} BEGIN
+        INSERT INTO {FTS}({FTS}, rowid, titulo, conteudo) VALUES ('delete', old.id, old.titulo, old.conteudo);
+        INSERT INTO {FTS}(rowid, titulo, conteudo) VALUES (new.id, new.titulo, new.conteudo);
+    END""",
+]
+
+
+def criar_indices_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in SQL_POSTGRES:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        try:
+            for sql in SQL_SQLITE:
+                schema_editor.execute(sql)
+        except Exception as e:
+            # SQLite compilado sem FTS5: a busca cai no icontains (ver busca.py)
+            logger.warning("FTS5 indisponível, busca sem índice de texto: %s", e)
+
+
+def remover_indices_texto(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS}')
+    # No PostgreSQL a coluna e os índices somem junto com a tabela
+
+
+def indexar_existentes(apps, schema_editor):
+    from manutencao.busca import indexar_equipamentos, indexar_chamados
+    indexar_equipamentos(apps=apps)
+    indexar_chamados(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0015_ultimos_chamados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('equipamento', 'Equipamento'), ('chamado', 'Chamado')], max_length=20)),
+                ('objeto_id', models.PositiveIntegerField()),
+                ('titulo', models.CharField(max_length=300)),
+                ('conteudo', models.TextField(blank=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('equipamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.equipamento')),
+                ('setor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='manutencao.setor')),
+            ],
+            options={
+                'verbose_name': 'Documento de Busca',
+                'verbose_name_plural': 'Documentos de Busca',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='documento_busca_objeto_unico')],
+            },
+        ),
+        migrations.RunPython(criar_indices_texto, remover_indices_texto),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
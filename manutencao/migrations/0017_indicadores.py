@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:52
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_indicadores(apps, schema_editor):
+    # Rollups de todo o histórico existente
+    from manutencao.indicadores import recalcular_indicadores
+    recalcular_indicadores(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0016_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicadorDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('escopo', models.CharField(choices=[('equipamento', 'Equipamento'), ('setor', 'Setor'), ('mecanico', 'Mecânico')], max_length=20)),
+                ('abertos', models.PositiveIntegerField(default=0)),
+                ('falhas', models.PositiveIntegerField(default=0)),
+                ('iniciados', models.PositiveIntegerField(default=0)),
+                ('concluidos', models.PositiveIntegerField(default=0)),
+                ('tempo_resposta_total', models.DurationField(default=datetime.timedelta)),
+                ('tempo_reparo_total', models.DurationField(default=datetime.timedelta)),
+                ('tempo_parada_total', models.DurationField(default=datetime.timedelta)),
+                ('equipamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='indicadores', to='manutencao.equipamento')),
+                ('mecanico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='indicadores', to=settings.AUTH_USER_MODEL)),
+                ('setor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='indicadores', to='manutencao.setor')),
+            ],
+            options={
+                'verbose_name': 'Indicador Diário',
+                'verbose_name_plural': 'Indicadores Diários',
+                'indexes': [models.Index(fields=['escopo', 'data'], name='indicador_escopo_data_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('escopo', 'equipamento')), fields=('escopo', 'equipamento', 'data'), name='indicador_equipamento_dia_unico'), models.UniqueConstraint(condition=models.Q(('escopo', 'setor')), fields=('escopo', 'setor', 'data'), name='indicador_setor_dia_unico'), models.UniqueConstraint(condition=models.Q(('escopo', 'mecanico')), fields=('escopo', 'mecanico', 'data'), name='indicador_mecanico_dia_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_indicadores, migrations.RunPython.noop),
+    ]
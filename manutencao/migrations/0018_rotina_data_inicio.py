@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 00:16
+
+from django.db import migrations, models
+
+
+def preencher_data_inicio(apps, schema_editor):
+    # Sem o histórico da série, ela passa a começar na próxima execução já gravada
+    RotinaManutencao = apps.get_model('manutencao', 'RotinaManutencao')
+    RotinaManutencao.objects.filter(data_inicio__isnull=True).update(data_inicio=models.F('proxima_execucao'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutencao', '0017_indicadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rotinamanutencao',
+            name='data_inicio',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_data_inicio, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,22 @@
 # ==================== MODELS.PY ====================
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from PIL import Image, ImageOps
 import os
-from io import BytesIO
 from django.core.files.base import ContentFile
 from django.core.files import File
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
+import logging
 import time
+from datetime import timedelta
+
+from .imagens import transcodificar_para_webp, nome_webp, abrir_reduzida, arquivo_temporario_imagem
+from .storage import armazenamento_midia
+from .rotinas import na_serie
+
+logger = logging.getLogger(__name__)
 
 
 class Usuario(AbstractUser):
@@ -42,6 +49,13 @@ class Setor(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     energia = models.ForeignKey(Energia, on_delete=models.PROTECT, verbose_name="Poste/Energia")
 
+    # Último chamado avulso do setor (geral e por status), mantido por ultimos_chamados.py
+    ultimo_avulso = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultimo_avulso_pendente = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultimo_avulso_em_progresso = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultimo_avulso_concluido = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultima_atividade_avulso = models.DateTimeField(null=True, blank=True, db_index=True, editable=False)
+
     class Meta:
         verbose_name = 'Setor'
         verbose_name_plural = 'Setores'
@@ -55,6 +69,21 @@ def validar_tamanho_imagem(value):
     if value.size > limit:
         raise ValidationError('A imagem é muito pesada. O limite é de 5MB.')
     
+def validar_dimensoes_imagem(value):
+    # Lê só o cabeçalho da imagem (não decodifica) para barrar fotos gigantes
+    from django.conf import settings
+    try:
+        largura, altura = Image.open(value).size
+    except Exception:
+        return  # o ImageField já reclama de arquivo que não é imagem
+    finally:
+        value.seek(0)
+    if largura * altura > settings.IMAGENS_MAX_PIXELS:
+        raise ValidationError(
+            f'A imagem tem resolução muito alta ({largura}x{altura}). '
+            f'O limite é de {settings.IMAGENS_MAX_PIXELS // 1_000_000} megapixels.'
+        )
+
 def caminho_imagem_equipamento(instance, filename):
     # Pega a extensao original e força para minúsculo (.PNG > .png)
     extensao = os.path.splitext(filename)[1].lower()
@@ -67,19 +96,46 @@ def caminho_imagem_equipamento(instance, filename):
     timestamp = int(time.time())
     
     # Nome final: codigo_equipamento_1705934123.png
+    # (o storage troca o nome pelo hash do conteúdo, só a pasta e a extensão ficam)
     novo_nome = f"{prefixo}_{timestamp}{extensao}"
     
     # Retorna o caminho final dentro da pasta media
     return os.path.join('equipamentos/', novo_nome)
 
+class ArquivoMidia(models.Model):
+    """
+    Índice do storage endereçado por conteúdo: um registro por arquivo
+    físico em disco, com quantos campos de imagem apontam para ele.
+    """
+    hash_sha256 = models.CharField(max_length=64, unique=True)
+    nome = models.CharField(max_length=500, unique=True)  # caminho relativo ao MEDIA_ROOT
+    tamanho = models.PositiveBigIntegerField(default=0)
+    referencias = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Arquivo de Mídia'
+        verbose_name_plural = 'Arquivos de Mídia'
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias} ref.)"
+
+
 class Equipamento(models.Model):
     nome = models.CharField(max_length=100)
     setor = models.ForeignKey(Setor, on_delete=models.CASCADE, related_name='equipamentos')
     codigo = models.CharField(max_length=50, unique=True, null=True, blank=True, verbose_name="Código do Equipamento")
     descricao = models.TextField(blank=True)
-    imagem = models.ImageField(upload_to=caminho_imagem_equipamento,  validators=[validar_tamanho_imagem], blank=True, null=True, max_length=500)    
+    imagem = models.ImageField(upload_to=caminho_imagem_equipamento, storage=armazenamento_midia, validators=[validar_tamanho_imagem, validar_dimensoes_imagem], blank=True, null=True, max_length=500)    
     criado_em = models.DateTimeField(auto_now_add=True)
     energia = models.ForeignKey(Energia, on_delete=models.SET_NULL, null=True, blank=True,verbose_name="Poste/Energia")
+
+    # Último chamado do equipamento (geral e por status), mantido por ultimos_chamados.py
+    ultimo_chamado = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultimo_chamado_pendente = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultimo_chamado_em_progresso = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultimo_chamado_concluido = models.ForeignKey('Chamado', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False)
+    ultima_atividade = models.DateTimeField(null=True, blank=True, db_index=True, editable=False)
     
     class Meta:
         verbose_name = 'Equipamento'
@@ -88,6 +144,14 @@ class Equipamento(models.Model):
     
     def __str__(self):
         return f"{self.nome} - {self.setor.nome}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Setor lido do banco: se o equipamento mudar de setor, os dois setores mudam de versão (cache.py)
+        instancia._setor_original = dict(zip(field_names, values)).get('setor_id')
+        return instancia
+
     # --- NOVO MÉTODO SAVE ---
     def save(self, *args, **kwargs):
         if self.codigo == "":
@@ -99,8 +163,10 @@ class Equipamento(models.Model):
         super().save(*args, **kwargs)
 
     def otimizar_imagem(self):
-        # 1. Abre a imagem usando o Pillow
-        img = Image.open(self.imagem)
+        # 1. Abre a imagem já em escala reduzida (draft do JPEG): uma foto de 12MP
+        # é decodificada em 1/2 ou 1/4 da resolução, sem montar o bitmap completo
+        output_size = (1024, 1024)
+        img = abrir_reduzida(self.imagem, output_size)
 
         #gira a imagem de celular que vem virada por padrao
         img = ImageOps.exif_transpose(img)
@@ -110,11 +176,10 @@ class Equipamento(models.Model):
             img = img.convert('RGB')
             
         # 3. Redimensiona para um tamanho máximo (Ex: 1024px) mantendo a proporção
-        output_size = (1024, 1024)
         img.thumbnail(output_size, Image.LANCZOS)
         
-        # 4. Salva o resultado em memória (BytesIO)
-        buffer = BytesIO()
+        # 4. Salva o resultado num arquivo temporário (vai para o disco se crescer)
+        buffer = arquivo_temporario_imagem()
         img.save(buffer, format='JPEG', quality=75, optimize=True)
         buffer.seek(0)
         
@@ -151,14 +216,84 @@ class RotinaManutencao(models.Model):
     
     ultima_execucao = models.DateField(null=True, blank=True)
     proxima_execucao = models.DateField() # O sistema vai olhar para esta data
+    # Início da série: no mensal as próximas datas saem dela (31/01 -> 28/02 -> 31/03)
+    data_inicio = models.DateField(null=True, blank=True, editable=False)
     
     ativo = models.BooleanField(default=True)
     criado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            # verificar_rotinas: rotinas ativas vencidas (índice parcial, ignora as desativadas)
+            models.Index(fields=['proxima_execucao'], name='rotina_ativa_proxima_idx', condition=models.Q(ativo=True)),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Rotina nova, ou data/frequência editadas para fora da série: a série recomeça aqui
+        if self.data_inicio is None or not na_serie(self, self.data_inicio, self.proxima_execucao):
+            self.data_inicio = self.proxima_execucao
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nome_rotina} - {self.equipamento.nome}"
 
 
+class OcorrenciaRotina(models.Model):
+    """
+    Calendário materializado das rotinas: uma linha por data prevista dentro
+    do horizonte (ROTINAS_HORIZONTE_DIAS). Refeito sempre que a rotina é salva
+    ou executada, para que "o que vem por aí entre d1 e d2" seja uma consulta só.
+    """
+    rotina = models.ForeignKey(RotinaManutencao, on_delete=models.CASCADE, related_name='ocorrencias')
+    data = models.DateField()
+    # Copiados da rotina para filtrar sem JOIN (rotina de equipamento herda o setor dele)
+    setor = models.ForeignKey('Setor', on_delete=models.CASCADE, null=True, blank=True, related_name='ocorrencias_rotina')
+    equipamento = models.ForeignKey('Equipamento', on_delete=models.CASCADE, null=True, blank=True, related_name='ocorrencias_rotina')
+
+    class Meta:
+        verbose_name = 'Ocorrência de Rotina'
+        verbose_name_plural = 'Ocorrências de Rotina'
+        ordering = ['data']
+        constraints = [
+            models.UniqueConstraint(fields=['rotina', 'data'], name='ocorrencia_rotina_data_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['data', 'setor'], name='ocorrencia_data_setor_idx'),
+            models.Index(fields=['data', 'equipamento'], name='ocorrencia_data_equip_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.rotina.nome_rotina} em {self.data:%d/%m/%Y}"
+
+
+class ChamadoQuerySet(models.QuerySet):
+    def for_listing(self, com_equipe=False, com_imagens=False):
+        """
+        Carrega junto tudo que os cards/listas de chamados mostram
+        (solicitante, equipamento e setor, setor avulso, quem concluiu),
+        para a página custar um número fixo de consultas.
+        com_equipe/com_imagens fazem o prefetch dos mecânicos e das fotos
+        só nas telas que exibem essas informações.
+        """
+        queryset = self.select_related('solicitante', 'equipamento__setor', 'setor_avulso', 'concluido_por')
+        if com_equipe:
+            queryset = queryset.prefetch_related('mecanicos')
+        if com_imagens:
+            queryset = queryset.prefetch_related('imagens')
+        return queryset
+
+    def atribuidos(self, mecanico=None):
+        # EXISTS na tabela intermediária: sem JOIN, sem DISTINCT e sem linhas duplicadas
+        atribuicoes = Chamado.mecanicos.through.objects.filter(chamado_id=models.OuterRef('pk'))
+        if mecanico is not None:
+            atribuicoes = atribuicoes.filter(usuario_id=mecanico.id)
+        return self.filter(models.Exists(atribuicoes))
+
+    def sem_equipe(self):
+        atribuicoes = Chamado.mecanicos.through.objects.filter(chamado_id=models.OuterRef('pk'))
+        return self.filter(~models.Exists(atribuicoes))
+
+
 class Chamado(models.Model):
     STATUS_CHOICES = [
         ('pendente', 'Pendente'),
@@ -187,6 +322,7 @@ class Chamado(models.Model):
 
     is_rotina = models.BooleanField(default=False, verbose_name="Gerado por Rotina?")
     rotina_origem = models.ForeignKey(RotinaManutencao, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Rotina de Origem")
+    data_execucao_rotina = models.DateField(null=True, blank=True, verbose_name="Data prevista da rotina")
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
     prioridade = models.IntegerField(default=3, choices=PRIORIDADE_CHOICES)
@@ -199,11 +335,34 @@ class Chamado(models.Model):
     concluido_por = models.ForeignKey(Usuario,on_delete=models.SET_NULL, null=True, blank=True, related_name='chamados_concluidos')
 
     observacoes_mecanico = models.TextField(blank=True)
+
+    objects = ChamadoQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Chamado'
         verbose_name_plural = 'Chamados'
         ordering = ['-criado_em']
+        constraints = [
+            # Uma rotina gera no máximo um chamado por data: rodar o agendador de novo não duplica nada
+            models.UniqueConstraint(fields=['rotina_origem', 'data_execucao_rotina'], name='chamado_rotina_execucao_unica'),
+        ]
+        # Índices tirados das telas (ver "python manage.py benchmark_indices"):
+        indexes = [
+            # solicitante_dashboard: meus chamados, mais recentes primeiro
+            models.Index(fields=['solicitante', '-criado_em'], name='chamado_solicitante_idx'),
+            # historico_equipamento / historico_setor
+            models.Index(fields=['equipamento', '-criado_em'], name='chamado_equip_criado_idx'),
+            models.Index(fields=['setor_avulso', 'tipo', '-criado_em'], name='chamado_setor_tipo_idx'),
+            # filtro por status e listas gerais (inclui o id para a paginação por cursor)
+            models.Index(fields=['status', '-criado_em'], name='chamado_status_criado_idx'),
+            models.Index(fields=['-criado_em', '-id'], name='chamado_criado_id_idx'),
+            # Fila de trabalho: só os chamados abertos, na ordem de atendimento
+            models.Index(
+                fields=['-producao_parada', 'prioridade', '-criado_em'],
+                name='chamado_abertos_idx',
+                condition=models.Q(status__in=['pendente', 'em_progresso']),
+            ),
+        ]
 
     @property
     def nome_setor(self):
@@ -213,6 +372,18 @@ class Chamado(models.Model):
             return self.equipamento.setor.nome
         return "N/A"
     
+    def equipe_com_entrega(self):
+        """
+        Lista (mecanico, notificacao) com a situação da última notificação
+        de designação enviada para cada mecânico da equipe (None se não houve).
+        Usa o prefetch de 'mecanicos' e 'notificacoes' quando disponível.
+        """
+        entregas = {}
+        for notificacao in self.notificacoes.all():
+            if notificacao.tipo == 'mecanico_designado':
+                entregas[notificacao.mecanico_id] = notificacao  # ordenadas por criado_em: a última vence
+        return [(mecanico, entregas.get(mecanico.id)) for mecanico in self.mecanicos.all()]
+
     def esta_concluido(self):
         return self.status == 'concluido'
 
@@ -276,59 +447,48 @@ class Chamado(models.Model):
         else:
             return f"{segundos}seg"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Guarda o status lido do banco para detectar a transição para 'concluido'
+        # e onde o chamado estava (para atualizar o "último chamado" de quem ele deixou)
+        originais = dict(zip(field_names, values))
+        instancia._status_original = originais.get('status')
+        instancia._equipamento_original = originais.get('equipamento_id')
+        instancia._setor_avulso_original = originais.get('setor_avulso_id')
+        return instancia
+
     def save(self, *args, **kwargs):
     # salva o chamado primeiro
         super().save(*args, **kwargs)
 
-        # Se concluido processa as fotos para economizar espaço
-        if self.status == 'concluido':
-            imagens = self.imagens.all()
-            
-            for img_obj in imagens:
-                if img_obj.imagem:
-                    # 1 Abrir a imagem original
-                    img_path = img_obj.imagem.path
-                    
-                    # Verifica se o arquivo existe e se ja nao é um .webp (para não processar duas vezes)
-                    if os.path.exists(img_path) and not img_path.lower().endswith('.webp'):
-                        img = Image.open(img_path)
-
-                        #Girar a foto que vem girada do celular
-                        img = ImageOps.exif_transpose(img)
-
-                        #aqui ele garante que a imagem seja no modo RGB
-                        if img.mode in ("RGBA", "P"):
-                            img = img.convert("RGB")
-
-                        # 2 Redimensionar (Mantendo a proporção)
-                        # Se a foto for gigante, limita a largura máxima para 800px
-                        max_size = (800, 800)
-                        img.thumbnail(max_size, Image.LANCZOS)
-
-                        # 3 Converter para WebP em memória
-                        temp_thumb = BytesIO()
-                        img.save(temp_thumb, format='WEBP', quality=70) # Qualidade 70 
-                        temp_thumb.seek(0)
-
-                        # 4 Atualiza o arquivo no objeto
-                        # Muda a extensão do nome do arquivo
-                        nome_arquivo = os.path.splitext(os.path.basename(img_path))[0] + ".webp"
-                        
-                        # Salva o novo arquivo e deleta o antigo automaticamente
-                        img_obj.imagem.save(nome_arquivo, ContentFile(temp_thumb.read()), save=False)
-                        img_obj.save()
-                        
-                        # 5 Remove o arquivo original antigo  
-                        # mas para garantir espaço em disco imediato):
-                        if os.path.exists(img_path) and not img_path.endswith('.webp'):
-                            os.remove(img_path)
+        # Se acabou de ser concluido, agenda o processamento das fotos para economizar espaço
+        # (roda no Celery, o POST do mecânico não espera a conversão)
+        if self.status == 'concluido' and getattr(self, '_status_original', None) != 'concluido':
+            self.agendar_processamento_imagens()
+        self._status_original = self.status
+
+    def agendar_processamento_imagens(self):
+        chamado_id = self.id
+
+        def _disparar():
+            from .tasks import processar_imagens_chamado
+            try:
+                processar_imagens_chamado.delay(chamado_id)
+            except Exception:
+                # Broker fora: as fotos ficam com processada=False para o backfill
+                logger.exception("Erro ao agendar processamento das imagens do chamado #%s", chamado_id)
+
+        transaction.on_commit(_disparar)
 
 
 class ImagemChamado(models.Model):
     chamado = models.ForeignKey(Chamado, on_delete=models.CASCADE, related_name='imagens')
-    imagem = models.ImageField(upload_to='chamados/')
+    imagem = models.ImageField(upload_to='chamados/', storage=armazenamento_midia)
     descricao = models.CharField(max_length=200, blank=True)
     enviado_em = models.DateTimeField(auto_now_add=True)
+    processada = models.BooleanField(default=False, verbose_name="Convertida para WebP?")
+    processada_em = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         verbose_name = 'Imagem do Chamado'
@@ -337,5 +497,163 @@ class ImagemChamado(models.Model):
     
     def __str__(self):
         return f"Imagem #{self.id} - Chamado #{self.chamado.id}"
+
+    def processar(self):
+        """
+        Converte a foto para WebP (800px) e apaga o original.
+        Retorna (bytes_antes, bytes_depois) ou None se não havia nada a converter.
+        """
+        if self.processada or not self.imagem:
+            return None
+
+        storage = self.imagem.storage
+        # Já é .webp ou o arquivo sumiu do disco: só marca como processada
+        if self.imagem.name.lower().endswith('.webp') or not storage.exists(self.imagem.name):
+            self.marcar_processada()
+            return None
+
+        antes = storage.size(self.imagem.name)
+        conteudo = transcodificar_para_webp(self.imagem.path)
+        self.salvar_webp(conteudo)
+        return antes, len(conteudo)
+
+    def salvar_webp(self, conteudo):
+        """
+        Grava os bytes WebP já convertidos no lugar da foto original.
+        """
+        storage = self.imagem.storage
+        nome_antigo = self.imagem.name
+
+        # Salva o novo arquivo pelo storage e marca como processada
+        self.imagem.save(nome_webp(nome_antigo), ContentFile(conteudo), save=False)
+        self.marcar_processada(campos_extras=['imagem'])
+
+        # Remove o arquivo original antigo para liberar espaço em disco
+        if nome_antigo != self.imagem.name:
+            storage.delete(nome_antigo)
+
+    def marcar_processada(self, campos_extras=()):
+        self.processada = True
+        self.processada_em = timezone.now()
+        self.save(update_fields=['processada', 'processada_em', *campos_extras])
     
 
+
+class NotificacaoOutbox(models.Model):
+    """
+    Fila persistente das notificações push (ntfy).
+    Gravada na mesma transação do chamado e drenada pelo Celery,
+    assim a requisição nunca espera o provedor de push.
+    """
+    TIPO_CHOICES = [
+        ('novo_chamado', 'Novo Chamado'),
+        ('mecanico_designado', 'Mecânico Designado'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou (descartado)'),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    chamado = models.ForeignKey(Chamado, on_delete=models.CASCADE, related_name='notificacoes')
+    mecanico = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='notificacoes_recebidas')
+
+    # Mensagem já montada no momento do enfileiramento
+    topico = models.CharField(max_length=200)
+    corpo = models.TextField()
+    cabecalhos = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Notificação (Outbox)'
+        verbose_name_plural = 'Notificações (Outbox)'
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa'], name='outbox_status_prox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - Chamado #{self.chamado_id} ({self.get_status_display()})"
+
+
+class DocumentoBusca(models.Model):
+    """
+    Índice de busca: um documento por equipamento/chamado, com o texto já montado.
+    No PostgreSQL a tabela ganha uma coluna tsvector (GIN) e um índice de trigramas;
+    no SQLite uma tabela FTS5 sincronizada por triggers (ver migration e busca.py).
+    """
+    TIPO_CHOICES = [
+        ('equipamento', 'Equipamento'),
+        ('chamado', 'Chamado'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    objeto_id = models.PositiveIntegerField()
+    titulo = models.CharField(max_length=300)
+    conteudo = models.TextField(blank=True)
+    # Para montar o link do resultado sem voltar ao banco
+    equipamento = models.ForeignKey('Equipamento', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    setor = models.ForeignKey('Setor', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Documento de Busca'
+        verbose_name_plural = 'Documentos de Busca'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='documento_busca_objeto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.titulo}"
+
+
+class IndicadorDiario(models.Model):
+    """
+    Rollup diário de KPIs por equipamento, setor ou mecânico (ver indicadores.py).
+    Guarda só somas e contagens, que podem ser somadas entre dias; as médias
+    (MTTR, tempo de resposta) e o MTBF saem na leitura. Cada evento conta no dia
+    em que aconteceu: abertura em criado_em, início em iniciado_em, conclusão em concluido_em.
+    """
+    ESCOPO_CHOICES = [
+        ('equipamento', 'Equipamento'),
+        ('setor', 'Setor'),
+        ('mecanico', 'Mecânico'),
+    ]
+
+    data = models.DateField()
+    escopo = models.CharField(max_length=20, choices=ESCOPO_CHOICES)
+    equipamento = models.ForeignKey(Equipamento, on_delete=models.CASCADE, null=True, blank=True, related_name='indicadores')
+    setor = models.ForeignKey(Setor, on_delete=models.CASCADE, null=True, blank=True, related_name='indicadores')
+    mecanico = models.ForeignKey(Usuario, on_delete=models.CASCADE, null=True, blank=True, related_name='indicadores')
+
+    abertos = models.PositiveIntegerField(default=0)
+    falhas = models.PositiveIntegerField(default=0)  # abertos que não vieram de rotina (base do MTBF)
+    iniciados = models.PositiveIntegerField(default=0)
+    concluidos = models.PositiveIntegerField(default=0)
+    tempo_resposta_total = models.DurationField(default=timedelta)  # soma de iniciado_em - criado_em
+    tempo_reparo_total = models.DurationField(default=timedelta)    # soma de concluido_em - criado_em
+    tempo_parada_total = models.DurationField(default=timedelta)    # idem, só dos chamados com produção parada
+
+    class Meta:
+        verbose_name = 'Indicador Diário'
+        verbose_name_plural = 'Indicadores Diários'
+        constraints = [
+            models.UniqueConstraint(fields=['escopo', 'equipamento', 'data'], condition=models.Q(escopo='equipamento'), name='indicador_equipamento_dia_unico'),
+            models.UniqueConstraint(fields=['escopo', 'setor', 'data'], condition=models.Q(escopo='setor'), name='indicador_setor_dia_unico'),
+            models.UniqueConstraint(fields=['escopo', 'mecanico', 'data'], condition=models.Q(escopo='mecanico'), name='indicador_mecanico_dia_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['escopo', 'data'], name='indicador_escopo_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_escopo_display()} em {self.data:%d/%m/%Y}"
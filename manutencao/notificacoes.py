@@ -0,0 +1,190 @@
+# manutencao/notificacoes.py
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class BackendNotificacao:
+    """
+    Interface dos backends de notificação push.
+    enviar() deve levantar exceção em caso de falha (o outbox cuida das tentativas).
+    """
+    def enviar(self, topico, corpo, headers):
+        raise NotImplementedError
+
+
+class NtfyBackend(BackendNotificacao):
+    """
+    Envia para o ntfy reaproveitando conexões (keep-alive).
+    A sessão é criada uma vez por processo: depois do fork do gunicorn/celery
+    cada worker abre o seu próprio pool em vez de herdar sockets do pai.
+    """
+    def __init__(self, base_url=None, timeout=None, tamanho_pool=None):
+        self.base_url = (base_url or settings.NTFY_BASE_URL).rstrip('/')
+        self.timeout = timeout or settings.NOTIFICACOES_TIMEOUT
+        self.tamanho_pool = tamanho_pool or settings.NOTIFICACOES_POOL_TAMANHO
+        self._sessao = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def sessao(self):
+        if self._sessao is None or self._pid != os.getpid():
+            with self._lock:
+                if self._sessao is None or self._pid != os.getpid():
+                    sessao = requests.Session()
+                    adaptador = HTTPAdapter(
+                        pool_connections=1,  # um único host (o servidor ntfy)
+                        pool_maxsize=self.tamanho_pool,
+                        max_retries=0,  # quem faz retry é o outbox
+                    )
+                    sessao.mount('http://', adaptador)
+                    sessao.mount('https://', adaptador)
+                    self._sessao = sessao
+                    self._pid = os.getpid()
+        return self._sessao
+
+    def enviar(self, topico, corpo, headers):
+        response = self.sessao.post(
+            f"{self.base_url}/{topico}",
+            data=corpo.encode('utf-8'),
+            headers=headers,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.status_code
+
+
+class MemoriaBackend(BackendNotificacao):
+    """
+    Guarda as mensagens em memória. Usado em testes e medições de vazão sem rede.
+    """
+    def __init__(self):
+        self.enviadas = []
+        self._lock = threading.Lock()
+
+    def enviar(self, topico, corpo, headers):
+        with self._lock:
+            self.enviadas.append({'topico': topico, 'corpo': corpo, 'headers': dict(headers)})
+        return 200
+
+    def limpar(self):
+        with self._lock:
+            self.enviadas = []
+
+
+class ArquivoBackend(BackendNotificacao):
+    """
+    Grava uma linha JSON por mensagem (settings.NOTIFICACOES_ARQUIVO).
+    Útil em desenvolvimento e em testes de carga com vários processos.
+    """
+    def __init__(self, caminho=None):
+        self.caminho = str(caminho or settings.NOTIFICACOES_ARQUIVO)
+        self._lock = threading.Lock()
+
+    def enviar(self, topico, corpo, headers):
+        linha = json.dumps({
+            'enviado_em': timezone.now().isoformat(),
+            'topico': topico,
+            'corpo': corpo,
+            'headers': dict(headers),
+        }, ensure_ascii=False)
+        with self._lock:
+            with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(linha + '\n')
+        return 200
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Retorna a instância do backend configurado em settings.NOTIFICACOES_BACKEND,
+    compartilhada por todas as threads do processo.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.NOTIFICACOES_BACKEND)()
+    return _backend
+
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    # Pool de threads limitado e reaproveitado pelo processo (recriado após fork)
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _backend_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.NOTIFICACOES_MAX_PARALELO,
+                    thread_name_prefix='notificacoes',
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+# Envio que passou do prazo do lote já em andamento: a thread não tem como ser
+# interrompida e o ntfy ainda pode receber a mensagem depois, então não é falha.
+ENVIO_INDEFINIDO = object()
+
+
+def despachar_em_paralelo(mensagens, prazo=None):
+    """
+    Envia várias mensagens ao mesmo tempo usando o pool limitado.
+    mensagens: lista de (chave, topico, corpo, headers).
+    Retorna {chave: None} para sucesso, {chave: 'mensagem de erro'} para falha
+    ou {chave: ENVIO_INDEFINIDO} quando o envio ainda estava rodando no prazo.
+    O lote inteiro espera no máximo `prazo` segundos: a latência total é a do
+    envio mais lento, não a soma de todos.
+    """
+    if prazo is None:
+        prazo = settings.NOTIFICACOES_PRAZO_LOTE_SEGUNDOS
+
+    backend = get_backend()
+    executor = _get_executor()
+    futuros = {
+        executor.submit(backend.enviar, topico, corpo, headers): chave
+        for chave, topico, corpo, headers in mensagens
+    }
+    concluidos, _ = wait(futuros, timeout=prazo)
+
+    resultados = {}
+    for futuro, chave in futuros.items():
+        if futuro not in concluidos:
+            if futuro.cancel():
+                # Nem começou e não vai mais começar: falha comum, pode tentar de novo
+                resultados[chave] = f"Prazo do lote excedido ({prazo}s)"
+            else:
+                resultados[chave] = ENVIO_INDEFINIDO
+        elif futuro.exception() is not None:
+            resultados[chave] = str(futuro.exception())
+        else:
+            resultados[chave] = None
+    return resultados
+
+
+@receiver(setting_changed)
+def _redefinir_backend(setting, **kwargs):
+    # override_settings nos testes troca o backend/base URL: descarta a instância
+    global _backend, _executor
+    if setting.startswith('NOTIFICACOES_') or setting.startswith('NTFY_'):
+        _backend = None
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,169 @@
+# manutencao/paginacao.py
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+
+
+class PaginaCursor:
+    """
+    Página de uma paginação por cursor (keyset). Em vez de número de página
+    tem cursor_proximo/cursor_anterior, que vão na querystring (?cursor=...).
+    """
+    por_cursor = True
+
+    def __init__(self, object_list, cursor_proximo, cursor_anterior, total):
+        self.object_list = object_list
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_proximo is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorCursor:
+    """
+    Paginação keyset sobre uma ordenação composta, ex.: ['-criado_em'] ou a
+    ordenação do mecanico_dashboard. O id entra no fim como desempate, então a
+    ordem é total e nenhum chamado pula ou repete entre páginas.
+    A página N custa o mesmo que a página 1: WHERE (campos) > (valores do cursor)
+    LIMIT n, sem OFFSET. Os campos precisam ser colunas (ou anotações) do próprio
+    modelo e não podem ser nulos.
+    """
+
+    def __init__(self, queryset, ordenacao, por_pagina, total=None):
+        self.queryset = queryset
+        self.por_pagina = por_pagina
+        self.total = total
+
+        self.campos = []
+        for expressao in [*ordenacao, '-id']:
+            nome, decrescente = expressao.lstrip('-'), expressao.startswith('-')
+            nome = 'id' if nome == 'pk' else nome
+            if nome not in [campo for campo, _ in self.campos]:
+                self.campos.append((nome, decrescente))
+
+    def pagina(self, cursor=None):
+        direcao, valores = decodificar_cursor(cursor)
+        if valores is not None and len(valores) != len(self.campos):
+            direcao, valores = 'proximo', None  # cursor de outra ordenação: recomeça
+        voltando = direcao == 'anterior'
+
+        # Para voltar, inverte a ordenação, pega os n anteriores e desinverte
+        queryset = self.queryset.order_by(*[
+            ('-' if decrescente != voltando else '') + nome for nome, decrescente in self.campos
+        ])
+        if valores is not None:
+            queryset = queryset.filter(self._depois_de(valores, voltando))
+
+        itens = list(queryset[:self.por_pagina + 1])
+        tem_mais = len(itens) > self.por_pagina
+        itens = itens[:self.por_pagina]
+        if voltando:
+            itens.reverse()
+
+        proximo = anterior = None
+        if itens:
+            if tem_mais or voltando:
+                proximo = codificar_cursor('proximo', self._valores(itens[-1]))
+            if (tem_mais and voltando) or (valores is not None and not voltando):
+                anterior = codificar_cursor('anterior', self._valores(itens[0]))
+
+        total = self.total() if callable(self.total) else self.total
+        return PaginaCursor(itens, proximo, anterior, total)
+
+    def _valores(self, objeto):
+        return [getattr(objeto, nome) for nome, _ in self.campos]
+
+    def _depois_de(self, valores, voltando):
+        # (a, b, c) > (va, vb, vc)  =>  a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND c > vc)
+        condicao = Q()
+        iguais = {}
+        for (nome, decrescente), valor in zip(self.campos, valores):
+            operador = 'lt' if decrescente != voltando else 'gt'
+            condicao |= Q(**iguais, **{f'{nome}__{operador}': valor})
+            iguais[nome] = valor
+        return condicao
+
+
+def _serializar(valor):
+    # isoformat completo: o DjangoJSONEncoder corta os microssegundos e o cursor deixaria de bater
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.isoformat()
+    raise TypeError(f'Valor não serializável no cursor: {valor!r}')
+
+
+def codificar_cursor(direcao, valores):
+    dados = json.dumps([direcao, valores], default=_serializar, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devolve (direcao, valores); cursor vazio ou inválido volta para a primeira página."""
+    if not cursor:
+        return 'proximo', None
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direcao, valores = json.loads(dados)
+    except (ValueError, TypeError):
+        return 'proximo', None
+    if direcao not in ('proximo', 'anterior') or not isinstance(valores, list):
+        return 'proximo', None
+    return direcao, valores
+
+
+def estimar_total(queryset):
+    """
+    Total aproximado de linhas sem varrer a tabela: no PostgreSQL lê a estimativa
+    do planejador (EXPLAIN). Nos outros bancos cai no COUNT exato.
+    """
+    conexao = connections[queryset.db]
+    if conexao.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, parametros = queryset.order_by().query.sql_with_params()
+    with conexao.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', parametros)
+        plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+def paginar(request, queryset, ordenacao, por_pagina, total=None):
+    """
+    Pagina uma lista conforme settings.PAGINACAO_MODO.
+    'paginas': Paginator comum (?page=N); 'cursor': PaginadorCursor (?cursor=...).
+    total: contagem já conhecida pela view (evita outro COUNT); sem ela, usa
+    COUNT exato ou a estimativa do banco conforme settings.PAGINACAO_CONTAGEM.
+    """
+    estimada = settings.PAGINACAO_CONTAGEM == 'estimada'
+
+    if settings.PAGINACAO_MODO == 'cursor':
+        if total is None:
+            total = (lambda: estimar_total(queryset)) if estimada else queryset.count
+        return PaginadorCursor(queryset, ordenacao, por_pagina, total).pagina(request.GET.get('cursor'))
+
+    paginator = Paginator(queryset.order_by(*ordenacao), por_pagina)
+    if total is not None:
+        paginator.count = total
+    elif estimada:
+        paginator.count = estimar_total(queryset)
+    return paginator.get_page(request.GET.get('page'))
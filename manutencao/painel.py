@@ -0,0 +1,79 @@
+# manutencao/painel.py
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from .cache import contagens, lista_mecanicos, obter_snapshot
+from .models import Chamado
+
+# O painel de gestão fica aberto em várias TVs e tablets ao mesmo tempo: o estado
+# é calculado uma vez e todas as telas leem o mesmo snapshot (ver obter_snapshot).
+# Atribuir equipe, abrir ou mudar chamado troca a versão de 'chamados' e gera um novo
+NAMESPACES = ('chamados', 'equipamentos', 'setores', 'usuarios')
+ANDAMENTO_LIMITE = 10
+
+
+def _nome(usuario):
+    return usuario.get_full_name() or usuario.username
+
+
+def _notificacao(notificacao):
+    if notificacao is None:
+        return None
+    return {
+        'status': notificacao.status,
+        'status_display': notificacao.get_status_display(),
+        'ultimo_erro': notificacao.ultimo_erro,
+    }
+
+
+def _chamado(chamado, com_equipe=False):
+    dados = {
+        'id': chamado.id,
+        'tipo': chamado.tipo,
+        'criado_em': chamado.criado_em,
+        'prioridade': chamado.prioridade,
+        'producao_parada': chamado.producao_parada,
+        'descricao': chamado.descricao,
+        'nome_setor': chamado.nome_setor,
+        'equipamento': {'nome': chamado.equipamento.nome} if chamado.equipamento_id else None,
+        'solicitante_nome': _nome(chamado.solicitante),
+    }
+    if com_equipe:
+        dados['equipe_com_entrega'] = [
+            ({'username': mecanico.username}, _notificacao(notificacao))
+            for mecanico, notificacao in chamado.equipe_com_entrega()
+        ]
+    return dados
+
+
+def montar_painel_admin():
+    """Estado completo do painel em dados simples (dicts/listas), pronto para virar JSON."""
+    andamento = (
+        Chamado.objects.atribuidos()
+        .for_listing(com_equipe=True)
+        .prefetch_related('notificacoes')
+        .order_by('-criado_em')
+    )
+    return {
+        # 1 Chamados NOVOS (aguardando designação)
+        'chamados_novos': [
+            _chamado(chamado) for chamado in Chamado.objects.sem_equipe().for_listing().order_by('-criado_em')
+        ],
+        # 2 Chamados EM ANDAMENTO (já designados), só os últimos
+        'chamados_em_andamento': [_chamado(chamado, com_equipe=True) for chamado in andamento[:ANDAMENTO_LIMITE]],
+        'total_andamento': andamento.count(),
+        # 3 Dados auxiliares (mecânicos do formulário de designação)
+        'mecanicos': [
+            {'id': mecanico['id'], 'nome': f"{mecanico['first_name']} {mecanico['last_name']}".strip() or mecanico['username']}
+            for mecanico in lista_mecanicos('mecanico', 'mecanico_admin')
+        ],
+        'contagens': contagens(),
+    }
+
+
+def painel_admin():
+    """Snapshot do painel (no máximo um cálculo a cada PAINEL_SNAPSHOT_SEGUNDOS), com as datas de volta."""
+    painel = obter_snapshot(NAMESPACES, 'painel_admin', montar_painel_admin, settings.PAINEL_SNAPSHOT_SEGUNDOS)
+    for chamado in painel['chamados_novos'] + painel['chamados_em_andamento']:
+        chamado['criado_em'] = parse_datetime(chamado['criado_em'])
+    return painel
@@ -0,0 +1,151 @@
+# manutencao/rotinas.py
+import calendar
+from datetime import date, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Frequências de passo fixo (em dias); 'mensal' é tratada à parte
+PASSO_DIAS = {
+    'diario': 1,
+    'semanal': 7,
+}
+
+
+def somar_meses(data, meses):
+    """
+    Avança `meses` a partir de `data` mantendo o dia do mês.
+    Quando o mês de destino é mais curto (31/01 -> fevereiro) usa o último dia dele.
+    """
+    total = data.month - 1 + meses
+    ano, mes = data.year + total // 12, total % 12 + 1
+    return date(ano, mes, min(data.day, calendar.monthrange(ano, mes)[1]))
+
+
+def passo_em_dias(rotina):
+    if rotina.frequencia == 'personalizado':
+        # Rotina personalizada sem intervalo preenchido: trata como diária
+        return max(rotina.intervalo_dias or 1, 1)
+    return PASSO_DIAS.get(rotina.frequencia)
+
+
+def _meses_entre(de, ate):
+    return (ate.year - de.year) * 12 + ate.month - de.month
+
+
+def ancora(rotina):
+    """
+    Data de início da série da rotina. No mensal as datas saem sempre dela, não da
+    proxima_execucao gravada: essa já pode ter sido ajustada para o fim de um mês
+    curto (28/02) e, usada como base, prenderia a rotina no dia 28 para sempre.
+    """
+    return getattr(rotina, 'data_inicio', None) or rotina.proxima_execucao
+
+
+def ocorrencias_entre(rotina, inicio, fim, origem=None):
+    """
+    Todas as datas da série da rotina entre `inicio` e `fim` (inclusive).
+    Passo fixo sai direto da aritmética a partir de `inicio` (quantidade = dias // passo),
+    sem iterar dia a dia; no mensal cada ocorrência é somar_meses(origem, n), com
+    `origem` = início da série (padrão `inicio`), então o ajuste de fim de mês
+    nunca acumula: 31/01 -> 28/02 -> 31/03, mesmo entre execuções diferentes.
+    """
+    if inicio > fim:
+        return []
+
+    passo = passo_em_dias(rotina)
+    if passo:
+        quantidade = (fim - inicio).days // passo + 1
+        return [inicio + timedelta(days=passo * i) for i in range(quantidade)]
+
+    origem = origem or inicio
+    datas = [
+        somar_meses(origem, i)
+        for i in range(max(_meses_entre(origem, inicio), 0), _meses_entre(origem, fim) + 1)
+    ]
+    return [d for d in datas if inicio <= d <= fim]
+
+
+def proxima_depois(rotina, inicio, data, origem=None):
+    """Primeira data da série (a partir de `inicio`, ancorada em `origem` no mensal) estritamente depois de `data`."""
+    if data < inicio:
+        return inicio
+
+    passo = passo_em_dias(rotina)
+    if passo:
+        return inicio + timedelta(days=passo * ((data - inicio).days // passo + 1))
+
+    origem = origem or inicio
+    meses = _meses_entre(origem, data)
+    candidata = somar_meses(origem, meses)
+    return candidata if candidata > data else somar_meses(origem, meses + 1)
+
+
+def na_serie(rotina, origem, data):
+    """`data` é uma das datas da série que começa em `origem`?"""
+    return origem <= data and ocorrencias_entre(rotina, data, data, origem) == [data]
+
+
+def aplicar_politica_atraso(datas, politica=None, limite=None):
+    """
+    Escolhe quais ocorrências atrasadas viram chamado.
+    'todas': uma por ocorrência perdida (as mais recentes, até ROTINAS_MAX_ATRASADAS).
+    'ultima': só a mais recente, como se a rotina tivesse rodado uma vez só.
+    """
+    politica = politica or settings.ROTINAS_POLITICA_ATRASO
+    limite = settings.ROTINAS_MAX_ATRASADAS if limite is None else limite
+
+    if politica == 'ultima':
+        return datas[-1:]
+    return datas[-limite:] if limite else datas
+
+
+def planejar_rotina(rotina, hoje):
+    """
+    Calcula, de uma vez, o que a rotina deve gerar até hoje.
+    Retorna (datas que viram chamado, nova proxima_execucao).
+    """
+    origem = ancora(rotina)
+    vencidas = ocorrencias_entre(rotina, rotina.proxima_execucao, hoje, origem)
+    return aplicar_politica_atraso(vencidas), proxima_depois(rotina, rotina.proxima_execucao, hoje, origem)
+
+
+def montar_ocorrencias(rotina, ate):
+    """Ocorrências (ainda não salvas) de uma rotina ativa, de proxima_execucao até `ate`."""
+    OcorrenciaRotina = apps.get_model('manutencao', 'OcorrenciaRotina')
+    if not rotina.ativo:
+        return []
+
+    setor_id = rotina.setor_id
+    if setor_id is None and rotina.equipamento_id:
+        setor_id = rotina.equipamento.setor_id
+    return [
+        OcorrenciaRotina(rotina_id=rotina.id, data=data, setor_id=setor_id, equipamento_id=rotina.equipamento_id)
+        for data in ocorrencias_entre(rotina, rotina.proxima_execucao, ate, ancora(rotina))
+    ]
+
+
+def reconstruir_ocorrencias(rotina_ids, hoje=None):
+    """
+    Refaz o calendário das rotinas informadas até hoje + ROTINAS_HORIZONTE_DIAS:
+    apaga as linhas antigas e insere as novas num bulk_create, na mesma transação.
+    Retorna quantas ocorrências foram gravadas.
+    """
+    RotinaManutencao = apps.get_model('manutencao', 'RotinaManutencao')
+    OcorrenciaRotina = apps.get_model('manutencao', 'OcorrenciaRotina')
+    hoje = hoje or timezone.localdate()
+    ate = hoje + timedelta(days=settings.ROTINAS_HORIZONTE_DIAS)
+
+    total = 0
+    rotina_ids = list(rotina_ids)
+    for i in range(0, len(rotina_ids), 500):
+        lote = rotina_ids[i:i + 500]
+        rotinas = RotinaManutencao.objects.filter(id__in=lote).select_related('equipamento')
+        with transaction.atomic():
+            OcorrenciaRotina.objects.filter(rotina_id__in=lote).delete()
+            novas = [ocorrencia for rotina in rotinas for ocorrencia in montar_ocorrencias(rotina, ate)]
+            OcorrenciaRotina.objects.bulk_create(novas, batch_size=1000)
+        total += len(novas)
+    return total
@@ -0,0 +1,172 @@
+# manutencao/signals.py
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .busca import agendar_indexacao, agendar_remocao
+from .cache import invalidar, ns_equipamento, ns_setor
+from .eventos import publicar
+from .models import Energia, Equipamento, ImagemChamado, RotinaManutencao, Chamado, Setor, Usuario
+from .rotinas import reconstruir_ocorrencias
+from .ultimos_chamados import agendar_atualizacao_ultimos
+
+
+def _liberar_arquivo(campo):
+    # Solta a referência no storage só depois do COMMIT (rollback não perde a foto)
+    if campo and campo.name:
+        storage, nome = campo.storage, campo.name
+        transaction.on_commit(lambda: storage.delete(nome))
+
+
+@receiver(post_delete, sender=ImagemChamado)
+def liberar_imagem_chamado(sender, instance, **kwargs):
+    _liberar_arquivo(instance.imagem)
+
+
+@receiver(post_delete, sender=Equipamento)
+def liberar_imagem_equipamento(sender, instance, **kwargs):
+    _liberar_arquivo(instance.imagem)
+
+
+@receiver(post_save, sender=RotinaManutencao)
+def atualizar_calendario_rotina(sender, instance, raw=False, **kwargs):
+    # Datas/frequência podem ter mudado: refaz só o calendário desta rotina
+    if raw:
+        return
+    rotina_id = instance.id
+    transaction.on_commit(lambda: reconstruir_ocorrencias([rotina_id]))
+
+
+@receiver(post_save, sender=Chamado)
+def atualizar_ultimos_ao_salvar(sender, instance, raw=False, **kwargs):
+    # Atualiza o equipamento/setor atual e também o anterior, se o chamado mudou de lugar
+    if raw:
+        return
+    agendar_atualizacao_ultimos(
+        equipamento_ids=[instance.equipamento_id, getattr(instance, '_equipamento_original', None)],
+        setor_ids=[instance.setor_avulso_id, getattr(instance, '_setor_avulso_original', None)],
+    )
+    instance._equipamento_original = instance.equipamento_id
+    instance._setor_avulso_original = instance.setor_avulso_id
+
+
+@receiver(post_delete, sender=Chamado)
+def atualizar_ultimos_ao_excluir(sender, instance, **kwargs):
+    agendar_atualizacao_ultimos(
+        equipamento_ids=[instance.equipamento_id],
+        setor_ids=[instance.setor_avulso_id],
+    )
+
+
+# ==================== ÍNDICE DE BUSCA ====================
+
+@receiver(post_save, sender=Equipamento)
+def indexar_equipamento(sender, instance, raw=False, created=False, **kwargs):
+    if not raw:
+        agendar_indexacao('equipamento', [instance.id])
+        # O título dos chamados leva o nome do equipamento e o setor vem dele
+        if not created:
+            agendar_indexacao('chamado', Chamado._base_manager.filter(equipamento=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Equipamento)
+def desindexar_equipamento(sender, instance, **kwargs):
+    agendar_remocao('equipamento', [instance.id])
+
+
+@receiver(post_save, sender=Chamado)
+def indexar_chamado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        agendar_indexacao('chamado', [instance.id])
+
+
+@receiver(post_delete, sender=Chamado)
+def desindexar_chamado(sender, instance, **kwargs):
+    agendar_remocao('chamado', [instance.id])
+
+
+@receiver(post_save, sender=Setor)
+def reindexar_equipamentos_do_setor(sender, instance, raw=False, **kwargs):
+    # O nome do setor faz parte do texto dos equipamentos e do título dos chamados avulsos
+    if not raw:
+        agendar_indexacao('equipamento', instance.equipamentos.values_list('id', flat=True))
+        agendar_indexacao('chamado', Chamado._base_manager.filter(setor_avulso=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Energia)
+def reindexar_equipamentos_da_energia(sender, instance, raw=False, **kwargs):
+    if not raw:
+        agendar_indexacao('equipamento', Equipamento.objects.filter(
+            Q(energia=instance) | Q(setor__energia=instance)
+        ).values_list('id', flat=True))
+
+
+# ==================== CACHE ====================
+# Cada modelo troca a versão dos namespaces que dependem dele (ver cache.py)
+
+DEPENDENCIAS_CACHE = {
+    Setor: ('setores',),
+    Equipamento: ('equipamentos',),
+    Energia: ('energias',),
+    Usuario: ('usuarios',),
+    Chamado: ('chamados',),
+}
+
+
+def invalidar_cache_do_modelo(sender, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender is Usuario and update_fields and set(update_fields) <= {'last_login'}:
+        return  # login não muda nada que esteja em cache
+    invalidar(*DEPENDENCIAS_CACHE[sender])
+
+
+for _modelo in DEPENDENCIAS_CACHE:
+    post_save.connect(invalidar_cache_do_modelo, sender=_modelo, dispatch_uid=f'cache_save_{_modelo.__name__}')
+    post_delete.connect(invalidar_cache_do_modelo, sender=_modelo, dispatch_uid=f'cache_delete_{_modelo.__name__}')
+
+
+@receiver(m2m_changed, sender=Chamado.mecanicos.through)
+def invalidar_cache_equipe(sender, action, **kwargs):
+    # Atribuir equipe tira o chamado da lista de novos
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar('chamados')
+
+
+@receiver(post_save, sender=Equipamento)
+@receiver(post_delete, sender=Equipamento)
+def invalidar_versao_equipamento(sender, instance, raw=False, **kwargs):
+    # APIs de equipamentos por setor (ETag): o setor atual e o anterior, se mudou
+    if raw:
+        return
+    setores = {instance.setor_id, getattr(instance, '_setor_original', None)} - {None}
+    invalidar(ns_equipamento(instance.id), *[ns_setor(setor_id) for setor_id in setores])
+    instance._setor_original = instance.setor_id
+
+
+@receiver(post_save, sender=Setor)
+def invalidar_versao_setor(sender, instance, raw=False, **kwargs):
+    # O pacote do setor leva o nome dele
+    if not raw:
+        invalidar(ns_setor(instance.id))
+
+
+# ==================== EVENTOS AO VIVO ====================
+
+@receiver(post_save, sender=Chamado)
+def publicar_evento_chamado(sender, instance, created, raw=False, **kwargs):
+    # Chamado.save só atualiza _status_original depois do post_save
+    if raw:
+        return
+    if created:
+        publicar('criado', [instance.id])
+    elif instance.status != getattr(instance, '_status_original', instance.status):
+        publicar('status', [instance.id])
+
+
+@receiver(m2m_changed, sender=Chamado.mecanicos.through)
+def publicar_evento_equipe(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or action not in ('post_add', 'post_remove'):
+        return
+    publicar('atribuido', [instance.id], afetados=pk_set if action == 'post_remove' else ())
@@ -0,0 +1,99 @@
+# manutencao/storage.py
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ConteudoEnderecadoStorage(FileSystemStorage):
+    """
+    Storage de mídia endereçado pelo conteúdo (SHA-256).
+    O arquivo vai para <pasta do upload_to>/<2 primeiros do hash>/<hash>.<ext>
+    e o índice ArquivoMidia guarda quantos registros apontam para ele.
+    Enviar a mesma foto de novo não grava nada: só soma uma referência.
+    """
+
+    def _save(self, name, content):
+        digest, tamanho = self.calcular_hash(content)
+
+        # 1. Já existe um blob com esse conteúdo: referência sem copiar nada
+        existente = self._indice().objects.filter(hash_sha256=digest).first()
+        if existente and self.exists(existente.nome):
+            return self._referenciar(digest, existente.nome, tamanho)
+
+        # 2. Conteúdo novo: grava no caminho derivado do hash
+        caminho = self.nome_por_conteudo(name, digest)
+        if not self.exists(caminho):
+            caminho = super()._save(caminho, content)
+
+        nome_final = self._referenciar(digest, caminho, tamanho)
+        if nome_final != caminho:
+            # Outro processo indexou o mesmo conteúdo primeiro: descarta a cópia
+            super().delete(caminho)
+        return nome_final
+
+    def delete(self, name):
+        """
+        Solta uma referência. O arquivo só sai do disco quando ninguém mais usa.
+        Arquivos fora do índice (anteriores a este storage) são apagados direto.
+        """
+        if not name:
+            return
+        ArquivoMidia = self._indice()
+        with transaction.atomic():
+            arquivo = ArquivoMidia.objects.select_for_update().filter(nome=name).first()
+            if arquivo is None:
+                super().delete(name)
+                return
+            if arquivo.referencias > 1:
+                arquivo.referencias = F('referencias') - 1
+                arquivo.save(update_fields=['referencias'])
+                return
+            arquivo.delete()
+        super().delete(name)
+
+    def _referenciar(self, digest, nome, tamanho):
+        ArquivoMidia = self._indice()
+        with transaction.atomic():
+            arquivo, criado = ArquivoMidia.objects.select_for_update().get_or_create(
+                hash_sha256=digest,
+                defaults={'nome': nome, 'tamanho': tamanho, 'referencias': 0},
+            )
+            if not criado and arquivo.nome != nome and not self.exists(arquivo.nome):
+                arquivo.nome = nome  # o blob indexado sumiu do disco: aponta para a cópia nova
+            arquivo.referencias = F('referencias') + 1
+            arquivo.save(update_fields=['nome', 'referencias'])
+            return arquivo.nome
+
+    @staticmethod
+    def calcular_hash(content):
+        sha = hashlib.sha256()
+        tamanho = 0
+        for bloco in content.chunks():
+            sha.update(bloco)
+            tamanho += len(bloco)
+        content.seek(0)
+        return sha.hexdigest(), tamanho
+
+    @staticmethod
+    def nome_por_conteudo(name, digest):
+        pasta = os.path.dirname(name)
+        extensao = os.path.splitext(name)[1].lower()
+        return os.path.join(pasta, digest[:2], f"{digest}{extensao}")
+
+    @staticmethod
+    def _indice():
+        return apps.get_model('manutencao', 'ArquivoMidia')
+
+
+armazenamento = ConteudoEnderecadoStorage()
+
+
+def armazenamento_midia():
+    # Callable usado nos campos de imagem (a migration guarda só a referência)
+    return armazenamento
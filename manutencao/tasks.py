@@ -1,55 +1,287 @@
+import logging
+import os
+
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Mod
 from django.utils import timezone
-from .models import RotinaManutencao, Chamado
-from datetime import timedelta
+from .models import RotinaManutencao, Chamado, NotificacaoOutbox, ImagemChamado
+from .notificacoes import ENVIO_INDEFINIDO, despachar_em_paralelo
+from .derivados import limpar_derivados
+from .imagens import compactar_acervo
+from .rotinas import planejar_rotina, reconstruir_ocorrencias
+from .ultimos_chamados import atualizar_ultimos_chamados
+from .busca import indexar_chamados
+from .cache import invalidar as invalidar_cache
+from .indicadores import recalcular_indicadores
+from .eventos import publicar as publicar_evento
+from collections import defaultdict
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
 
 @shared_task
 def verificar_rotinas():
-    
+    """
+    Distribui as rotinas vencidas em ROTINAS_SHARDS fatias (id % N) e dispara
+    uma task por fatia, que os workers do Celery processam em paralelo.
+    A data de referência é fixada aqui, então todas as fatias enxergam o mesmo "hoje".
+    """
     hoje = timezone.localdate()
-    rotinas = RotinaManutencao.objects.filter(ativo=True, proxima_execucao__lte=hoje)
-
-    for rotina in rotinas:
-        if rotina.tipo == 'setor':
-            Chamado.objects.create(
-                solicitante=rotina.criado_por,
-                tipo='avulso',
-                setor_avulso=rotina.setor,
-                descricao=f"[ROTINA] {rotina.nome_rotina}\n\n{rotina.descricao}",
-                prioridade=rotina.prioridade,
-                producao_parada=False,
-                rotina_origem=rotina, # novos campos pra identificar que o chamado veio de uma rotina ↓
-                is_rotina=True,
-            )
-        else:
-            Chamado.objects.create(
-                solicitante=rotina.criado_por,
-                tipo='equipamento',
-                equipamento=rotina.equipamento,
-                descricao=f"[ROTINA] {rotina.nome_rotina}\n\n{rotina.descricao}",
-                prioridade=rotina.prioridade,
-                producao_parada=False,
-                rotina_origem=rotina, # novos campos pra identificar que o chamado veio de uma rotina ↓
-                is_rotina=True,
-            )
-
-        rotina.ultima_execucao = hoje
-        rotina.proxima_execucao = calcular_proxima_execucao(rotina, hoje)
-        rotina.save(update_fields=['ultima_execucao', 'proxima_execucao'])
-
-
-def calcular_proxima_execucao(rotina, a_partir_de):
-    from datetime import timedelta
-
-    if rotina.frequencia == 'diario':
-        return a_partir_de + timedelta(days=1)
-    elif rotina.frequencia == 'semanal':
-        return a_partir_de + timedelta(weeks=1)
-    elif rotina.frequencia == 'mensal':
-        # Mesmo dia, mês seguinte
-        mes = a_partir_de.month + 1
-        ano = a_partir_de.year + (1 if mes > 12 else 0)
-        mes = mes if mes <= 12 else 1
-        return a_partir_de.replace(year=ano, month=mes)
-    elif rotina.frequencia == 'personalizado':
-        return a_partir_de + timedelta(days=rotina.intervalo_dias)
\ No newline at end of file
+    total = settings.ROTINAS_SHARDS
+
+    if not RotinaManutencao.objects.filter(ativo=True, proxima_execucao__lte=hoje).exists():
+        return 0
+
+    for indice in range(total):
+        processar_shard_rotinas.delay(indice, total, hoje.isoformat())
+    return total
+
+
+@shared_task
+def processar_shard_rotinas(indice, total, data_referencia):
+    """
+    Gera os chamados das rotinas vencidas de uma fatia de uma vez só (set-based):
+    trava as rotinas (pulando as que outro worker já pegou), calcula todas as
+    ocorrências perdidas desde proxima_execucao, cria os chamados com um
+    bulk_create e avança as datas com um UPDATE por data, tudo na mesma transação.
+    Se cair no meio, nada fica pela metade; se rodar duas vezes, a constraint
+    (rotina, data) impede duplicatas. Rotinas sem criador são desativadas.
+    """
+    hoje = date.fromisoformat(data_referencia)
+
+    with transaction.atomic():
+        rotinas = list(
+            RotinaManutencao.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('criado_por', 'setor', 'equipamento')
+            .annotate(shard=Mod('id', total))
+            .filter(ativo=True, proxima_execucao__lte=hoje, shard=indice)
+        )
+
+        chamados = []
+        por_proxima_data = defaultdict(list)
+        sem_criador = []
+        for rotina in rotinas:
+            if rotina.criado_por is None:
+                # solicitante é obrigatório no chamado: sem autor a rotina não tem como
+                # gerar e voltaria vencida toda vez, então é desativada até alguém assumir
+                logger.warning("Rotina #%s sem criador: desativada, nenhum chamado gerado", rotina.id)
+                sem_criador.append(rotina.id)
+                continue
+            datas, proxima = planejar_rotina(rotina, hoje)
+            chamados.extend(montar_chamado_rotina(rotina, data) for data in datas)
+            por_proxima_data[proxima].append(rotina.id)
+
+        Chamado.objects.bulk_create(chamados, batch_size=500, ignore_conflicts=True)
+        if sem_criador:
+            RotinaManutencao.objects.filter(id__in=sem_criador).update(ativo=False)
+
+        # Avança as datas: poucas datas distintas (uma por frequência), então um
+        # UPDATE ... WHERE id IN (...) por data sai bem mais barato que um CASE por linha
+        for proxima, ids in por_proxima_data.items():
+            for i in range(0, len(ids), 500):
+                RotinaManutencao.objects.filter(id__in=ids[i:i + 500]).update(
+                    ultima_execucao=hoje, proxima_execucao=proxima
+                )
+
+    # bulk_create/update() não disparam signals: atualiza o calendário das rotinas
+    # que andaram, o "último chamado" dos equipamentos/setores que receberam chamado,
+    # o índice de busca e as telas ao vivo (o bulk_create com ignore_conflicts não devolve os ids)
+    rotina_ids = [id_ for ids in por_proxima_data.values() for id_ in ids]
+    reconstruir_ocorrencias(rotina_ids + sem_criador, hoje)
+    atualizar_ultimos_chamados(
+        {chamado.equipamento_id for chamado in chamados if chamado.equipamento_id},
+        {chamado.setor_avulso_id for chamado in chamados if chamado.setor_avulso_id},
+    )
+    if chamados:
+        invalidar_cache('chamados')
+        # Os ids vêm dos pares (rotina, data) planejados, que a constraint torna únicos
+        planejados = {(chamado.rotina_origem_id, chamado.data_execucao_rotina) for chamado in chamados}
+        novos = [
+            id_ for id_, rotina_id, data in Chamado.objects.filter(
+                rotina_origem_id__in=rotina_ids,
+                data_execucao_rotina__in={data for _, data in planejados},
+            ).values_list('id', 'rotina_origem_id', 'data_execucao_rotina')
+            if (rotina_id, data) in planejados
+        ]
+        indexar_chamados(novos)
+        publicar_evento('criado', novos)
+
+    return len(chamados)
+
+
+@shared_task(ignore_result=True)
+def reconstruir_calendario_rotinas():
+    """
+    Refaz o calendário de ocorrências de todas as rotinas.
+    Roda uma vez por dia para o horizonte acompanhar a data de hoje.
+    """
+    ids = list(RotinaManutencao.objects.values_list('id', flat=True))
+    return reconstruir_ocorrencias(ids)
+
+
+@shared_task(ignore_result=True)
+def atualizar_indicadores():
+    """
+    Mantém os rollups de KPIs em dia: recalcula só os últimos dias
+    (INDICADORES_JANELA_DIAS), que é onde caem os eventos novos.
+    """
+    hoje = timezone.localdate()
+    return recalcular_indicadores(hoje - timedelta(days=settings.INDICADORES_JANELA_DIAS), hoje)
+
+
+def montar_chamado_rotina(rotina, data_execucao):
+    chamado = Chamado(
+        solicitante=rotina.criado_por,
+        descricao=f"[ROTINA] {rotina.nome_rotina}\n\n{rotina.descricao}",
+        prioridade=rotina.prioridade,
+        producao_parada=False,
+        rotina_origem=rotina, # novos campos pra identificar que o chamado veio de uma rotina ↓
+        is_rotina=True,
+        data_execucao_rotina=data_execucao,
+    )
+    if rotina.tipo == 'setor':
+        chamado.tipo = 'avulso'
+        chamado.setor_avulso = rotina.setor
+    else:
+        chamado.tipo = 'equipamento'
+        chamado.equipamento = rotina.equipamento
+    return chamado
+
+
+@shared_task(ignore_result=True)
+def drenar_notificacoes():
+    """
+    Envia as notificações pendentes do outbox em lotes.
+    Falhas são reagendadas com backoff exponencial e, depois de
+    NOTIFICACOES_MAX_TENTATIVAS, a notificação vai para 'falhou' (dead-letter).
+    Envios ainda em andamento quando o prazo do lote acaba não contam como
+    falha: ficam reservados por mais um lease inteiro (bem mais longo que o
+    NOTIFICACOES_TIMEOUT do HTTP) antes de serem tentados de novo.
+    """
+    tamanho_lote = settings.NOTIFICACOES_LOTE
+    agora = timezone.now()
+
+    # 1. Reserva o lote: trava as linhas, empurra a próxima tentativa para frente
+    # (lease) e solta a trava antes de fazer qualquer chamada de rede.
+    # Se o worker morrer no meio, as linhas voltam a ficar disponíveis sozinhas.
+    with transaction.atomic():
+        ids = list(
+            NotificacaoOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pendente', proxima_tentativa__lte=agora)
+            .order_by('proxima_tentativa')
+            .values_list('id', flat=True)[:tamanho_lote]
+        )
+        NotificacaoOutbox.objects.filter(id__in=ids).update(
+            proxima_tentativa=agora + timedelta(seconds=settings.NOTIFICACOES_LEASE_SEGUNDOS)
+        )
+
+    # 2. Envia o lote em paralelo (pool limitado + prazo por lote)
+    notificacoes = list(NotificacaoOutbox.objects.filter(id__in=ids))
+    resultados = despachar_em_paralelo([
+        (n.id, n.topico, n.corpo, n.cabecalhos) for n in notificacoes
+    ])
+
+    enviadas = [n.id for n in notificacoes if resultados[n.id] is None]
+    NotificacaoOutbox.objects.filter(id__in=enviadas).update(
+        status='enviado',
+        enviado_em=timezone.now(),
+        tentativas=F('tentativas') + 1,
+        ultimo_erro='',
+    )
+    indefinidas = [n.id for n in notificacoes if resultados[n.id] is ENVIO_INDEFINIDO]
+    NotificacaoOutbox.objects.filter(id__in=indefinidas).update(
+        proxima_tentativa=timezone.now() + timedelta(seconds=settings.NOTIFICACOES_LEASE_SEGUNDOS),
+        ultimo_erro='Envio ainda em andamento no fim do prazo do lote',
+    )
+    for notificacao in notificacoes:
+        if resultados[notificacao.id] not in (None, ENVIO_INDEFINIDO):
+            registrar_falha_notificacao(notificacao, resultados[notificacao.id])
+
+    # 3. Lote cheio: provavelmente tem mais coisa na fila
+    if len(ids) == tamanho_lote:
+        drenar_notificacoes.delay()
+
+    return len(ids)
+
+
+def registrar_falha_notificacao(notificacao, erro):
+    notificacao.tentativas += 1
+    notificacao.ultimo_erro = str(erro)[:1000]
+
+    if notificacao.tentativas >= settings.NOTIFICACOES_MAX_TENTATIVAS:
+        # Dead-letter: fica no banco para análise/reenvio manual pelo admin
+        notificacao.status = 'falhou'
+    else:
+        espera = min(
+            settings.NOTIFICACOES_BACKOFF_SEGUNDOS * (2 ** (notificacao.tentativas - 1)),
+            settings.NOTIFICACOES_BACKOFF_MAXIMO_SEGUNDOS,
+        )
+        notificacao.proxima_tentativa = timezone.now() + timedelta(seconds=espera)
+
+    notificacao.save(update_fields=['tentativas', 'ultimo_erro', 'status', 'proxima_tentativa'])
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=60)
+def processar_imagens_chamado(self, chamado_id):
+    """
+    Converte para WebP as fotos ainda não processadas de um chamado concluído.
+    Cada foto é marcada como processada ao terminar, então a task pode ser
+    repetida sem converter nada duas vezes.
+    """
+    erro = None
+    imagens = ImagemChamado.objects.filter(chamado_id=chamado_id, processada=False)
+    for img_obj in imagens:
+        try:
+            img_obj.processar()
+        except Exception as e:
+            # Não trava as outras fotos por causa de uma; tenta de novo no final
+            logger.exception("Erro ao processar imagem #%s do chamado #%s", img_obj.id, chamado_id)
+            erro = e
+
+    if erro is not None:
+        raise self.retry(exc=erro)
+
+
+@shared_task
+def compactar_acervo_imagens(tamanho_lote=200, processos=None):
+    """
+    Backfill das fotos antigas pelo Celery: o mesmo compactar_acervo do
+    manage.py compactar_imagens (checkpoint em IMAGENS_CHECKPOINT, pool de
+    processos do tamanho das CPUs), então rodar pela task ou pelo comando
+    continua do mesmo ponto. O resumo vai para o log e para o resultado.
+    """
+    os.makedirs(os.path.dirname(settings.IMAGENS_CHECKPOINT) or '.', exist_ok=True)
+
+    def progresso(estatisticas, segundos):
+        logger.info(
+            "Backfill de imagens: %s convertidas, %s ignoradas, %s erros (%.0f s)",
+            estatisticas['imagens'], estatisticas['ignoradas'], estatisticas['erros'], segundos,
+        )
+
+    estatisticas = compactar_acervo(
+        checkpoint=settings.IMAGENS_CHECKPOINT,
+        processos=processos,
+        tamanho_lote=tamanho_lote,
+        ao_concluir_lote=progresso,
+    )
+    economizados = estatisticas['bytes_antes'] - estatisticas['bytes_depois']
+    logger.info(
+        "Backfill de imagens concluído: %s convertidas, %s erros, %.1f MB economizados",
+        estatisticas['imagens'], estatisticas['erros'], economizados / 1024 / 1024,
+    )
+    return estatisticas
+
+
+@shared_task(ignore_result=True)
+def limpar_cache_derivados():
+    """
+    Mantém o cache de miniaturas dentro de DERIVADOS_LIMITE_BYTES (LRU pelo mtime).
+    """
+    removidos, liberados = limpar_derivados()
+    logger.info("Cache de derivados: %s arquivos removidos, %.1f MB liberados", removidos, liberados / 1024 / 1024)
@@ -0,0 +1,38 @@
+from django import template
+
+from manutencao.cache import obter
+
+register = template.Library()
+
+
+class FragmentoNode(template.Node):
+    def __init__(self, nodelist, namespaces, nome, partes):
+        self.nodelist = nodelist
+        self.namespaces = namespaces
+        self.nome = nome
+        self.partes = partes
+
+    def render(self, context):
+        namespaces = [ns.strip() for ns in self.namespaces.resolve(context).split(',')]
+        partes = [parte.resolve(context) for parte in self.partes]
+        return obter(namespaces, self.nome.resolve(context), lambda: self.nodelist.render(context), *partes)
+
+
+@register.tag
+def fragmento_cache(parser, token):
+    """
+    Guarda o HTML renderizado do bloco até algum namespace mudar:
+    {% fragmento_cache "equipamentos,setores" "etiquetas" setor_selecionado %} ... {% endfragmento_cache %}
+    Os argumentos depois do nome entram na chave. Não use em blocos com {% csrf_token %}.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' precisa de namespaces e nome")
+    nodelist = parser.parse(('endfragmento_cache',))
+    parser.delete_first_token()
+    return FragmentoNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
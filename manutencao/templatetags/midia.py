@@ -0,0 +1,16 @@
+from django import template
+
+from manutencao.derivados import url_derivado
+
+register = template.Library()
+
+
+@register.filter
+def derivado(imagem, preset):
+    """
+    URL da versão reduzida de uma imagem: {{ equipamento.imagem|derivado:'mini' }}
+    A miniatura é gerada no primeiro acesso e fica em cache no disco.
+    """
+    if not imagem:
+        return ''
+    return url_derivado(imagem.name, preset)
@@ -1,3 +1,1263 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from PIL import Image
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Case, When, Value
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock, skipUnless
+
+from .busca import buscar, buscar_ids, consulta_prefixos, indexar_equipamentos, indexar_chamados
+from .derivados import PASTA_DERIVADOS, caminho_derivado, limpar_derivados
+from .cache import _compactar, estatisticas, lista_mecanicos, montar_chave, obter_snapshot, setores_ordenados
+from .eventos import formatar_sse, montar_eventos, publicar, visivel_para
+from .metricas import FormatadorJSON, MetricasMiddleware, OrcamentoExcedido, descarregar, registrar
+from .notificacoes import ENVIO_INDEFINIDO, BackendNotificacao, despachar_em_paralelo, get_backend
+from .tasks import drenar_notificacoes, limpar_cache_derivados, processar_imagens_chamado, processar_shard_rotinas, registrar_falha_notificacao
+from .utils import enfileirar_notificacao_novo_chamado
+from .imagens import compactar_acervo
+from .indicadores import recalcular_indicadores, ranking_indicadores
+from .rotinas import reconstruir_ocorrencias
+from .storage import armazenamento
+from .models import Usuario, Energia, Setor, Equipamento, Chamado, ImagemChamado, IndicadorDiario, OcorrenciaRotina, RotinaManutencao, ArquivoMidia, NotificacaoOutbox
+
+
+# Sem cache: os testes de contagem de consultas medem o banco, não o cache
+SEM_CACHE = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+
+
+class DadosChamadosMixin:
+    """Massa de chamados compartilhada pelos testes de listagem."""
+
+    def setUp(self):
+        super().setUp()
+        # O banco volta ao estado inicial a cada teste; o cache em memória também precisa
+        cache.clear()
+        # View acima do orçamento de consultas (METRICAS_ORCAMENTOS) reprova o teste
+        self.enterContext(override_settings(METRICAS_ORCAMENTO_ESTRITO=True))
+        # Uma linha JSON por requisição só polui a saída dos testes: ficam os avisos
+        metricas = logging.getLogger('manutencao.metricas')
+        self.addCleanup(metricas.setLevel, metricas.level)
+        metricas.setLevel(logging.WARNING)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = Usuario.objects.create_user('admin_manut', password='x', tipo='mecanico_admin')
+        cls.mecanico = Usuario.objects.create_user('mecanico', password='x', tipo='mecanico')
+        cls.outro = Usuario.objects.create_user('outro', password='x', tipo='mecanico')
+        cls.solicitante = Usuario.objects.create_user('solicitante', password='x', tipo='solicitante')
+
+        cls.setor = setor = Setor.objects.create(nome='Extrusão', energia=Energia.objects.create(numero='P1'))
+        cls.equipamento = equipamento = Equipamento.objects.create(nome='Extrusora', codigo='EX01', setor=setor)
+
+        status = ['pendente'] * 7 + ['em_progresso'] * 5 + ['concluido'] * 3
+        for i, situacao in enumerate(status):
+            chamado = Chamado.objects.create(
+                solicitante=cls.solicitante,
+                tipo='equipamento' if i % 2 else 'avulso',
+                equipamento=equipamento if i % 2 else None,
+                setor_avulso=None if i % 2 else setor,
+                descricao=f'Chamado {i}',
+                status=situacao,
+                concluido_por=cls.mecanico if situacao == 'concluido' else None,
+            )
+            # Dois mecânicos por chamado: o JOIN antigo duplicaria as linhas
+            chamado.mecanicos.set([cls.mecanico, cls.outro] if i % 3 else [cls.outro])
+
+        # Sem equipe: não aparece para ninguém
+        Chamado.objects.create(solicitante=cls.solicitante, tipo='avulso', setor_avulso=setor, descricao='Sem equipe')
+
+
+class MecanicoDashboardTests(DadosChamadosMixin, TestCase):
+    """
+    Orçamento de consultas do mecanico_dashboard: sessão + usuário + contadores + página.
+    Se alguém voltar a fazer um COUNT por status ou um acesso N+1 no template, quebra aqui.
+    """
+    ORCAMENTO_CONSULTAS = 4
+
+    def test_admin_dentro_do_orcamento(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(self.ORCAMENTO_CONSULTAS):
+            response = self.client.get(reverse('mecanico_dashboard'))
+
+        self.assertEqual(response.context['pendentes'], 7)
+        self.assertEqual(response.context['em_progresso'], 5)
+        self.assertEqual(response.context['concluidos'], 3)
+        self.assertEqual(response.context['chamados'].paginator.count, 15)
+        self.assertEqual(len(response.context['chamados']), 12)
+
+    def test_mecanico_ve_apenas_os_seus(self):
+        self.client.force_login(self.mecanico)
+        with self.assertNumQueries(self.ORCAMENTO_CONSULTAS):
+            response = self.client.get(reverse('mecanico_dashboard'), {'page': 2})
+
+        esperados = Chamado.objects.filter(mecanicos=self.mecanico).count()
+        self.assertEqual(response.context['chamados'].paginator.count, esperados)
+        self.assertEqual(
+            response.context['pendentes'] + response.context['em_progresso'] + response.context['concluidos'],
+            esperados,
+        )
+
+    def test_contadores_respeitam_filtro(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(self.ORCAMENTO_CONSULTAS):
+            response = self.client.get(reverse('mecanico_dashboard'), {'status': 'concluido'})
+
+        self.assertEqual(response.context['concluidos'], 3)
+        self.assertEqual(response.context['pendentes'], 0)
+        self.assertEqual(response.context['chamados'].paginator.count, 3)
+
+
+@SEM_CACHE
+@override_settings(MEDIA_ROOT='/tmp/manutencao-testes-media')
+class ListagensSemNMais1Tests(DadosChamadosMixin, TestCase):
+    """
+    As listas de chamados usam Chamado.objects.for_listing(): o número de consultas
+    é fixo e não cresce com a quantidade de chamados na página.
+    """
+
+    def contar_consultas(self, usuario, url):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def mais_chamados(self, quantidade=6):
+        # Chamados novos com tudo que os cards exibem: equipe, quem concluiu e fotos
+        for i in range(quantidade):
+            chamado = Chamado.objects.create(
+                solicitante=self.solicitante,
+                tipo='equipamento' if i % 2 else 'avulso',
+                equipamento=self.equipamento if i % 2 else None,
+                setor_avulso=None if i % 2 else self.setor,
+                descricao=f'Extra {i}',
+                status='concluido',
+                concluido_por=self.outro,
+            )
+            chamado.mecanicos.set([self.mecanico, self.outro])
+            ImagemChamado.objects.create(
+                chamado=chamado,
+                imagem=SimpleUploadedFile(f'foto{i}.webp', b'conteudo %d' % i, content_type='image/webp'),
+                processada=True,
+            )
+            Chamado.objects.create(solicitante=self.solicitante, tipo='avulso', setor_avulso=self.setor, descricao=f'Novo {i}')
+
+    def assertConsultasConstantes(self, usuario, url, esperado):
+        antes = self.contar_consultas(usuario, url)
+        self.mais_chamados()
+        depois = self.contar_consultas(usuario, url)
+        self.assertEqual(antes, esperado)
+        self.assertEqual(depois, esperado)
+
+    def test_solicitante_dashboard(self):
+        # sessão, usuário, COUNT, página, prefetch dos mecânicos
+        self.assertConsultasConstantes(self.solicitante, reverse('solicitante_dashboard'), 5)
+
+    def test_dashboard_admin(self):
+        # sessão, usuário, COUNT do andamento, contagem de setores e de equipamentos, novos,
+        # página + mecânicos + notificações do andamento, mecânicos do formulário
+        self.assertConsultasConstantes(self.admin, reverse('dashboard_admin_manutencao'), 10)
+
+    def test_historico_equipamento(self):
+        # sessão, usuário, equipamento com setor, última rotina, COUNT, página, fotos da página
+        url = reverse('historico_equipamento', args=[self.equipamento.id])
+        self.assertConsultasConstantes(self.admin, url, 7)
+
+    def test_historico_setor(self):
+        url = reverse('historico_setor', args=[self.setor.id])
+        self.assertConsultasConstantes(self.admin, url, 7)
+
+
+@override_settings(PAGINACAO_MODO='cursor')
+class PaginacaoCursorTests(DadosChamadosMixin, TestCase):
+    """Paginação keyset: percorre tudo sem pular/repetir e a página N custa o mesmo que a 1."""
+
+    def percorrer(self, url, parametros=None):
+        paginas = []
+        parametros = dict(parametros or {})
+        while True:
+            response = self.client.get(url, parametros)
+            pagina = response.context['chamados']
+            paginas.append([chamado.id for chamado in pagina])
+            if not pagina.has_next():
+                return paginas, pagina
+            parametros['cursor'] = pagina.cursor_proximo
+
+    def test_ordenacao_composta_do_mecanico_dashboard(self):
+        self.client.force_login(self.admin)
+        esperado = list(
+            Chamado.objects.atribuidos()
+            .annotate(ordem_status=Case(
+                When(status='pendente', then=Value(1)),
+                When(status='em_progresso', then=Value(2)),
+                When(status='concluido', then=Value(3)),
+                default=Value(4),
+            ))
+            .order_by('ordem_status', '-producao_parada', '-is_rotina', 'prioridade', '-criado_em', '-id')
+            .values_list('id', flat=True)
+        )
+
+        paginas, ultima = self.percorrer(reverse('mecanico_dashboard'))
+        self.assertEqual([id_ for pagina in paginas for id_ in pagina], esperado)
+        self.assertEqual(ultima.total, 15)
+
+        # Voltando da última página chega de novo na primeira
+        response = self.client.get(reverse('mecanico_dashboard'), {'cursor': ultima.cursor_anterior})
+        self.assertEqual([chamado.id for chamado in response.context['chamados']], paginas[0])
+        self.assertFalse(response.context['chamados'].has_previous())
+
+    def test_historico_custo_constante(self):
+        # Chamados suficientes para mais de uma página; a seguinte custa o mesmo que a primeira
+        Chamado.objects.bulk_create([
+            Chamado(solicitante=self.solicitante, tipo='avulso', setor_avulso=self.setor, descricao=f'Lote {i}')
+            for i in range(20)
+        ])
+        self.client.force_login(self.admin)
+        url = reverse('historico_setor', args=[self.setor.id])
+        with self.settings(PAGINACAO_CONTAGEM='estimada'):
+            with CaptureQueriesContext(connection) as primeira:
+                response = self.client.get(url)
+            cursor = response.context['chamados'].cursor_proximo
+            with CaptureQueriesContext(connection) as seguinte:
+                response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(len(primeira), len(seguinte))
+        self.assertNotIn('OFFSET', seguinte.captured_queries[-2]['sql'])
+
+    def test_cursor_invalido_volta_para_o_inicio(self):
+        self.client.force_login(self.solicitante)
+        response = self.client.get(reverse('solicitante_dashboard'), {'cursor': 'lixo'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['chamados'].has_previous())
+
+
+@SEM_CACHE
+class UltimosChamadosTests(DadosChamadosMixin, TestCase):
+    """Ponteiros de último chamado em Equipamento/Setor e a tela de históricos."""
+
+    def criar(self, **campos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Chamado.objects.create(solicitante=self.solicitante, descricao='Novo', **campos)
+
+    def test_ponteiros_acompanham_os_chamados(self):
+        chamado = self.criar(tipo='equipamento', equipamento=self.equipamento)
+        self.equipamento.refresh_from_db()
+        self.assertEqual(self.equipamento.ultimo_chamado_id, chamado.id)
+        self.assertEqual(self.equipamento.ultimo_chamado_pendente_id, chamado.id)
+        self.assertEqual(self.equipamento.ultima_atividade, chamado.criado_em)
+
+        # Mudou de status: sai do ponteiro de pendentes e entra no de concluídos
+        chamado.status = 'concluido'
+        with self.captureOnCommitCallbacks(execute=True):
+            chamado.save()
+        self.equipamento.refresh_from_db()
+        self.assertEqual(self.equipamento.ultimo_chamado_concluido_id, chamado.id)
+        self.assertNotEqual(self.equipamento.ultimo_chamado_pendente_id, chamado.id)
+
+        # Excluído: o ponteiro volta para o anterior
+        anterior = Chamado.objects.filter(equipamento=self.equipamento).exclude(id=chamado.id).order_by('-criado_em', '-id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            chamado.delete()
+        self.equipamento.refresh_from_db()
+        self.assertEqual(self.equipamento.ultimo_chamado_id, anterior.id)
+
+    def test_avulso_atualiza_setor(self):
+        chamado = self.criar(tipo='avulso', setor_avulso=self.setor)
+        self.setor.refresh_from_db()
+        self.assertEqual(self.setor.ultimo_avulso_id, chamado.id)
+        self.assertEqual(self.setor.ultima_atividade_avulso, chamado.criado_em)
+
+    def test_historicos_sem_consulta_por_linha(self):
+        # Dez equipamentos com chamado: a tela continua com o mesmo número de consultas
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(reverse('historicos'))
+        for i in range(10):
+            equipamento = Equipamento.objects.create(nome=f'Máquina {i}', codigo=f'M{i}', setor=self.setor)
+            self.criar(tipo='equipamento', equipamento=equipamento)
+        with CaptureQueriesContext(connection) as muitos:
+            response = self.client.get(reverse('historicos'), {'status': 'pendente'})
+
+        self.assertEqual(len(poucos), len(muitos))
+        self.assertEqual(len(response.context['equipamentos']), 10)
+        for eq in response.context['equipamentos']:
+            self.assertEqual(eq.ultimo_chamado.status, 'pendente')
+
+
+class BuscaTests(DadosChamadosMixin, TestCase):
+    """Índice de busca: acompanha as alterações e devolve resultados ranqueados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Dentro do TestCase o on_commit dos signals não roda: indexa a massa direto
+        indexar_equipamentos()
+        indexar_chamados()
+
+    def salvar(self, objeto):
+        with self.captureOnCommitCallbacks(execute=True):
+            objeto.save()
+        return objeto
+
+    def test_equipamento_acompanha_alteracoes(self):
+        bomba = self.salvar(Equipamento(nome='Bomba Hidráulica', codigo='BH7', setor=self.setor))
+        # Sem acento e por prefixo
+        self.assertEqual(buscar_ids('hidraulica', 'equipamento'), [bomba.id])
+        self.assertEqual(buscar_ids('bomb', 'equipamento'), [bomba.id])
+
+        bomba.nome = 'Compressor'
+        self.salvar(bomba)
+        self.assertEqual(buscar_ids('bomba', 'equipamento'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bomba.delete()
+        self.assertEqual(buscar_ids('compressor', 'equipamento'), [])
+
+    def test_codigo_e_poste_pela_metade(self):
+        poste = Energia.objects.create(numero='4512')
+        compressor = self.salvar(Equipamento(nome='Compressor', codigo='CMP001', setor=self.setor, energia=poste))
+        self.assertEqual(buscar_ids('CMP', 'equipamento'), [compressor.id])
+        self.assertEqual(buscar_ids('45', 'equipamento'), [compressor.id])
+        self.assertEqual(consulta_prefixos('CMP 45!'), 'CMP:* & 45:*')
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsquery/pg_trgm só existem no PostgreSQL')
+    def test_postgres_acha_codigo_parcial(self):
+        # websearch_to_tsquery só casava lexemas inteiros e o trigrama não passa do limiar com "CMP"
+        compressor = self.salvar(Equipamento(nome='Compressor', codigo='CMP001', setor=self.setor))
+        self.assertEqual(buscar_ids('CMP', 'equipamento'), [compressor.id])
+        self.assertEqual(buscar_ids('cmp00', 'equipamento'), [compressor.id])
+
+    def test_filtro_de_lista_nao_tem_limite(self):
+        for i in range(3):
+            self.salvar(Equipamento(nome=f'Prensa {i}', codigo=f'PR{i}', setor=self.setor))
+        self.assertEqual(len(buscar_ids('prensa', 'equipamento', limite=2)), 2)
+        self.assertEqual(len(buscar_ids('prensa', 'equipamento')), 3)
+
+    def test_renomear_equipamento_reindexa_os_chamados(self):
+        chamados = set(Chamado.objects.filter(equipamento=self.equipamento).values_list('id', flat=True))
+        equipamento = Equipamento.objects.get(id=self.equipamento.id)
+        equipamento.nome = 'Laminadora'
+        self.salvar(equipamento)
+        self.assertEqual({doc.objeto_id for doc in buscar('laminadora', tipos=['chamado'])}, chamados)
+
+        self.setor.nome = 'Acabamento'
+        self.salvar(self.setor)
+        avulsos = set(Chamado.objects.filter(setor_avulso=self.setor).values_list('id', flat=True))
+        self.assertEqual({doc.objeto_id for doc in buscar('acabamento', tipos=['chamado'])}, avulsos)
+
+    def test_chamado_e_ranking(self):
+        chamado = Chamado.objects.filter(equipamento=self.equipamento).first()
+        chamado.observacoes_mecanico = 'Rolamento trocado e correia alinhada'
+        self.salvar(chamado)
+
+        resultados = buscar('rolamento')
+        self.assertEqual([(doc.tipo, doc.objeto_id) for doc in resultados], [('chamado', chamado.id)])
+
+        # O equipamento com o termo no título vem antes do chamado que só cita no texto
+        self.salvar(Equipamento(nome='Rolamento Central', codigo='RC1', setor=self.setor))
+        self.assertEqual([doc.tipo for doc in buscar('rolamento')], ['equipamento', 'chamado'])
+
+    def test_historicos_usam_o_indice(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('historicos'), {'q': 'extrus'})
+        self.assertEqual([eq.id for eq in response.context['equipamentos']], [self.equipamento.id])
+
+        response = self.client.get(reverse('busca'), {'q': 'Chamado 3', 'tipo': 'chamado'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['resultados'])
+
+
+class IndicadoresTests(DadosChamadosMixin, TestCase):
+    """Rollups diários de KPIs: somas corretas e dashboard sem ler a tabela de chamados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ontem = timezone.localdate() - timedelta(days=1)
+        abertura = timezone.make_aware(datetime.combine(cls.ontem, time(8)))
+        # Duas falhas no equipamento ontem: 1h e 3h até concluir, a segunda com produção parada
+        cls.falhas = []
+        for horas, parada in ((1, False), (3, True)):
+            chamado = Chamado.objects.create(
+                solicitante=cls.solicitante, tipo='equipamento', equipamento=cls.equipamento,
+                descricao='Falha', producao_parada=parada, status='concluido',
+            )
+            Chamado.objects.filter(id=chamado.id).update(
+                criado_em=abertura,
+                iniciado_em=abertura + timedelta(minutes=30),
+                concluido_em=abertura + timedelta(hours=horas),
+            )
+            chamado.mecanicos.set([cls.mecanico])
+            cls.falhas.append(chamado)
+
+    def test_rollup_do_dia(self):
+        recalcular_indicadores(self.ontem, self.ontem)
+        linha = IndicadorDiario.objects.get(escopo='equipamento', equipamento=self.equipamento, data=self.ontem)
+        self.assertEqual((linha.abertos, linha.falhas, linha.iniciados, linha.concluidos), (2, 2, 2, 2))
+        self.assertEqual(linha.tempo_reparo_total, timedelta(hours=4))
+        self.assertEqual(linha.tempo_resposta_total, timedelta(hours=1))
+        self.assertEqual(linha.tempo_parada_total, timedelta(hours=3))
+        self.assertTrue(IndicadorDiario.objects.filter(escopo='setor', setor=self.setor, data=self.ontem).exists())
+        self.assertEqual(IndicadorDiario.objects.get(escopo='mecanico', mecanico=self.mecanico, data=self.ontem).concluidos, 2)
+
+        # Recalcular o mesmo período não duplica nada
+        antes = IndicadorDiario.objects.count()
+        recalcular_indicadores(self.ontem, self.ontem)
+        self.assertEqual(IndicadorDiario.objects.count(), antes)
+
+        [resumo] = ranking_indicadores('equipamento', self.ontem, self.ontem)
+        self.assertEqual(resumo['mttr_horas'], 2)
+        self.assertEqual(resumo['resposta_horas'], 0.5)
+        self.assertEqual(resumo['parada_minutos'], 180)
+        self.assertEqual(resumo['mtbf_horas'], (24 - 3) / 2)
+
+    def test_dashboard_le_so_os_rollups(self):
+        recalcular_indicadores()
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('indicadores'), {'escopo': 'equipamento', 'objeto': self.equipamento.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in consultas.captured_queries if 'manutencao_chamado' in q['sql']])
+        self.assertEqual(sum(linha['abertos'] for linha in response.context['serie']),
+                         Chamado.objects.filter(equipamento=self.equipamento).count())
+
+
+class ExportacaoTests(DadosChamadosMixin, TestCase):
+    """Exportação CSV em streaming com os filtros do mecanico_dashboard."""
+
+    def exportar(self, usuario, **parametros):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('exportar_chamados'), parametros)
+            self.assertTrue(response.streaming)
+            conteudo = b''.join(response.streaming_content).decode('utf-8-sig')
+        linhas = list(csv.reader(io.StringIO(conteudo), delimiter=';'))
+        return linhas[0], linhas[1:], len(consultas)
+
+    def test_filtros_e_consultas_fixas(self):
+        cabecalho, linhas, consultas = self.exportar(self.admin, status='concluido')
+        self.assertEqual(len(linhas), 3)
+        self.assertIn('Execução (min)', cabecalho)
+        self.assertTrue(all(linha[cabecalho.index('Mecânicos')] for linha in linhas))
+
+        # Sessão, usuário, chamados e mecânicos: não cresce com o número de linhas
+        _, todas, consultas_todas = self.exportar(self.admin)
+        self.assertEqual(len(todas), Chamado.objects.count())
+        self.assertEqual(consultas, consultas_todas)
+
+    def test_mecanico_exporta_so_os_seus(self):
+        _, linhas, _ = self.exportar(self.mecanico, setor=self.setor.id)
+        self.assertEqual(len(linhas), Chamado.objects.filter(mecanicos=self.mecanico).count())
+
+
+class CacheTests(DadosChamadosMixin, TestCase):
+    """Dados de referência em cache, invalidados pelos signals e com contadores de hit/miss."""
+
+    def test_invalidacao_por_signal(self):
+        with self.assertNumQueries(1):
+            self.assertEqual([s.nome for s in setores_ordenados()], ['Extrusão'])
+        with self.assertNumQueries(0):
+            setores_ordenados()
+
+        # Salvar um setor troca a versão do namespace: a próxima leitura vai ao banco
+        with self.captureOnCommitCallbacks(execute=True):
+            Setor.objects.create(nome='Acabamento', energia=self.setor.energia)
+        self.assertEqual([s.nome for s in setores_ordenados()], ['Acabamento', 'Extrusão'])
+
+        # Outros namespaces não são afetados
+        self.assertEqual(lista_mecanicos('mecanico')[0].keys(), {'id', 'first_name', 'last_name', 'username'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Setor.objects.filter(nome='Acabamento').delete()
+        with self.assertNumQueries(0):
+            lista_mecanicos('mecanico')
+
+        self.assertEqual(estatisticas()['setores_ordenados'], {'hit': 1, 'miss': 2, 'taxa': 33.3})
+
+    def test_atribuir_equipe_tira_chamado_dos_novos(self):
+        self.client.force_login(self.admin)
+        novos = self.client.get(reverse('dashboard_admin_manutencao')).context['chamados_novos']
+        self.assertEqual(len(novos), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Chamado.objects.get(id=novos[0]['id']).mecanicos.set([self.mecanico])
+        novos = self.client.get(reverse('dashboard_admin_manutencao')).context['chamados_novos']
+        self.assertEqual(len(novos), 0)
+
+    def test_painel_compartilhado_entre_telas(self):
+        self.client.force_login(self.admin)
+        primeira = self.client.get(reverse('dashboard_admin_manutencao'))
+        # Outras telas: só sessão e usuário, o painel vem pronto do snapshot
+        with self.assertNumQueries(2):
+            segunda = self.client.get(reverse('dashboard_admin_manutencao'))
+        self.assertEqual(primeira.context['chamados_novos'], segunda.context['chamados_novos'])
+        self.assertContains(segunda, 'Sem equipe')
+        self.assertEqual(estatisticas()['painel_admin'], {'hit': 1, 'miss': 1, 'taxa': 50.0})
+
+    def test_snapshot_espera_quem_esta_calculando(self):
+        chave = montar_chave(('chamados',), 'teste')
+        cache.add(f'{chave}:calculando', 1)  # outro processo pegou a trava
+
+        def calcular():
+            raise AssertionError('não devia calcular de novo')
+
+        threading.Timer(0.1, lambda: cache.set(chave, _compactar({'pronto': True}))).start()
+        self.assertEqual(obter_snapshot(('chamados',), 'teste', calcular, 10), {'pronto': True})
+
+
+class RespostasCondicionaisTests(DadosChamadosMixin, TestCase):
+    """APIs de equipamentos com ETag por setor: 304 sem tocar no banco enquanto nada muda."""
+
+    def test_304_ate_o_setor_mudar(self):
+        self.client.force_login(self.solicitante)
+        url = reverse('api_pacote_setor', args=[self.setor.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual([eq['nome'] for eq in response.json()['equipamentos']], ['Extrusora'])
+        etag = response['ETag']
+
+        # Sessão e usuário; a versão do setor vem do cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Um equipamento novo no setor troca a versão: volta o JSON atualizado
+        with self.captureOnCommitCallbacks(execute=True):
+            Equipamento.objects.create(nome='Bobinadeira', codigo='BB1', setor=self.setor)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['equipamentos']), 2)
+
+    @override_settings(ALLOWED_HOSTS=['manutencao.local', 'outro.local'])
+    def test_urls_nao_dependem_do_host(self):
+        Equipamento.objects.filter(id=self.equipamento.id).update(imagem='equipamentos/ex01.jpg')
+        self.client.force_login(self.solicitante)
+        url = reverse('api_pacote_setor', args=[self.setor.id])
+        primeira = self.client.get(url, HTTP_HOST='manutencao.local')
+        # O JSON guardado pelo primeiro host serve o segundo (mesmo ETag) sem o host dele dentro
+        segunda = self.client.get(url, HTTP_HOST='outro.local')
+        self.assertEqual(primeira['ETag'], segunda['ETag'])
+        equipamento = segunda.json()['equipamentos'][0]
+        self.assertEqual(equipamento['imagem'], '/media/equipamentos/ex01.jpg')
+        self.assertEqual(equipamento['imagem_mini'], reverse('imagem_derivada', args=['mini', 'equipamentos/ex01.jpg']))
+
+    def test_mudar_de_setor_invalida_os_dois(self):
+        outro_setor = Setor.objects.create(nome='Corte', energia=self.setor.energia)
+        self.client.force_login(self.solicitante)
+        urls = [reverse('get_equipamentos_por_setor', args=[s.id]) for s in (self.setor, outro_setor)]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        equipamento = Equipamento.objects.get(id=self.equipamento.id)
+        equipamento.setor = outro_setor
+        with self.captureOnCommitCallbacks(execute=True):
+            equipamento.save()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detalhes_sem_permissao_nao_ganha_304(self):
+        url = reverse('api_detalhes_equipamento', args=[self.equipamento.id])
+        self.client.force_login(self.mecanico)
+        etag = self.client.get(url)['ETag']
+
+        # Com o ETag de quem pode ver, o solicitante continua barrado (e sem ETag)
+        self.client.force_login(self.solicitante)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class EventosTests(DadosChamadosMixin, TestCase):
+    """Eventos ao vivo: conteúdo publicado e quem recebe cada um."""
+
+    def test_evento_leva_status_e_equipe(self):
+        chamado = Chamado.objects.filter(mecanicos=self.mecanico).first()
+        with self.assertNumQueries(2):
+            evento, = montar_eventos('status', [chamado.id])
+        self.assertEqual(evento['chamado'], chamado.id)
+        self.assertEqual(evento['status'], chamado.status)
+        self.assertEqual(sorted(evento['mecanicos']), sorted([self.mecanico.id, self.outro.id]))
+        self.assertTrue(formatar_sse(evento).startswith('event: chamado\ndata: {'))
+
+    def test_mecanico_so_recebe_os_da_equipe(self):
+        so_do_outro = Chamado.objects.exclude(mecanicos=self.mecanico).filter(mecanicos=self.outro).first()
+        evento, = montar_eventos('atribuido', [so_do_outro.id])
+        self.assertTrue(visivel_para(evento, self.admin))
+        self.assertTrue(visivel_para(evento, self.outro))
+        self.assertFalse(visivel_para(evento, self.mecanico))
+
+        # Quem saiu da equipe recebe, para o chamado sumir da tela dele
+        evento, = montar_eventos('atribuido', [so_do_outro.id], afetados={self.mecanico.id})
+        self.assertTrue(visivel_para(evento, self.mecanico))
+
+    def fragmentos(self, ids, **parametros):
+        return self.client.get(reverse('fragmentos_chamados'), {'ids': ','.join(map(str, ids)), **parametros})
+
+    def test_fragmentos_do_mecanico_so_as_linhas_pedidas(self):
+        meu = Chamado.objects.filter(mecanicos=self.mecanico, status='pendente').first()
+        alheio = Chamado.objects.exclude(mecanicos=self.mecanico).filter(mecanicos=self.outro).first()
+        self.client.force_login(self.mecanico)
+        self.client.get(reverse('mecanico_dashboard'))  # sessão carregada, como na tela aberta
+
+        # Sessão + usuário + contadores + os chamados pedidos, não importa quantos
+        with self.assertNumQueries(4):
+            dados = self.fragmentos([meu.id, alheio.id], tela='mecanico').json()
+        self.assertIn(f'data-chamado="{meu.id}"', dados['chamados'][str(meu.id)]['chamados'])
+        self.assertEqual(dados['chamados'][str(alheio.id)], {})
+        pagina = self.client.get(reverse('mecanico_dashboard')).context
+        self.assertEqual(dados['contadores'], {nome: pagina[nome] for nome in ('pendentes', 'em_progresso', 'concluidos')})
+
+        # Fora do filtro da página aberta: a linha sai da lista
+        dados = self.fragmentos([meu.id], tela='mecanico', status='concluido').json()
+        self.assertEqual(dados['chamados'][str(meu.id)], {})
+        self.assertEqual(dados['contadores']['pendentes'], 0)
+
+    def test_fragmentos_do_painel_admin(self):
+        novo = Chamado.objects.sem_equipe().first()
+        atribuido = Chamado.objects.atribuidos().order_by('-criado_em').first()
+        self.client.force_login(self.admin)
+        dados = self.fragmentos([novo.id, atribuido.id], tela='admin').json()
+        self.assertEqual(set(dados['chamados'][str(novo.id)]), {'novos-cartoes', 'novos-tabela', 'designacao'})
+        self.assertIn('csrfmiddlewaretoken', dados['chamados'][str(novo.id)]['designacao'])
+        self.assertEqual(set(dados['chamados'][str(atribuido.id)]), {'andamento'})
+        self.assertEqual(dados['contadores'], {'total_andamento': Chamado.objects.atribuidos().count()})
+
+        self.client.force_login(self.mecanico)
+        self.assertEqual(self.fragmentos([novo.id], tela='admin').status_code, 403)
+        self.client.force_login(self.solicitante)
+        self.assertEqual(self.fragmentos([novo.id], tela='mecanico').status_code, 403)
+        self.assertEqual(self.fragmentos(['x'], tela='mecanico').status_code, 400)
+
+    @override_settings(EVENTOS_REDIS_URL='redis://redis:6379/1')
+    def test_telas_marcam_as_listas_ao_vivo(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('mecanico_dashboard'))
+        self.assertContains(response, reverse('fragmentos_chamados'))
+        self.assertContains(response, 'data-ao-vivo-lista="chamados"')
+        self.assertContains(response, 'const TELA = "mecanico"')
+        response = self.client.get(reverse('dashboard_admin_manutencao'))
+        self.assertContains(response, 'const TELA = "admin"')
+        for lista in ('novos-cartoes', 'novos-tabela', 'andamento', 'designacao'):
+            self.assertContains(response, f'data-ao-vivo-lista="{lista}"')
+
+    @override_settings(EVENTOS_REDIS_URL='redis://redis:6379/1')
+    def test_falha_ao_publicar_vai_para_o_log(self):
+        chamado = Chamado.objects.first()
+        with mock.patch('manutencao.eventos._redis', side_effect=ConnectionError('redis fora')), \
+                self.assertLogs('manutencao.eventos', 'ERROR') as log, \
+                self.captureOnCommitCallbacks(execute=True):
+            publicar('status', [chamado.id])
+        self.assertIn('redis fora', log.output[0])
+
+    @override_settings(EVENTOS_REDIS_URL='')
+    def test_sem_redis_nao_ha_stream(self):
+        self.client.force_login(self.mecanico)
+        self.assertEqual(self.client.get(reverse('eventos_chamados')).status_code, 204)
+        response = self.client.get(reverse('mecanico_dashboard'))
+        self.assertNotContains(response, 'EventSource')
+
+        self.client.force_login(self.solicitante)
+        self.assertEqual(self.client.get(reverse('eventos_chamados')).status_code, 403)
+
+
+class MetricasTests(DadosChamadosMixin, TestCase):
+    """Middleware de métricas: contadores no /metricas/ e orçamento de consultas por view."""
+
+    def setUp(self):
+        super().setUp()
+        descarregar()  # sobras de outros testes
+        cache.clear()
+
+    def test_endpoint_prometheus(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('mecanico_dashboard'))
+        texto = self.client.get(reverse('metricas')).content.decode()
+        self.assertIn('manutencao_db_consultas_total{view="mecanico_dashboard"} 4\n', texto)
+        self.assertIn('manutencao_http_duracao_segundos_count{view="mecanico_dashboard"} 1\n', texto)
+        self.assertIn('# TYPE manutencao_http_duracao_segundos histogram', texto)
+
+        self.client.force_login(self.mecanico)
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+
+    def test_falha_do_cache_vai_para_o_log(self):
+        with mock.patch('manutencao.metricas._somar', side_effect=ConnectionError('cache fora')), \
+                self.assertLogs('manutencao.metricas', 'ERROR') as log:
+            registrar('teste', {'requisicoes': 1})
+            descarregar()
+        linha = json.loads(FormatadorJSON().format(log.records[0]))
+        self.assertEqual(linha['evento'], 'erro_gravar_metricas')
+        self.assertIn('cache fora', linha['excecao'])
+
+    def test_middleware_nativo_no_asgi(self):
+        async def assincrona(request):
+            return HttpResponse('ok')
+        self.assertTrue(iscoroutinefunction(MetricasMiddleware(assincrona)))
+        self.assertFalse(iscoroutinefunction(MetricasMiddleware(lambda request: HttpResponse('ok'))))
+
+    async def test_requisicao_asgi_e_medida(self):
+        await self.async_client.aforce_login(self.admin)
+        with mock.patch('manutencao.metricas.registrar') as registrar_:
+            response = await self.async_client.get(reverse('mecanico_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        view, valores = registrar_.call_args.args
+        self.assertEqual((view, valores['consultas']), ('mecanico_dashboard', 4))
+
+    @override_settings(METRICAS_TOKEN='segredo')
+    def test_token_do_prometheus(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 401)
+        response = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(METRICAS_ORCAMENTOS={'mecanico_dashboard': {'consultas': 3}})
+    def test_orcamento_excedido(self):
+        self.client.force_login(self.mecanico)
+        with self.assertLogs('manutencao.metricas', 'WARNING'), self.assertRaises(OrcamentoExcedido):
+            self.client.get(reverse('mecanico_dashboard'))
+
+        # Fora dos testes só fica o aviso no log
+        with self.settings(METRICAS_ORCAMENTO_ESTRITO=False), self.assertLogs('manutencao.metricas', 'WARNING') as log:
+            self.assertEqual(self.client.get(reverse('mecanico_dashboard')).status_code, 200)
+        self.assertIn('orcamento_excedido', log.output[0])
+
+
+class BenchmarkIndicesTests(TestCase):
+    """benchmark_indices mexe nos índices do banco atual: não roda em produção por engano."""
+
+    def test_recusa_sem_debug_nem_confirmacao(self):
+        with self.assertRaisesMessage(CommandError, '--confirmar'):
+            call_command('benchmark_indices', chamados=10, rotinas=1, repeticoes=1)
+        self.assertFalse(Chamado.objects.exists())
+
+    @override_settings(DEBUG=True)
+    def test_roda_com_debug_e_desfaz_tudo(self):
+        saida = io.StringIO()
+        call_command('benchmark_indices', chamados=50, rotinas=5, repeticoes=1, stdout=saida)
+        self.assertIn('solicitante_dashboard', saida.getvalue())
+        self.assertFalse(Chamado.objects.exists())
+
+
+class RotinasTests(DadosChamadosMixin, TestCase):
+    """Geração dos chamados das rotinas preventivas (processar_shard_rotinas)."""
+
+    def criar_rotina(self, frequencia='mensal', proxima=date(2026, 1, 31), **campos):
+        return RotinaManutencao.objects.create(
+            nome_rotina='Lubrificação', equipamento=self.equipamento, descricao='Lubrificar',
+            frequencia=frequencia, proxima_execucao=proxima, criado_por=self.admin, **campos,
+        )
+
+    def datas_geradas(self, rotina):
+        return list(
+            Chamado.objects.filter(rotina_origem=rotina).order_by('data_execucao_rotina')
+            .values_list('data_execucao_rotina', flat=True)
+        )
+
+    def test_rodar_duas_vezes_nao_duplica(self):
+        rotina = self.criar_rotina(frequencia='diario', proxima=date(2026, 1, 1))
+        outra = self.criar_rotina(frequencia='semanal', proxima=date(2026, 1, 2))
+        for indice in range(2):
+            processar_shard_rotinas(indice, 2, '2026-01-05')
+
+        esperadas = [date(2026, 1, dia) for dia in range(1, 6)]
+        self.assertEqual(self.datas_geradas(rotina), esperadas)
+        self.assertEqual(self.datas_geradas(outra), [date(2026, 1, 2)])
+        rotina.refresh_from_db()
+        outra.refresh_from_db()
+        self.assertEqual((rotina.proxima_execucao, rotina.ultima_execucao), (date(2026, 1, 6), date(2026, 1, 5)))
+        self.assertEqual(outra.proxima_execucao, date(2026, 1, 9))
+
+        # Segunda rodada no mesmo dia: nada vencido, nada novo
+        for indice in range(2):
+            self.assertEqual(processar_shard_rotinas(indice, 2, '2026-01-05'), 0)
+        self.assertEqual(self.datas_geradas(rotina), esperadas)
+
+        # Mesmo se a data voltar (duas tasks com a mesma fatia), a constraint segura
+        RotinaManutencao.objects.filter(id=rotina.id).update(proxima_execucao=date(2026, 1, 1))
+        processar_shard_rotinas(rotina.id % 2, 2, '2026-01-05')
+        self.assertEqual(self.datas_geradas(rotina), esperadas)
+        rotina.refresh_from_db()
+        self.assertEqual(rotina.proxima_execucao, date(2026, 1, 6))
+
+    def test_rotina_sem_criador_e_desativada(self):
+        rotina = self.criar_rotina(frequencia='diario', proxima=date(2026, 1, 1))
+        RotinaManutencao.objects.filter(id=rotina.id).update(criado_por=None)
+
+        with self.assertLogs('manutencao.tasks', 'WARNING') as log:
+            self.assertEqual(processar_shard_rotinas(0, 1, '2026-01-05'), 0)
+        self.assertIn(f'Rotina #{rotina.id} sem criador', log.output[0])
+        rotina.refresh_from_db()
+        self.assertFalse(rotina.ativo)
+        self.assertEqual(self.datas_geradas(rotina), [])
+        self.assertFalse(OcorrenciaRotina.objects.filter(rotina=rotina).exists())
+
+    def test_mensal_nao_fica_preso_no_dia_28(self):
+        rotina = self.criar_rotina()
+        for dia in (date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)):
+            processar_shard_rotinas(0, 1, dia.isoformat())
+        self.assertEqual(self.datas_geradas(rotina),
+                         [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)])
+        rotina.refresh_from_db()
+        self.assertEqual(rotina.proxima_execucao, date(2026, 5, 31))
+
+        # Salvar pelo formulário com a data ajustada não recomeça a série
+        rotina.proxima_execucao = date(2026, 6, 30)
+        rotina.save()
+        self.assertEqual(rotina.data_inicio, date(2026, 1, 31))
+
+
+@override_settings(ROTINAS_HORIZONTE_DIAS=90)
+class CalendarioRotinasTests(DadosChamadosMixin, TestCase):
+    """Calendário materializado das rotinas (reconstruir_ocorrencias)."""
+
+    def criar_rotina(self, **campos):
+        campos = {'frequencia': 'mensal', 'proxima_execucao': date(2026, 1, 31), **campos}
+        with self.captureOnCommitCallbacks(execute=True):
+            return RotinaManutencao.objects.create(
+                nome_rotina='Inspeção', equipamento=self.equipamento, descricao='Inspecionar',
+                criado_por=self.admin, **campos,
+            )
+
+    def datas(self, rotina):
+        return list(OcorrenciaRotina.objects.filter(rotina=rotina).values_list('data', flat=True))
+
+    def test_mensal_segue_a_ancora(self):
+        rotina = self.criar_rotina()
+        reconstruir_ocorrencias([rotina.id], hoje=date(2026, 1, 15))
+        self.assertEqual(self.datas(rotina), [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)])
+
+        # Depois de rodar em fevereiro a próxima gravada é 28/02, mas março continua no dia 31
+        RotinaManutencao.objects.filter(id=rotina.id).update(proxima_execucao=date(2026, 2, 28))
+        reconstruir_ocorrencias([rotina.id], hoje=date(2026, 2, 10))
+        self.assertEqual(self.datas(rotina), [date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)])
+
+    def test_passo_fixo_setor_e_inativas(self):
+        semanal = self.criar_rotina(frequencia='semanal', proxima_execucao=date(2026, 1, 5))
+        inativa = self.criar_rotina(frequencia='diario', ativo=False)
+        total = reconstruir_ocorrencias([semanal.id, inativa.id], hoje=date(2026, 1, 1))
+
+        datas = self.datas(semanal)
+        self.assertEqual(total, len(datas))
+        self.assertEqual(datas[:3], [date(2026, 1, 5), date(2026, 1, 12), date(2026, 1, 19)])
+        self.assertLessEqual(datas[-1], date(2026, 1, 1) + timedelta(days=90))
+        # Rotina de equipamento herda o setor dele; desativada não tem calendário
+        self.assertEqual(set(OcorrenciaRotina.objects.filter(rotina=semanal).values_list('setor_id', flat=True)), {self.setor.id})
+        self.assertEqual(self.datas(inativa), [])
+
+    def test_salvar_a_rotina_refaz_o_calendario(self):
+        rotina = self.criar_rotina(frequencia='semanal', proxima_execucao=timezone.localdate())
+        antes = self.datas(rotina)
+        self.assertEqual(antes[0], timezone.localdate())
+
+        rotina.frequencia = 'diario'
+        with self.captureOnCommitCallbacks(execute=True):
+            rotina.save()
+        self.assertEqual(len(self.datas(rotina)), settings.ROTINAS_HORIZONTE_DIAS + 1)
+
+
+def foto_jpeg(cor='red', nome='foto.jpg'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), cor).save(buffer, format='JPEG')
+    return SimpleUploadedFile(nome, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT='/tmp/manutencao-testes-media')
+class StorageTests(DadosChamadosMixin, TestCase):
+    """Storage endereçado por conteúdo: deduplicação e contagem de referências."""
+
+    def test_mesmo_conteudo_um_arquivo(self):
+        nome = armazenamento.save('testes/a.txt', ContentFile(b'mesmo conteudo'))
+        self.assertEqual(armazenamento.save('testes/b.txt', ContentFile(b'mesmo conteudo')), nome)
+        self.assertEqual(ArquivoMidia.objects.get(nome=nome).referencias, 2)
+
+        # Soltar uma referência mantém o arquivo; a última apaga do disco e do índice
+        armazenamento.delete(nome)
+        self.assertEqual(ArquivoMidia.objects.get(nome=nome).referencias, 1)
+        self.assertTrue(armazenamento.exists(nome))
+        armazenamento.delete(nome)
+        self.assertFalse(ArquivoMidia.objects.filter(nome=nome).exists())
+        self.assertFalse(armazenamento.exists(nome))
+
+    def test_reenviar_a_mesma_foto_nao_acumula_referencia(self):
+        self.client.force_login(self.admin)
+        url = reverse('editar_equipamento', args=[self.equipamento.id])
+        dados = {'nome': 'Extrusora', 'setor': self.setor.id, 'codigo': 'EX01', 'descricao': ''}
+
+        self.client.post(url, {**dados, 'imagem': foto_jpeg()})
+        nome = Equipamento.objects.get(id=self.equipamento.id).imagem.name
+        self.assertEqual(ArquivoMidia.objects.get(nome=nome).referencias, 1)
+
+        self.client.post(url, {**dados, 'imagem': foto_jpeg()})
+        self.assertEqual(Equipamento.objects.get(id=self.equipamento.id).imagem.name, nome)
+        self.assertEqual(ArquivoMidia.objects.get(nome=nome).referencias, 1)
+
+        # Foto diferente: a antiga é liberada de vez
+        self.client.post(url, {**dados, 'imagem': foto_jpeg('blue')})
+        self.assertFalse(ArquivoMidia.objects.filter(nome=nome).exists())
+        self.assertFalse(armazenamento.exists(nome))
+
+
+@override_settings(MEDIA_ROOT='/tmp/manutencao-testes-media')
+class CompactarAcervoTests(DadosChamadosMixin, TestCase):
+    """Backfill WebP: o checkpoint não pode pular as fotos que falharam."""
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(settings.MEDIA_ROOT, 'checkpoint-testes.json')
+        chamado = Chamado.objects.first()
+        self.boa = ImagemChamado.objects.create(chamado=chamado, imagem=foto_jpeg())
+        self.ruim = ImagemChamado.objects.create(
+            chamado=chamado, imagem=SimpleUploadedFile('ruim.jpg', b'nao e imagem', content_type='image/jpeg'),
+        )
+        self.depois = ImagemChamado.objects.create(chamado=chamado, imagem=foto_jpeg('blue'))
+
+    def compactar(self, **opcoes):
+        return compactar_acervo(self.checkpoint, processos=1, tamanho_lote=1, **opcoes)
+
+    def test_falha_fica_no_checkpoint_e_e_retentada(self):
+        estatisticas = self.compactar(reiniciar=True)
+        self.assertEqual((estatisticas['imagens'], estatisticas['erros']), (2, 1))
+        with open(self.checkpoint, encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        self.assertEqual(dados['ultimo_id'], self.depois.id)
+        self.assertEqual(dados['falhas'], [self.ruim.id])
+
+        # Arquivo consertado: a próxima execução volta nele, mesmo atrás do cursor
+        with open(self.ruim.imagem.path, 'wb') as arquivo:
+            arquivo.write(foto_jpeg('green').read())
+        estatisticas = self.compactar()
+        self.assertEqual((estatisticas['imagens'], estatisticas['erros']), (1, 0))
+        self.assertTrue(ImagemChamado.objects.get(id=self.ruim.id).processada)
+        with open(self.checkpoint, encoding='utf-8') as arquivo:
+            self.assertEqual(json.load(arquivo)['falhas'], [])
+
+
+    def test_task_do_chamado_loga_a_foto_ruim_e_converte_as_outras(self):
+        with self.assertLogs('manutencao.tasks', 'ERROR') as log, self.assertRaises(Exception):
+            processar_imagens_chamado(self.boa.chamado_id)
+        self.assertIn(f'Erro ao processar imagem #{self.ruim.id}', log.output[0])
+        self.assertIn('Traceback', log.output[0])
+        self.assertTrue(ImagemChamado.objects.get(id=self.depois.id).processada)
+
+    def test_broker_fora_ao_concluir_vai_para_o_log(self):
+        chamado = self.boa.chamado
+        with mock.patch('manutencao.tasks.processar_imagens_chamado.delay', side_effect=ConnectionError('broker fora')), \
+                self.assertLogs('manutencao.models', 'ERROR') as log, \
+                self.captureOnCommitCallbacks(execute=True):
+            chamado.agendar_processamento_imagens()
+        self.assertIn(f'chamado #{chamado.id}', log.output[0])
+        self.assertIn('broker fora', log.output[0])
+
+
+class FalhaBackend(BackendNotificacao):
+    """Provedor de push fora do ar."""
+
+    def enviar(self, topico, corpo, headers):
+        raise ConnectionError('ntfy indisponível')
+
+
+@override_settings(NOTIFICACOES_BACKEND='manutencao.notificacoes.MemoriaBackend')
+class OutboxNotificacoesTests(DadosChamadosMixin, TestCase):
+    """Drenagem do outbox: lease, backoff exponencial e dead-letter."""
+
+    def enfileirar(self):
+        return enfileirar_notificacao_novo_chamado(Chamado.objects.first(), 'manutencao.local')
+
+    def test_envia_pendentes_e_respeita_o_lease(self):
+        enviar = self.enfileirar()
+        reservada = self.enfileirar()
+        # Outro worker reservou esta (lease ainda vale): fica de fora do lote
+        NotificacaoOutbox.objects.filter(id=reservada.id).update(proxima_tentativa=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(drenar_notificacoes(), 1)
+        enviar.refresh_from_db()
+        self.assertEqual((enviar.status, enviar.tentativas), ('enviado', 1))
+        self.assertIsNotNone(enviar.enviado_em)
+        self.assertEqual([m['topico'] for m in get_backend().enviadas], [enviar.topico])
+        self.assertEqual(NotificacaoOutbox.objects.get(id=reservada.id).status, 'pendente')
+
+    @override_settings(NOTIFICACOES_BACKEND='manutencao.tests.FalhaBackend', NOTIFICACOES_MAX_TENTATIVAS=2)
+    def test_falha_reagenda_e_depois_vai_para_dead_letter(self):
+        notificacao = self.enfileirar()
+        antes = timezone.now()
+        self.assertEqual(drenar_notificacoes(), 1)
+        notificacao.refresh_from_db()
+        self.assertEqual((notificacao.status, notificacao.tentativas), ('pendente', 1))
+        self.assertIn('ntfy indisponível', notificacao.ultimo_erro)
+        espera = settings.NOTIFICACOES_BACKOFF_SEGUNDOS
+        self.assertGreaterEqual(notificacao.proxima_tentativa, antes + timedelta(seconds=espera))
+        self.assertLessEqual(notificacao.proxima_tentativa, timezone.now() + timedelta(seconds=espera))
+
+        # Antes do backoff vencer não tenta de novo
+        self.assertEqual(drenar_notificacoes(), 0)
+
+        NotificacaoOutbox.objects.filter(id=notificacao.id).update(proxima_tentativa=timezone.now())
+        self.assertEqual(drenar_notificacoes(), 1)
+        notificacao.refresh_from_db()
+        self.assertEqual((notificacao.status, notificacao.tentativas), ('falhou', 2))
+        self.assertEqual(drenar_notificacoes(), 0)
+
+    @override_settings(NOTIFICACOES_BACKEND='manutencao.tests.LentoBackend', NOTIFICACOES_PRAZO_LOTE_SEGUNDOS=0.2)
+    def test_envio_que_termina_depois_do_prazo_nao_sai_duas_vezes(self):
+        LentoBackend.liberar.clear()
+        LentoBackend.entregues.clear()
+        self.addCleanup(LentoBackend.liberar.set)
+        notificacao = self.enfileirar()
+        NotificacaoOutbox.objects.filter(id=notificacao.id).update(topico='lento')
+
+        self.assertEqual(drenar_notificacoes(), 1)
+        notificacao.refresh_from_db()
+        # Não é falha: nenhuma tentativa gasta e reservada por um lease inteiro a partir do prazo
+        self.assertEqual((notificacao.status, notificacao.tentativas), ('pendente', 0))
+        lease = timedelta(seconds=settings.NOTIFICACOES_LEASE_SEGUNDOS)
+        self.assertGreater(notificacao.proxima_tentativa, timezone.now() + lease - timedelta(seconds=5))
+
+        # O ntfy responde depois do prazo: a mensagem chegou e a próxima drenagem não repete
+        LentoBackend.liberar.set()
+        self.assertTrue(LentoBackend.esperar_entrega('lento'))
+        self.assertEqual(drenar_notificacoes(), 0)
+        self.assertEqual(LentoBackend.entregues, ['lento'])
+
+    def test_broker_fora_fica_no_log_e_a_notificacao_no_outbox(self):
+        with mock.patch('manutencao.tasks.drenar_notificacoes.delay', side_effect=ConnectionError('broker fora')), \
+                self.assertLogs('manutencao.utils', 'ERROR') as log, \
+                self.captureOnCommitCallbacks(execute=True):
+            notificacao = self.enfileirar()
+        self.assertIn('broker fora', log.output[0])
+        self.assertEqual(NotificacaoOutbox.objects.get(id=notificacao.id).status, 'pendente')
+
+    @override_settings(NOTIFICACOES_MAX_TENTATIVAS=20)
+    def test_backoff_dobra_ate_o_maximo(self):
+        notificacao = self.enfileirar()
+        esperas = []
+        for _ in range(10):
+            antes = timezone.now()
+            registrar_falha_notificacao(notificacao, 'timeout')
+            esperas.append(round((notificacao.proxima_tentativa - antes).total_seconds()))
+        self.assertEqual(esperas[:4], [30, 60, 120, 240])
+        self.assertEqual(esperas[-1], settings.NOTIFICACOES_BACKOFF_MAXIMO_SEGUNDOS)
+        notificacao.refresh_from_db()
+        self.assertEqual((notificacao.status, notificacao.tentativas), ('pendente', 10))
+
+
+class LentoBackend(BackendNotificacao):
+    """Tópico 'lento' fica preso até o teste liberar (simula o ntfy sem responder)."""
+    liberar = threading.Event()
+    entregues = []
+
+    def enviar(self, topico, corpo, headers):
+        if topico == 'lento':
+            LentoBackend.liberar.wait(5)
+        LentoBackend.entregues.append(topico)
+        return 200
+
+    @classmethod
+    def esperar_entrega(cls, topico, segundos=2):
+        # O envio termina na thread do pool, depois que o lote já voltou
+        for _ in range(int(segundos / 0.02)):
+            if topico in cls.entregues:
+                return True
+            threading.Event().wait(0.02)
+        return False
+
+
+@override_settings(NOTIFICACOES_BACKEND='manutencao.tests.LentoBackend', NOTIFICACOES_MAX_PARALELO=4)
+class DespachoParaleloTests(TestCase):
+    """despachar_em_paralelo: o lote nunca espera mais que o prazo."""
+
+    def setUp(self):
+        LentoBackend.liberar.clear()
+        LentoBackend.entregues.clear()
+        self.addCleanup(LentoBackend.liberar.set)
+
+    def mensagem(self, chave, topico):
+        return chave, topico, 'corpo', {}
+
+    def test_envio_lento_fica_indefinido_no_prazo(self):
+        inicio = timezone.now()
+        resultados = despachar_em_paralelo(
+            [self.mensagem(1, 'rapido'), self.mensagem(2, 'lento'), self.mensagem(3, 'rapido')], prazo=0.2,
+        )
+        self.assertLess(timezone.now() - inicio, timedelta(seconds=2))
+        self.assertEqual(resultados, {1: None, 2: ENVIO_INDEFINIDO, 3: None})
+
+    @override_settings(NOTIFICACOES_MAX_PARALELO=1)
+    def test_fila_do_pool_cheia_tambem_expira(self):
+        # Com uma thread só, a mensagem atrás da lenta nem começa: é cancelada
+        resultados = despachar_em_paralelo([self.mensagem(1, 'lento'), self.mensagem(2, 'rapido')], prazo=0.2)
+        self.assertEqual(resultados, {1: ENVIO_INDEFINIDO, 2: 'Prazo do lote excedido (0.2s)'})
+        LentoBackend.liberar.set()
+        self.assertTrue(LentoBackend.esperar_entrega('lento'))
+        self.assertNotIn('rapido', LentoBackend.entregues)
+
+    @override_settings(NOTIFICACOES_BACKEND='manutencao.tests.FalhaBackend')
+    def test_excecao_do_backend_vira_mensagem(self):
+        self.assertEqual(despachar_em_paralelo([self.mensagem(1, 'rapido')], prazo=1), {1: 'ntfy indisponível'})
+
+
+@override_settings(MEDIA_ROOT='/tmp/manutencao-testes-media', MEDIA_SERVIDOR='django')
+class MidiaTests(DadosChamadosMixin, TestCase):
+    """Entrega das fotos (/media/): condicional, Range e X-Accel-Redirect."""
+
+    conteudo = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'chamados'), exist_ok=True)
+        with open(os.path.join(settings.MEDIA_ROOT, 'chamados', 'midia.bin'), 'wb') as arquivo:
+            arquivo.write(self.conteudo)
+        self.url = reverse('servir_midia', args=['chamados/midia.bin'])
+        self.client.force_login(self.solicitante)
+
+    def test_arquivo_inteiro_e_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+
+        # Sufixo (últimos bytes) e fim além do tamanho, que é cortado no último byte
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[-5:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1020-5000')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+
+    def test_range_fora_do_arquivo_e_416(self):
+        for intervalo in ('bytes=1024-', 'bytes=20-10', 'bytes=-'):
+            response = self.client.get(self.url, HTTP_RANGE=intervalo)
+            self.assertEqual(response.status_code, 416, intervalo)
+            self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        # Vários intervalos não são suportados: vai o arquivo inteiro
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_if_range(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        response.close()
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[:10])
+
+        # Outra versão do arquivo: o Range é ignorado
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outra-versao"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+
+    def test_so_as_pastas_de_upload(self):
+        for nome in ('.compactar_imagens.json', 'chamados/.oculto', 'equipamentos/.git/config',
+                     f'{PASTA_DERIVADOS}/mini/foto.webp', 'testes/midia.bin', 'chamados'):
+            caminho = os.path.join(settings.MEDIA_ROOT, nome)
+            if not os.path.isdir(caminho):
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                with open(caminho, 'wb') as arquivo:
+                    arquivo.write(b'x')
+            self.assertEqual(self.client.get(reverse('servir_midia', args=[nome])).status_code, 404, nome)
+
+    @override_settings(MEDIA_SERVIDOR='nginx')
+    def test_nginx_recebe_so_o_cabecalho(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], settings.MEDIA_ACCEL_PREFIXO + 'chamados/midia.bin')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+        # A permissão continua no Django
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+@override_settings(MEDIA_ROOT='/tmp/manutencao-testes-media')
+class DerivadosTests(DadosChamadosMixin, TestCase):
+    """Miniaturas geradas sob demanda e cache limitado por LRU."""
+
+    def setUp(self):
+        super().setUp()
+        self.pasta = os.path.join(settings.MEDIA_ROOT, PASTA_DERIVADOS)
+        shutil.rmtree(self.pasta, ignore_errors=True)
+        self.nome = armazenamento.save('testes/foto.jpg', foto_jpeg())
+        self.addCleanup(armazenamento.delete, self.nome)
+        self.client.force_login(self.solicitante)
+
+    def test_gera_na_primeira_vez_e_reaproveita(self):
+        destino = caminho_derivado(self.nome, 'mini')
+        self.assertFalse(os.path.exists(destino))
+
+        url = reverse('imagem_derivada', args=['mini', self.nome])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+        with Image.open(destino) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertLessEqual(max(img.size), 128)
+
+        with mock.patch('manutencao.derivados.gerar_derivado') as gerar:
+            self.client.get(url).close()
+        gerar.assert_not_called()
+
+    def test_pedidos_invalidos_sao_404(self):
+        for preset, nome in (('gigante', self.nome), ('mini', 'testes/nao-existe.jpg'), ('mini', f'{PASTA_DERIVADOS}/mini/foto.webp')):
+            self.assertEqual(self.client.get(reverse('imagem_derivada', args=[preset, nome])).status_code, 404)
+
+    def test_uso_renova_o_mtime(self):
+        url = reverse('imagem_derivada', args=['mini', self.nome])
+        self.client.get(url).close()
+        destino = caminho_derivado(self.nome, 'mini')
+        antigo = timezone.now().timestamp() - 2 * 3600
+        os.utime(destino, (antigo, antigo))
+
+        self.client.get(url).close()
+        self.assertGreater(os.stat(destino).st_mtime, antigo + 3600)
+
+    def test_limpeza_remove_os_menos_usados(self):
+        os.makedirs(os.path.join(self.pasta, 'mini'))
+        agora = timezone.now().timestamp()
+        for i, nome in enumerate(('velho', 'medio', 'novo')):
+            caminho = os.path.join(self.pasta, 'mini', f'{nome}.webp')
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(b'x' * 100)
+            os.utime(caminho, (agora - (3 - i) * 3600,) * 2)
+
+        self.assertEqual(limpar_derivados(limite_bytes=250), (1, 100))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.pasta, 'mini'))), ['medio.webp', 'novo.webp'])
+        self.assertEqual(limpar_derivados(limite_bytes=250), (0, 0))
+        self.assertEqual(limpar_derivados(limite_bytes=0), (2, 200))
+
+    @override_settings(DERIVADOS_LIMITE_BYTES=0)
+    def test_task_de_limpeza_vai_para_o_log(self):
+        os.makedirs(os.path.join(self.pasta, 'mini'))
+        with open(os.path.join(self.pasta, 'mini', 'velho.webp'), 'wb') as arquivo:
+            arquivo.write(b'x' * 100)
+        with self.assertLogs('manutencao.tasks', 'INFO') as log:
+            limpar_cache_derivados()
+        self.assertEqual(log.output, ['INFO:manutencao.tasks:Cache de derivados: 1 arquivos removidos, 0.0 MB liberados'])
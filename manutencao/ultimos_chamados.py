@@ -0,0 +1,59 @@
+# manutencao/ultimos_chamados.py
+from django.apps import apps as apps_globais
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+STATUS = ('pendente', 'em_progresso', 'concluido')
+
+
+def _ultimo(chamados, filtro, campo='id', **extra):
+    # Subconsulta correlacionada: o chamado mais recente que casa com o filtro (usa os índices por -criado_em)
+    return Subquery(
+        chamados.filter(**{filtro: OuterRef('pk')}, **extra)
+        .order_by('-criado_em', '-id')
+        .values(campo)[:1]
+    )
+
+
+def atualizar_ultimos_chamados(equipamento_ids=(), setor_ids=(), apps=None):
+    """
+    Recalcula os ponteiros de "último chamado" (geral e por status) e a data da
+    última atividade dos equipamentos/setores informados (None = todos, vazio = nenhum).
+    É um UPDATE só por tabela, com subconsultas correlacionadas: sempre parte
+    dos chamados, então rodar de novo ou fora de ordem nunca deixa valor errado.
+    `apps` permite usar os modelos históricos dentro de uma migration.
+    """
+    apps = apps or apps_globais
+    Chamado = apps.get_model('manutencao', 'Chamado')
+    Equipamento = apps.get_model('manutencao', 'Equipamento')
+    Setor = apps.get_model('manutencao', 'Setor')
+    chamados = Chamado._base_manager.all()
+
+    if equipamento_ids is None or equipamento_ids:
+        equipamentos = Equipamento.objects.all()
+        if equipamento_ids is not None:
+            equipamentos = equipamentos.filter(id__in=list(equipamento_ids))
+        equipamentos.update(
+            ultimo_chamado=_ultimo(chamados, 'equipamento'),
+            ultima_atividade=_ultimo(chamados, 'equipamento', campo='criado_em'),
+            **{f'ultimo_chamado_{status}': _ultimo(chamados, 'equipamento', status=status) for status in STATUS},
+        )
+
+    if setor_ids is None or setor_ids:
+        setores = Setor.objects.all()
+        if setor_ids is not None:
+            setores = setores.filter(id__in=list(setor_ids))
+        avulsos = chamados.filter(tipo='avulso')
+        setores.update(
+            ultimo_avulso=_ultimo(avulsos, 'setor_avulso'),
+            ultima_atividade_avulso=_ultimo(avulsos, 'setor_avulso', campo='criado_em'),
+            **{f'ultimo_avulso_{status}': _ultimo(avulsos, 'setor_avulso', status=status) for status in STATUS},
+        )
+
+
+def agendar_atualizacao_ultimos(equipamento_ids=(), setor_ids=()):
+    """Atualiza os ponteiros depois do COMMIT (ids None/vazios são ignorados)."""
+    equipamento_ids = {id_ for id_ in equipamento_ids if id_}
+    setor_ids = {id_ for id_ in setor_ids if id_}
+    if equipamento_ids or setor_ids:
+        transaction.on_commit(lambda: atualizar_ultimos_chamados(equipamento_ids, setor_ids))
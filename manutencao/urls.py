@@ -1,7 +1,5 @@
 # ==================== URLS.PY ====================
 from django.urls import path
-from django.conf import settings
-from django.conf.urls.static import static
 from . import views
 
 urlpatterns = [
@@ -17,19 +15,31 @@ urlpatterns = [
     path('equipamentos/', views.gerenciar_equipamentos, name='gerenciar_equipamentos'),
     path('equipamento/editar/<int:pk>/', views.editar_equipamento, name='editar_equipamento'),
     path('api/equipamentos/setor/<int:setor_id>/', views.get_equipamentos_por_setor, name='get_equipamentos_por_setor'),
+    path('api/setor/<int:setor_id>/pacote/', views.api_pacote_setor, name='api_pacote_setor'),
     path('historicos/', views.historicos, name='historicos'),
+    path('chamados/exportar/', views.exportar_chamados, name='exportar_chamados'),
+    path('busca/', views.busca, name='busca'),
+    path('indicadores/', views.indicadores, name='indicadores'),
+    path('api/indicadores/', views.api_indicadores, name='api_indicadores'),
+    path('api/cache/', views.api_cache_estatisticas, name='api_cache_estatisticas'),
+    path('eventos/chamados/', views.eventos_chamados, name='eventos_chamados'),
+    path('api/chamados/fragmentos/', views.fragmentos_chamados, name='fragmentos_chamados'),
+    path('metricas/', views.metricas, name='metricas'),
     path('historicos/equipamento/<int:equipamento_id>/', views.historico_equipamento, name='historico_equipamento'),
     path('historicos/setor/<int:setor_id>/', views.historico_setor, name='historico_setor'),
     
     path('admin-manutencao/', views.dashboard_admin_manutencao, name='dashboard_admin_manutencao'),
     path('rotinas/', views.gerenciar_rotinas, name='gerenciar_rotinas'),
     path('rotinas/excluir/<int:rotina_id>/', views.excluir_rotina, name='excluir_rotina'),
+    path('rotinas/calendario/', views.calendario_rotinas, name='calendario_rotinas'),
+    path('api/rotinas/ocorrencias/', views.api_ocorrencias_rotinas, name='api_ocorrencias_rotinas'),
 
     path('chamado/<int:chamado_id>/atribuir/', views.atribuir_chamado, name='atribuir_chamado'),
     path('energia/gerenciar/', views.gerenciar_energia, name='gerenciar_energia'),
     path('painel-qr/<int:pk>/', views.painel_qr_equipamento, name='painel_qr'),
     path('gerenciar/etiquetas/', views.gerador_etiquetas, name='gerador_etiquetas'),
     path('api/equipamento/detalhes/<int:pk>/', views.api_detalhes_equipamento, name='api_detalhes_equipamento'),
-]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('midia/derivado/<str:preset>/<path:nome>', views.imagem_derivada, name='imagem_derivada'),
+    # Fotos (MEDIA_URL): autorização no Django, entrega pelo nginx quando MEDIA_SERVIDOR='nginx'
+    path('media/<path:caminho>', views.servir_midia, name='servir_midia'),
+]
\ No newline at end of file
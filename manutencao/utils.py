@@ -1,70 +1,107 @@
 # manutencao/utils.py
-import requests
-
-def enviar_notificacao_ntfy(chamado, host):
-    try:
-        topico = "manutencao_lynd_notificacao"
-        
-        # 1. Garantimos que maquina seja sempre string, mesmo se der erro no banco
-        maquina = str(chamado.equipamento.nome) if chamado.equipamento else "Avulso/Setor"
-        
-        # 2. Simplificamos os headers ao máximo (evitando acentos aqui)
-        headers = {
-            "Title": "NOVO CHAMADO", # Sem acento para evitar erro de header
-            "Priority": "4",
-            "Tags": "wrench,warning"
-        }
-
-        # 3. Adicionamos o link APENAS se o host existir
-        if host:
-            headers["Click"] = f"http://{host}/admin-manutencao"  # Link para o detalhe do chamado
-
-        # 4. Montamos o corpo de forma segura (usando f-string limpa)
-        corpo = f"Maquina: {maquina}\nSolicitante: {chamado.solicitante}"
-
-        # 5. O Post
-        response = requests.post(
-            f"https://ntfy.sh/{topico}",
-            data=corpo.encode('utf-8'),
-            headers=headers,
-            timeout=10
-        )
-        
-        return response.status_code == 200
-
-    except Exception as e:
-        print(f"Erro na notificacao: {e}")
-        return False
-    
-
-
-# Nova função para notificar o mecânico designado
-def notificar_mecanico_designado(chamado, mecanico, host):
-    try:
-        # 1. Limpa o username para garantir que a URL seja válida (remove espaços e acentos)
-        # Ou melhor ainda: use o ID do usuário para ser impossível errar
-        topico_limpo = f"manutencao_lynd_mecanico_{mecanico.id}"
-        
-        maquina = str(chamado.equipamento.nome) if chamado.equipamento else "Avulso/Setor"
-        
-        headers = {
-            "Title": "TRABALHO DESIGNADO",
-            "Priority": "5", # Urgente
-            "Tags": "hammer_and_wrench",
-            "Click": f"http://{host}/chamado/{chamado.id}/status"
-        }
-
-        # 2. Faz o POST
-        response = requests.post(
-            f"https://ntfy.sh/{topico_limpo}",
-            data=f"Voce foi escalado para a maquina: {maquina}".encode('utf-8'),
-            headers=headers,
-            timeout=10
-        )
-        
-        print(f"DEBUG: Enviado para {topico_limpo} | Status: {response.status_code}")
-        return True
-
-    except Exception as e:
-        print(f"DEBUG: Erro ao notificar: {e}")
-        return False
\ No newline at end of file
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def montar_notificacao_novo_chamado(chamado, host):
+    topico = f"{settings.NTFY_TOPICO_PREFIXO}_notificacao"
+
+    # 1. Garantimos que maquina seja sempre string, mesmo se der erro no banco
+    maquina = str(chamado.equipamento.nome) if chamado.equipamento else "Avulso/Setor"
+
+    # 2. Simplificamos os headers ao máximo (evitando acentos aqui)
+    headers = {
+        "Title": "NOVO CHAMADO", # Sem acento para evitar erro de header
+        "Priority": "4",
+        "Tags": "wrench,warning"
+    }
+
+    # 3. Adicionamos o link APENAS se o host existir
+    if host:
+        headers["Click"] = f"http://{host}/admin-manutencao"  # Link para o detalhe do chamado
+
+    # 4. Montamos o corpo de forma segura (usando f-string limpa)
+    corpo = f"Maquina: {maquina}\nSolicitante: {chamado.solicitante}"
+
+    return topico, corpo, headers
+
+
+def montar_notificacao_mecanico(chamado, mecanico, host):
+    # Use o ID do usuário no tópico para ser impossível errar (sem espaços e acentos)
+    topico = f"{settings.NTFY_TOPICO_PREFIXO}_mecanico_{mecanico.id}"
+
+    maquina = str(chamado.equipamento.nome) if chamado.equipamento else "Avulso/Setor"
+
+    headers = {
+        "Title": "TRABALHO DESIGNADO",
+        "Priority": "5", # Urgente
+        "Tags": "hammer_and_wrench",
+        "Click": f"http://{host}/chamado/{chamado.id}/status"
+    }
+
+    corpo = f"Voce foi escalado para a maquina: {maquina}"
+
+    return topico, corpo, headers
+
+
+def enfileirar_notificacao_novo_chamado(chamado, host):
+    """
+    Grava a notificação de novo chamado no outbox.
+    Deve ser chamada dentro da mesma transação que salvou o chamado.
+    """
+    from .models import NotificacaoOutbox
+
+    topico, corpo, headers = montar_notificacao_novo_chamado(chamado, host)
+    notificacao = NotificacaoOutbox.objects.create(
+        tipo='novo_chamado',
+        chamado=chamado,
+        topico=topico,
+        corpo=corpo,
+        cabecalhos=headers,
+    )
+    agendar_envio_notificacoes()
+    return notificacao
+
+
+def enfileirar_notificacao_mecanicos(chamado, mecanicos, host):
+    """
+    Grava uma notificação por mecânico designado no outbox (um único INSERT).
+    """
+    from .models import NotificacaoOutbox
+
+    notificacoes = []
+    for mecanico in mecanicos:
+        topico, corpo, headers = montar_notificacao_mecanico(chamado, mecanico, host)
+        notificacoes.append(NotificacaoOutbox(
+            tipo='mecanico_designado',
+            chamado=chamado,
+            mecanico=mecanico,
+            topico=topico,
+            corpo=corpo,
+            cabecalhos=headers,
+        ))
+
+    criadas = NotificacaoOutbox.objects.bulk_create(notificacoes)
+    if criadas:
+        agendar_envio_notificacoes()
+    return criadas
+
+
+def agendar_envio_notificacoes():
+    """
+    Dispara a drenagem do outbox só depois do COMMIT.
+    Se o broker estiver fora, o agendamento periódico (beat) drena depois.
+    """
+    def _disparar():
+        from .tasks import drenar_notificacoes
+        try:
+            drenar_notificacoes.delay()
+        except Exception:
+            logger.exception("Erro ao agendar envio de notificações")
+
+    transaction.on_commit(_disparar)
+
@@ -1,20 +1,41 @@
 # ==================== VIEWS.PY ====================
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.utils import timezone
-from django.http import JsonResponse
-from django.db.models import Case, When, Value, IntegerField, Q , Max, F
-from .models import Usuario, Setor, Equipamento, Chamado, ImagemChamado, Energia, RotinaManutencao
+from django.http import HttpResponse, JsonResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.conf import settings
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from django.db.models import Case, When, Value, IntegerField, Q , F, Count
+from django.db import transaction
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .models import Usuario, Setor, Equipamento, Chamado, ImagemChamado, Energia, RotinaManutencao, OcorrenciaRotina, DocumentoBusca, IndicadorDiario
 from .forms import ChamadoForm, SetorForm, EquipamentoForm, RotinaManutencaoForm
+from .derivados import PRESETS, PASTA_DERIVADOS, obter_derivado, url_derivado
+from .midia import responder_arquivo
+from .paginacao import paginar
+from .painel import ANDAMENTO_LIMITE, painel_admin
+from .busca import buscar, buscar_ids
+from .cache import obter as obter_do_cache, etag, ns_setor, ns_equipamento, lista_mecanicos, setores_ordenados, setores_com_equipamentos, estatisticas
+from .eventos import ativo as eventos_ativos, fluxo_eventos
+from .exportacao import linhas_csv
+from .metricas import texto_prometheus
+from .indicadores import PERIODOS, ranking_indicadores, serie_indicadores
 from datetime import datetime, timedelta
 import os
 
-from .utils import enviar_notificacao_ntfy
-from .utils import notificar_mecanico_designado
+from .utils import enfileirar_notificacao_novo_chamado
+from .utils import enfileirar_notificacao_mecanicos
 # funcoes criadas pra notificar usando o ntfy quando abre e quando atribui um chamado
+# (gravam no outbox, quem envia de fato é o Celery)
+
+# Ordenações que os filtros dos dashboards oferecem
+ORDENS_PERMITIDAS = ('-criado_em', 'criado_em', 'prioridade', '-prioridade')
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -60,7 +81,7 @@ def solicitante_dashboard(request):
         return redirect('dashboard')
     
     #Pega a lista base 
-    chamados_list = Chamado.objects.filter(solicitante=request.user)
+    chamados_list = Chamado.objects.filter(solicitante=request.user).for_listing(com_equipe=True)
 
     #Aplica os filtros na lista completa
     status_filtro = request.GET.get('status')
@@ -75,12 +96,11 @@ def solicitante_dashboard(request):
         chamados_list = chamados_list.filter(criado_em__gte=uma_semana_atras)
 
     ordem = request.GET.get('ordem', '-criado_em')
-    chamados_list = chamados_list.order_by(ordem)
+    if ordem not in ORDENS_PERMITIDAS:
+        ordem = '-criado_em'
 
     # Paginação (depois dos filtros)
-    paginator = Paginator(chamados_list, 12) # chamados por pagina
-    page_number = request.GET.get('page')
-    chamados_paginados = paginator.get_page(page_number)
+    chamados_paginados = paginar(request, chamados_list, [ordem], 12) # chamados por pagina
 
     return render(request, 'manutencao/solicitante_dashboard.html', {
         'chamados': chamados_paginados, 
@@ -94,33 +114,11 @@ def dashboard_admin_manutencao(request):
     if request.user.tipo not in ['mecanico_admin', 'solicitante_admin']:
         return redirect('dashboard')
     
-    # 1 Chamados NOVOS (Aguardando designacao)
-    chamados_novos = Chamado.objects.filter(mecanicos__isnull=True).order_by('-criado_em')
-    
-    # 2 Chamados EM ANDAMENTO (ja designados)
-    queryset_andamento = Chamado.objects.filter(mecanicos__isnull=False)\
-        .select_related('equipamento', 'equipamento__setor', 'setor_avulso')\
-        .prefetch_related('mecanicos')\
-        .order_by('-criado_em')\
-        .distinct()
-    
-    total_andamento = queryset_andamento.count()
-    chamados_em_andamento = queryset_andamento[:10]
-    
-    # 3 Dados auxiliares para o dashboard
-    mecanicos = Usuario.objects.filter(tipo__in=['mecanico', 'mecanico_admin'])
-    setores = Setor.objects.all()
-    equipamentos = Equipamento.objects.all()
-    
-    
-    return render(request, 'manutencao/admin_dashboard.html', {
-        'chamados_novos': chamados_novos,
-        'chamados_em_andamento': chamados_em_andamento,
-        'mecanicos': mecanicos,
-        'setores': setores,
-        'equipamentos': equipamentos,
-        'total_andamento': total_andamento
-    })
+    # Chamados novos, em andamento, mecânicos e contagens: um snapshot só, calculado uma
+    # vez e compartilhado por todas as telas que estão com o painel aberto
+    contexto = painel_admin()
+    contexto['ao_vivo'] = 'admin' if eventos_ativos() else ''
+    return render(request, 'manutencao/admin_dashboard.html', contexto)
 
 @login_required
 def atribuir_chamado(request, chamado_id):
@@ -130,26 +128,25 @@ def atribuir_chamado(request, chamado_id):
     chamado = get_object_or_404(Chamado, id=chamado_id)
     
     if request.method == 'POST':
-        #  Captura a nova prioridade definida pelo Admin e salva no banco
         nova_prioridade = request.POST.get('prioridade')
-        if nova_prioridade:
-            chamado.prioridade = int(nova_prioridade)
-            chamado.save() # importante salvar para a prioridade persistir
-
-        # Atribui a equipe de mecânicos
         mecanicos_ids = request.POST.getlist('mecanicos')
-        if mecanicos_ids:
-            chamado.mecanicos.set(mecanicos_ids)
 
-            # --- NOTIFICAÇÃO NTFY PARA CADA MECÂNICO ---
-            # Pegamos o host atual para o link funcionar
-            host_atual = request.get_host()
-            
-            # Percorremos os mecânicos que acabaram de ser atribuídos
-            for mecanico in chamado.mecanicos.all():
-                notificar_mecanico_designado(chamado, mecanico, host_atual)
-            # -------------------------------------------
+        with transaction.atomic():
+            #  Captura a nova prioridade definida pelo Admin e salva no banco
+            if nova_prioridade:
+                chamado.prioridade = int(nova_prioridade)
+                chamado.save() # importante salvar para a prioridade persistir
+
+            # Atribui a equipe de mecânicos
+            if mecanicos_ids:
+                chamado.mecanicos.set(mecanicos_ids)
+
+                # --- NOTIFICAÇÃO NTFY PARA CADA MECÂNICO ---
+                # Grava no outbox na mesma transação; o envio acontece no Celery
+                enfileirar_notificacao_mecanicos(chamado, chamado.mecanicos.all(), request.get_host())
+                # -------------------------------------------
 
+        if mecanicos_ids:
             messages.success(request, f"Chamado {chamado.id} atribuído e prioridade atualizada!")
         else:
             messages.warning(request, f"Chamado {chamado.id} atualizado, mas sem equipe técnica.")
@@ -164,7 +161,7 @@ def gerenciar_rotinas(request):
 
     # Dados para a listagem
     rotinas = RotinaManutencao.objects.all().order_by('proxima_execucao')
-    setores = Setor.objects.all().order_by('nome')
+    setores = setores_ordenados()
     
     # Lógica de Edição: Busca a instância se houver 'edit' na URL
     edit_id = request.GET.get('edit')
@@ -202,6 +199,245 @@ def gerenciar_rotinas(request):
         'editando': bool(instancia)
     })   
 
+def filtrar_ocorrencias(request):
+    """
+    Lê inicio/fim (AAAA-MM-DD), setor e equipamento da querystring e devolve
+    (queryset de OcorrenciaRotina, inicio, fim). Padrão: hoje até o fim do horizonte.
+    """
+    hoje = timezone.localdate()
+    try:
+        inicio = datetime.strptime(request.GET['inicio'], '%Y-%m-%d').date() if request.GET.get('inicio') else hoje
+        fim = datetime.strptime(request.GET['fim'], '%Y-%m-%d').date() if request.GET.get('fim') else hoje + timedelta(days=settings.ROTINAS_HORIZONTE_DIAS)
+    except ValueError:
+        inicio, fim = hoje, hoje + timedelta(days=settings.ROTINAS_HORIZONTE_DIAS)
+
+    ocorrencias = OcorrenciaRotina.objects.filter(data__range=(inicio, fim))
+    if request.GET.get('setor', '').isdigit():
+        ocorrencias = ocorrencias.filter(setor_id=request.GET['setor'])
+    if request.GET.get('equipamento', '').isdigit():
+        ocorrencias = ocorrencias.filter(equipamento_id=request.GET['equipamento'])
+    return ocorrencias, inicio, fim
+
+
+@login_required
+def calendario_rotinas(request):
+    if not request.user.is_manutencao:
+        return redirect('dashboard')
+
+    ocorrencias, inicio, fim = filtrar_ocorrencias(request)
+    ocorrencias = ocorrencias.select_related('rotina', 'setor', 'equipamento').order_by('data', 'setor__nome')
+
+    # Agrupa por dia para o calendário e soma por setor para o planejamento da equipe
+    dias = {}
+    por_setor = {}
+    for ocorrencia in ocorrencias:
+        dias.setdefault(ocorrencia.data, []).append(ocorrencia)
+        nome_setor = ocorrencia.setor.nome if ocorrencia.setor else 'Sem setor'
+        por_setor[nome_setor] = por_setor.get(nome_setor, 0) + 1
+
+    return render(request, 'manutencao/calendario_rotinas.html', {
+        'dias': dias.items(),
+        'por_setor': sorted(por_setor.items(), key=lambda item: -item[1]),
+        'total': sum(por_setor.values()),
+        'inicio': inicio,
+        'fim': fim,
+        'setores': setores_ordenados(),
+        'setor_filtro': request.GET.get('setor', ''),
+    })
+
+
+@login_required
+def api_ocorrencias_rotinas(request):
+    if not request.user.is_manutencao:
+        return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
+
+    ocorrencias, inicio, fim = filtrar_ocorrencias(request)
+    por_setor = ocorrencias.values('setor_id', 'setor__nome').annotate(total=Count('id')).order_by('setor__nome')
+    lista = ocorrencias.values('data', 'rotina_id', 'rotina__nome_rotina', 'setor_id', 'equipamento_id').order_by('data')
+
+    return JsonResponse({
+        'inicio': inicio,
+        'fim': fim,
+        'por_setor': [
+            {'setor_id': item['setor_id'], 'setor': item['setor__nome'], 'total': item['total']}
+            for item in por_setor
+        ],
+        'ocorrencias': [
+            {
+                'data': item['data'],
+                'rotina_id': item['rotina_id'],
+                'rotina': item['rotina__nome_rotina'],
+                'setor_id': item['setor_id'],
+                'equipamento_id': item['equipamento_id'],
+            }
+            for item in lista
+        ],
+    })
+
+def filtrar_indicadores(request):
+    """
+    Lê escopo, objeto, inicio/fim (AAAA-MM-DD) e periodo da querystring.
+    Padrão: setores, últimos 12 meses, série mensal (semanal/diária em intervalos curtos).
+    """
+    escopo = request.GET.get('escopo')
+    if escopo not in dict(IndicadorDiario.ESCOPO_CHOICES):
+        escopo = 'setor'
+    objeto_id = request.GET.get('objeto') if request.GET.get('objeto', '').isdigit() else None
+
+    hoje = timezone.localdate()
+    try:
+        fim = datetime.strptime(request.GET['fim'], '%Y-%m-%d').date() if request.GET.get('fim') else hoje
+        inicio = datetime.strptime(request.GET['inicio'], '%Y-%m-%d').date() if request.GET.get('inicio') else fim - timedelta(days=364)
+    except ValueError:
+        inicio, fim = hoje - timedelta(days=364), hoje
+
+    periodo = request.GET.get('periodo')
+    if periodo not in PERIODOS:
+        dias = (fim - inicio).days
+        periodo = 'dia' if dias <= 31 else 'semana' if dias <= 120 else 'mes'
+    return escopo, objeto_id, inicio, fim, periodo
+
+
+@login_required
+def indicadores(request):
+    if not request.user.is_manutencao:
+        return redirect('dashboard')
+
+    # Só lê os rollups diários (indicadores.py): um ano inteiro não toca na tabela de chamados
+    escopo, objeto_id, inicio, fim, periodo = filtrar_indicadores(request)
+    ranking = ranking_indicadores(escopo, inicio, fim)
+    serie = serie_indicadores(escopo, inicio, fim, objeto_id, periodo)
+
+    maior_parada = max([linha['parada_minutos'] for linha in serie] or [0])
+    for linha in serie:
+        linha['barra'] = round(100 * linha['parada_minutos'] / maior_parada) if maior_parada else 0
+
+    return render(request, 'manutencao/indicadores.html', {
+        'ranking': ranking,
+        'serie': serie,
+        'escopo': escopo,
+        'escopos': IndicadorDiario.ESCOPO_CHOICES,
+        'objeto_id': objeto_id,
+        'objeto_nome': next((linha['nome'] for linha in ranking if str(linha['objeto_id']) == objeto_id), None),
+        'inicio': inicio,
+        'fim': fim,
+        'periodo': periodo,
+    })
+
+
+@login_required
+def api_indicadores(request):
+    if not request.user.is_manutencao:
+        return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
+
+    escopo, objeto_id, inicio, fim, periodo = filtrar_indicadores(request)
+    campos = ('abertos', 'falhas', 'iniciados', 'concluidos', 'mttr_horas', 'resposta_horas', 'parada_minutos', 'mtbf_horas')
+
+    return JsonResponse({
+        'escopo': escopo,
+        'inicio': inicio,
+        'fim': fim,
+        'periodo': periodo,
+        'ranking': [
+            {'id': linha['objeto_id'], 'nome': linha['nome'], **{campo: linha[campo] for campo in campos}}
+            for linha in ranking_indicadores(escopo, inicio, fim)
+        ],
+        'serie': [
+            {'periodo': linha['periodo'], **{campo: linha[campo] for campo in campos}}
+            for linha in serie_indicadores(escopo, inicio, fim, objeto_id, periodo)
+        ],
+    })
+
+@login_required
+def api_cache_estatisticas(request):
+    if request.user.tipo != 'mecanico_admin':
+        return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
+    return JsonResponse({'backend': settings.CACHES['default']['BACKEND'], 'entradas': estatisticas()})
+
+def metricas(request):
+    """
+    Métricas por view no formato de texto do Prometheus. Com METRICAS_TOKEN o
+    scraper se identifica pelo header Authorization; sem ele, só o admin logado.
+    """
+    if settings.METRICAS_TOKEN:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICAS_TOKEN}'):
+            return HttpResponse(status=401)
+    elif not (request.user.is_authenticated and request.user.tipo == 'mecanico_admin'):
+        return HttpResponse(status=403)
+    return HttpResponse(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required
+async def eventos_chamados(request):
+    """
+    Stream SSE dos dashboards (precisa do servidor ASGI, ver docker-compose):
+    chamado criado, atribuído ou com status novo chega aqui via Redis e a tela
+    pede só as linhas desses chamados em fragmentos_chamados, sem recarregar a página.
+    """
+    usuario = await request.auser()
+    if usuario.tipo not in ('mecanico', 'mecanico_admin', 'solicitante_admin'):
+        return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
+    if not eventos_ativos():
+        # 204 faz o EventSource desistir de reconectar (sem Redis não há o que ouvir)
+        return HttpResponse(status=204)
+
+    resposta = StreamingHttpResponse(fluxo_eventos(usuario), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'  # nginx repassa cada evento na hora
+    return resposta
+
+# Quantos chamados uma tela pede por vez (as rotinas geram rajadas)
+FRAGMENTOS_MAXIMO = 50
+
+@login_required
+def fragmentos_chamados(request):
+    """
+    HTML só das linhas dos chamados que chegaram pelos eventos ao vivo, por lista
+    da tela ('tela': mecanico ou admin), e os contadores. A tela troca, insere ou
+    tira essas linhas; nenhuma lista inteira é montada de novo. Lista que não vem
+    na resposta é porque o chamado saiu dela (mudou de status, saiu do filtro...).
+    """
+    try:
+        ids = [int(id_) for id_ in request.GET.get('ids', '').split(',') if id_][:FRAGMENTOS_MAXIMO]
+    except ValueError:
+        return HttpResponseBadRequest('ids inválidos')
+
+    if request.GET.get('tela') == 'admin':
+        if request.user.tipo not in ['mecanico_admin', 'solicitante_admin']:
+            return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
+        # Mesmo snapshot do painel: calculado uma vez para todas as telas abertas
+        painel = painel_admin()
+        novos = {chamado['id']: chamado for chamado in painel['chamados_novos']}
+        andamento = {chamado['id']: chamado for chamado in painel['chamados_em_andamento'][:ANDAMENTO_LIMITE]}
+        contexto = {'mecanicos': painel['mecanicos']}
+        chamados = {}
+        for id_ in ids:
+            fragmentos = {}
+            if id_ in novos:
+                contexto['chamado'] = novos[id_]
+                fragmentos['novos-cartoes'] = render_to_string('manutencao/_admin_novo_cartao.html', contexto, request)
+                fragmentos['novos-tabela'] = render_to_string('manutencao/_admin_novo_linha.html', contexto, request)
+                fragmentos['designacao'] = render_to_string('manutencao/_admin_modal_designar.html', contexto, request)
+            if id_ in andamento:
+                contexto['chamado'] = andamento[id_]
+                fragmentos['andamento'] = render_to_string('manutencao/_admin_andamento_linha.html', contexto, request)
+            chamados[id_] = fragmentos
+        return JsonResponse({'chamados': chamados, 'contadores': {'total_andamento': painel['total_andamento']}})
+
+    if not request.user.is_manutencao:
+        return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
+    # Mesmos filtros da página aberta (a tela manda a própria query string)
+    chamados_list, *_ = chamados_do_mecanico(request)
+    totais = totais_do_mecanico(chamados_list)
+    chamados = {id_: {} for id_ in ids}
+    for chamado in chamados_list.for_listing().filter(id__in=ids):
+        chamados[chamado.id] = {
+            'chamados': render_to_string('manutencao/_card_chamado_mecanico.html', {'chamado': chamado}, request),
+        }
+    return JsonResponse({
+        'chamados': chamados,
+        'contadores': {nome: totais[nome] for nome in ('pendentes', 'em_progresso', 'concluidos')},
+    })
+
 @login_required
 def excluir_rotina(request, rotina_id):
     if request.user.tipo != 'mecanico_admin':
@@ -216,30 +452,11 @@ def excluir_rotina(request, rotina_id):
     return redirect('gerenciar_rotinas')
 
 
-@login_required
-def mecanico_dashboard(request):
-    if not request.user.is_manutencao:
-        return redirect('dashboard')
-    
-    # --- LÓGICA DE PERMISSÃO ---
-    if request.user.tipo == 'mecanico_admin':
-        # Admin vê TUDO que ja tenha mecanicos atribuidos (removendo o filtro de mecanicos=request.user)
-        chamados_list = Chamado.objects.filter(mecanicos__isnull=False).distinct() # Garante que só traga chamados com mecanicos atribuidos
-    else:
-        # Mecânico comum vê apenas os dele
-        chamados_list = Chamado.objects.filter(mecanicos=request.user)
-
-    # lógica de filtros continua IGUAL 
-    chamados_list = chamados_list.annotate(
-        ordem_status=Case(
-            When(status='pendente', then=Value(1)),
-            When(status='em_progresso', then=Value(2)),
-            When(status='concluido', then=Value(3)),
-            default=Value(4),
-            output_field=IntegerField(),
-        )
-    )
-
+def filtrar_chamados(request, chamados_list):
+    """
+    Filtros do mecanico_dashboard (status, data, tipo_filtro), usados também na exportação.
+    Devolve (queryset, status, data, tipo) para a tela marcar o que está selecionado.
+    """
     status_filtro = request.GET.get('status')
     if status_filtro:
         chamados_list = chamados_list.filter(status=status_filtro)
@@ -258,108 +475,180 @@ def mecanico_dashboard(request):
     elif tipo_filtro == 'manual':
         chamados_list = chamados_list.filter(is_rotina=False)
 
+    return chamados_list, status_filtro, data_filtro, tipo_filtro
+
+
+@login_required
+def mecanico_dashboard(request):
+    # Orçamento de consultas (garantido em tests.py): sessão + usuário + contadores + página = 4,
+    # não importa quantos chamados existam nem quantos mecânicos cada um tenha
+    if not request.user.is_manutencao:
+        return redirect('dashboard')
+    
+    chamados_list, status_filtro, data_filtro, tipo_filtro = chamados_do_mecanico(request)
 
     # 1. Pega a ordem da URL sem dar um valor padrão (default) ainda
     ordem_selecionada = request.GET.get('ordem')
+    if ordem_selecionada not in ORDENS_PERMITIDAS:
+        ordem_selecionada = None
 
     base_ordem = ['ordem_status', '-producao_parada','-is_rotina','prioridade', '-criado_em'] # ordem padrão
     if ordem_selecionada:
         # Se o usuário clicou em algum filtro de ordenação (ex: data)
-        chamados_list = chamados_list.order_by(*base_ordem, ordem_selecionada, '-criado_em')
+        ordenacao = [*base_ordem, ordem_selecionada, '-criado_em']
     else:
         # Se ele não clicou em nada, usamos a Prioridade como critério seguinte
-        chamados_list = chamados_list.order_by(*base_ordem, 'prioridade', '-criado_em')
+        ordenacao = [*base_ordem, 'prioridade', '-criado_em']
 
     # 2. CALCULAR OS TOTAIS ANTES DA PAGINACÃO
-    pendentes = chamados_list.filter(status='pendente').count()
-    em_progresso = chamados_list.filter(status='em_progresso').count()
-    concluidos = chamados_list.filter(status='concluido').count()
+    totais = totais_do_mecanico(chamados_list)
 
-    # 3. APLICAR A PAGINACÃO
+    # 3. APLICAR A PAGINACÃO (o total do aggregate evita outro COUNT)
     itens_por_pagina = 12 
-    paginator = Paginator(chamados_list, itens_por_pagina)
-    
-    page_number = request.GET.get('page')
-    chamados_paginados = paginator.get_page(page_number)
+    chamados_paginados = paginar(request, chamados_list.for_listing(), ordenacao, itens_por_pagina, total=totais['total'])
 
     return render(request, 'manutencao/mecanico_dashboard.html', {
         'chamados': chamados_paginados, 
-        'pendentes': pendentes,
-        'em_progresso': em_progresso,
-        'concluidos': concluidos,
+        'pendentes': totais['pendentes'],
+        'em_progresso': totais['em_progresso'],
+        'concluidos': totais['concluidos'],
         'status_atual': status_filtro,
         'ordem_atual': ordem_selecionada,
         'data_atual': data_filtro, 
         'tipo_atual': tipo_filtro,
+        'ao_vivo': 'mecanico' if eventos_ativos() else '',
     })
 
 
+def chamados_do_mecanico(request):
+    """
+    Chamados que o mecanico_dashboard mostra para o usuário, já com os filtros da URL.
+    Devolve (queryset, status, data, tipo), como filtrar_chamados.
+    """
+    # --- LÓGICA DE PERMISSÃO ---
+    # EXISTS na tabela intermediária em vez de JOIN + DISTINCT: cada chamado aparece uma vez só
+    if request.user.tipo == 'mecanico_admin':
+        # Admin vê TUDO que ja tenha mecanicos atribuidos (removendo o filtro de mecanicos=request.user)
+        chamados_list = Chamado.objects.atribuidos()
+    else:
+        # Mecânico comum vê apenas os dele
+        chamados_list = Chamado.objects.atribuidos(mecanico=request.user)
+
+    # lógica de filtros continua IGUAL 
+    chamados_list = chamados_list.annotate(
+        ordem_status=Case(
+            When(status='pendente', then=Value(1)),
+            When(status='em_progresso', then=Value(2)),
+            When(status='concluido', then=Value(3)),
+            default=Value(4),
+            output_field=IntegerField(),
+        )
+    )
+
+    return filtrar_chamados(request, chamados_list)
+
+
+def totais_do_mecanico(chamados_list):
+    # Uma consulta só (COUNT com FILTER) para os três contadores e o total do paginador
+    return chamados_list.order_by().aggregate(
+        total=Count('id'),
+        pendentes=Count('id', filter=Q(status='pendente')),
+        em_progresso=Count('id', filter=Q(status='em_progresso')),
+        concluidos=Count('id', filter=Q(status='concluido')),
+    )
+
+
+@login_required
+def exportar_chamados(request):
+    """
+    Histórico de chamados em CSV, gerado enquanto é enviado: memória constante
+    e o primeiro byte sai na hora, mesmo com centenas de milhares de linhas.
+    Aceita os filtros do mecanico_dashboard e mais setor e período (inicio/fim).
+    """
+    if not request.user.is_manutencao:
+        return redirect('dashboard')
+
+    # Admin exporta tudo; mecânico só os chamados em que trabalhou
+    if request.user.tipo == 'mecanico_admin':
+        chamados = Chamado.objects.all()
+    else:
+        chamados = Chamado.objects.atribuidos(mecanico=request.user)
+    chamados, *_ = filtrar_chamados(request, chamados)
+
+    setor_id = request.GET.get('setor', '')
+    if setor_id.isdigit():
+        chamados = chamados.filter(Q(equipamento__setor_id=setor_id) | Q(setor_avulso_id=setor_id))
+    try:
+        if request.GET.get('inicio'):
+            inicio = datetime.strptime(request.GET['inicio'], '%Y-%m-%d').date()
+            chamados = chamados.filter(criado_em__date__gte=inicio)
+        if request.GET.get('fim'):
+            fim = datetime.strptime(request.GET['fim'], '%Y-%m-%d').date()
+            chamados = chamados.filter(criado_em__date__lte=fim)
+    except ValueError:
+        return HttpResponseBadRequest('Datas no formato AAAA-MM-DD')
+
+    response = StreamingHttpResponse(linhas_csv(chamados), content_type='text/csv; charset=utf-8')
+    nome = f"chamados_{timezone.localdate():%Y%m%d}{f'_setor{setor_id}' if setor_id.isdigit() else ''}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{nome}"'
+    response['X-Accel-Buffering'] = 'no'  # proxy repassa em partes em vez de juntar tudo
+    return response
+
+
 @login_required
 def historicos(request):
     if not request.user.is_manutencao:
         return redirect('dashboard')
     
     # Captura dos filtros do GET
-    lista_todos_setores = Setor.objects.all().order_by('nome')
-    setores = Setor.objects.all()
-    equipamentos = Equipamento.objects.all().select_related('energia', 'setor__energia')
+    lista_todos_setores = setores_ordenados()
     q = request.GET.get('q') or ''
     setor_id = request.GET.get('setor')
     status_filtro = request.GET.get('status')
+    if status_filtro not in dict(Chamado.STATUS_CHOICES):
+        status_filtro = None
 
-    # Se houver filtro de status
-    filtro_status_eq = Q(chamado__isnull=False)
-    filtro_status_st = Q(chamado__tipo='avulso')
-
+    # O último chamado de cada equipamento/setor já fica gravado neles (ultimos_chamados.py):
+    # cada lista é uma consulta só, ordenada por uma coluna indexada, sem GROUP BY em chamados
     if status_filtro:
-        filtro_status_eq &= Q(chamado__status=status_filtro)
-        filtro_status_st &= Q(chamado__status=status_filtro)
+        campo_eq, campo_st = f'ultimo_chamado_{status_filtro}', f'ultimo_avulso_{status_filtro}'
+        ordem_eq = F(f'{campo_eq}__criado_em').desc()
+        ordem_st = F(f'{campo_st}__criado_em').desc()
+    else:
+        campo_eq, campo_st = 'ultimo_chamado', 'ultimo_avulso'
+        ordem_eq = F('ultima_atividade').desc(nulls_last=True)
+        ordem_st = F('ultima_atividade_avulso').desc(nulls_last=True)
 
-    # 1. Anotações com filtro de status
-    equipamentos = equipamentos.annotate(
-        ultima_atividade=Max('chamado__criado_em', filter=filtro_status_eq)
-    )
+    equipamentos = Equipamento.objects.select_related('energia', 'setor__energia', campo_eq)
 
     if q:
-        equipamentos = equipamentos.filter(
-            Q(nome__icontains=q) | 
-            Q(codigo__icontains=q) |
-            Q(energia__numero__icontains=q) |
-            Q(setor__energia__numero__icontains=q)
-        ).distinct()
+        # Índice de busca (busca.py) em vez de uma cadeia de icontains que varre a tabela
+        equipamentos = equipamentos.filter(id__in=buscar_ids(q, 'equipamento'))
 
     if setor_id:
         equipamentos = equipamentos.filter(setor_id=setor_id)
     if status_filtro:
-        equipamentos = equipamentos.filter(ultima_atividade__isnull=False)
+        equipamentos = equipamentos.filter(**{f'{campo_eq}__isnull': False})
     # 2. Ordenamos pela atividade mais recente (quem teve chamado hoje aparece primeiro)
     # Usamos F() com nulls_last para garantir que quem nunca teve chamado fique por último
-    equipamentos = equipamentos.order_by(F('ultima_atividade').desc(nulls_last=True))[:10]
+    equipamentos = list(equipamentos.order_by(ordem_eq)[:10])
 
     # --- SETORES (Mesma lógica para os avulsos) ---
-    setores = setores.annotate(
-        ultima_atividade_avulso=Max('chamado__criado_em', filter=Q(chamado__tipo='avulso'))
-    )
+    setores = Setor.objects.select_related(campo_st)
 
     if setor_id:
         setores = setores.filter(id=setor_id)
     if status_filtro:
-        setores = setores.filter(ultima_atividade_avulso__isnull=False)
+        setores = setores.filter(**{f'{campo_st}__isnull': False})
+    setores = list(setores.order_by(ordem_st)[:10])
 
-    setores = setores.order_by(F('ultima_atividade_avulso').desc(nulls_last=True))[:10]
-    
     # --- PREENCHIMENTO PARA O TEMPLATE ---
-    for eq in equipamentos:
-        qs_chamados = Chamado.objects.filter(equipamento=eq)
-        if status_filtro:
-            qs_chamados = qs_chamados.filter(status=status_filtro)
-        eq.ultimo_chamado = qs_chamados.order_by('-criado_em').first()
-
-    for st in setores:
-        qs_avulsos = Chamado.objects.filter(setor_avulso=st, tipo='avulso')
-        if status_filtro:
-            qs_avulsos = qs_avulsos.filter(status=status_filtro)
-        st.ultimo_avulso = qs_avulsos.order_by('-criado_em').first()
+    # Com filtro de status o template mostra o último chamado daquele status
+    if status_filtro:
+        for eq in equipamentos:
+            eq.ultimo_chamado = getattr(eq, campo_eq)
+        for st in setores:
+            st.ultimo_avulso = getattr(st, campo_st)
 
     return render(request, 'manutencao/historicos.html', {
         'equipamentos': equipamentos,
@@ -371,21 +660,43 @@ def historicos(request):
     })
 
 
+@login_required
+def busca(request):
+    if not request.user.is_manutencao:
+        return redirect('dashboard')
+
+    q = (request.GET.get('q') or '').strip()
+    tipo = request.GET.get('tipo')
+    if tipo not in dict(DocumentoBusca.TIPO_CHOICES):
+        tipo = None
+    setor_id = request.GET.get('setor')
+    if not (setor_id or '').isdigit():
+        setor_id = None
+
+    # Resultados já ranqueados pelo banco (tsvector + trigramas no PostgreSQL, FTS5 no SQLite)
+    resultados = buscar(q, tipos=[tipo] if tipo else None, setor_id=setor_id, limite=50) if q else []
+
+    return render(request, 'manutencao/busca.html', {
+        'resultados': resultados,
+        'search_query': q,
+        'tipo_selecionado': tipo,
+        'setor_selecionado': setor_id,
+        'todos_setores': setores_ordenados(),
+    })
+
+
 @login_required
 def historico_equipamento(request, equipamento_id):
     if not request.user.is_manutencao:
         return redirect('dashboard')
     
-    equipamento = get_object_or_404(Equipamento, id=equipamento_id)
-    chamados_list = Chamado.objects.filter(equipamento=equipamento).order_by('-criado_em')
+    equipamento = get_object_or_404(Equipamento.objects.select_related('setor'), id=equipamento_id)
+    chamados_list = Chamado.objects.filter(equipamento=equipamento).for_listing(com_imagens=True).order_by('-criado_em')
     chamado_rotina = chamados_list.filter(is_rotina=True).first()  # Pega o chamado de rotina mais recente, se existir
     
-    # 1. APLICAR A PAGINACÃO
+    # 1. APLICAR A PAGINACÃO (por página ou por cursor, conforme PAGINACAO_MODO)
     itens_por_pagina = 12 
-    paginator = Paginator(chamados_list, itens_por_pagina)
-    
-    page_number = request.GET.get('page')
-    chamados_paginados = paginator.get_page(page_number)
+    chamados_paginados = paginar(request, chamados_list, ['-criado_em'], itens_por_pagina)
 
     return render(request, 'manutencao/historico_equipamento.html', {
         'equipamento': equipamento,
@@ -400,15 +711,12 @@ def historico_setor(request, setor_id):
     
     setor = get_object_or_404(Setor, id=setor_id)
     # Filtra apenas chamados do tipo avulso para este setor
-    chamados_list = Chamado.objects.filter(setor_avulso=setor, tipo='avulso').order_by('-criado_em')
+    chamados_list = Chamado.objects.filter(setor_avulso=setor, tipo='avulso').for_listing(com_imagens=True).order_by('-criado_em')
     chamado_rotina = chamados_list.filter(is_rotina=True).first()  # Pega o chamado de rotina mais recente, se existir
     
-    # 1. APLICAR A PAGINACÃO
+    # 1. APLICAR A PAGINACÃO (por página ou por cursor, conforme PAGINACAO_MODO)
     itens_por_pagina = 12 
-    paginator = Paginator(chamados_list, itens_por_pagina)
-    
-    page_number = request.GET.get('page')
-    chamados_paginados = paginator.get_page(page_number)
+    chamados_paginados = paginar(request, chamados_list, ['-criado_em'], itens_por_pagina)
 
     return render(request, 'manutencao/historico_setor.html', {
         'setor': setor,
@@ -422,6 +730,7 @@ def historico_setor(request, setor_id):
 def criar_chamado(request):
 
     equip_id_vinda_do_qr = request.GET.get('equip_id')
+    setor_inicial = None  # setor do equipamento do QR: o JS carrega o pacote dele direto
 
     if request.method == 'POST':
         form = ChamadoForm(request.POST, request.FILES)
@@ -437,20 +746,22 @@ def criar_chamado(request):
                 if setor_id:
                     chamado.setor_avulso_id = setor_id
             
-            # Agora o save() não vai mais falhar porque o solicitante_id não será NULL
-            chamado.save()
-            # vamos puxar a funcao de notificacao aqui, depois de salvar o
-            enviar_notificacao_ntfy(chamado, request.get_host())
-
-            # Salvar mecânicos (Muitos-para-Muitos)
-            mecanicos_ids = request.POST.getlist('mecanicos')
-            if mecanicos_ids:
-                chamado.mecanicos.set(mecanicos_ids)
-
-            # Salvar as múltiplas imagens do JavaScript
-            arquivos = request.FILES.getlist('imagens')
-            for f in arquivos:
-                ImagemChamado.objects.create(chamado=chamado, imagem=f)
+            with transaction.atomic():
+                # Agora o save() não vai mais falhar porque o solicitante_id não será NULL
+                chamado.save()
+                # vamos puxar a funcao de notificacao aqui, depois de salvar o chamado
+                # (vai para o outbox na mesma transação, o envio é feito pelo Celery)
+                enfileirar_notificacao_novo_chamado(chamado, request.get_host())
+
+                # Salvar mecânicos (Muitos-para-Muitos)
+                mecanicos_ids = request.POST.getlist('mecanicos')
+                if mecanicos_ids:
+                    chamado.mecanicos.set(mecanicos_ids)
+
+                # Salvar as múltiplas imagens do JavaScript
+                arquivos = request.FILES.getlist('imagens')
+                for f in arquivos:
+                    ImagemChamado.objects.create(chamado=chamado, imagem=f)
                 
             messages.success(request, "Chamado criado com sucesso!")
 
@@ -464,6 +775,7 @@ def criar_chamado(request):
         if equip_id_vinda_do_qr:
             # Busca o equipamento para descobrir o setor dele
             equipamento = Equipamento.objects.filter(id=equip_id_vinda_do_qr).first()
+            setor_inicial = equipamento.setor_id if equipamento else None
             
             initial_data = {
                 'equipamento': equip_id_vinda_do_qr,
@@ -479,15 +791,16 @@ def criar_chamado(request):
             # Só cria o form vazio se NÃO for QR Code
             form = ChamadoForm()
     #Deixando os campos mecanicos e setores fora do else pra eles carregarem mesmo se der erro no form    
-    mecanicos = Usuario.objects.filter(tipo='mecanico')
-    setores = Setor.objects.all()
+    mecanicos = lista_mecanicos('mecanico')
+    setores = setores_ordenados()
     equipamentos = Equipamento.objects.none() # Inicia vazio para não carregar tudo no início, e deixar pro JS carregar
 
     return render(request, 'manutencao/criar_chamado.html', {
         'form': form,
         'mecanicos': mecanicos,
         'setores': setores,
-        'equipamentos': equipamentos
+        'equipamentos': equipamentos,
+        'setor_inicial': setor_inicial,
     })
 
 
@@ -550,8 +863,8 @@ def gerenciar_setores(request):
     else:
         form = SetorForm()
     
-    total_setores = Setor.objects.count()
-    setores = Setor.objects.all().select_related('energia').order_by('nome')
+    setores = setores_ordenados()
+    total_setores = len(setores)
     return render(request, 'manutencao/gerenciar_setores.html', {
         'form': form,
         'setores': setores,
@@ -573,7 +886,7 @@ def editar_setor(request, pk):
         form = SetorForm(instance=setor)
 
     #busca todos os setores para a lista lateral não ficar vazia
-    setores = Setor.objects.all().order_by('nome')
+    setores = setores_ordenados()
     
     return render(request, 'manutencao/gerenciar_setores.html', {
         'form': form,
@@ -601,11 +914,7 @@ def gerenciar_equipamentos(request):
     # 2. Filtragem dos equipamentos
     equipamentos_list = Equipamento.objects.all().order_by('-id') # Adicionei order_by para os novos aparecerem primeiro
     if busca:
-        equipamentos_list = equipamentos_list.filter(
-            Q(nome__icontains=busca) | 
-            Q(codigo__icontains=busca) |
-            Q(energia__numero__icontains=busca)
-        )
+        equipamentos_list = equipamentos_list.filter(id__in=buscar_ids(busca, 'equipamento'))
     
     # 3. Paginação
     paginator = Paginator(equipamentos_list, 10)
@@ -628,17 +937,19 @@ def editar_equipamento(request, pk):
         return redirect('dashboard')
     
     equipamento = get_object_or_404(Equipamento, pk=pk)
-    imagem_antiga = equipamento.imagem # Guarda a referência antes de mudar
+    imagem_antiga = equipamento.imagem.name # Guarda a referência antes de mudar
     
     if request.method == 'POST':
         form = EquipamentoForm(request.POST, request.FILES, instance=equipamento)
         if form.is_valid():
-            # Se enviaram uma imagem nova E já existia uma antiga
+            form.save()
+
+            # Se enviaram uma imagem nova E já existia uma antiga, solta a referência
+            # (o storage só apaga o arquivo se nenhum outro registro usar a mesma foto).
+            # Mesmo com o mesmo nome: a mesma foto de novo somou uma referência ao blob
             if 'imagem' in request.FILES and imagem_antiga:
-                if os.path.exists(imagem_antiga.path):
-                    os.remove(imagem_antiga.path)
+                equipamento.imagem.storage.delete(imagem_antiga)
             
-            form.save()
             return redirect('gerenciar_equipamentos')
     else:
         form = EquipamentoForm(instance=equipamento)
@@ -647,11 +958,7 @@ def editar_equipamento(request, pk):
     
     equipamentos_list = Equipamento.objects.all().order_by('-id')
     if busca:
-        equipamentos_list = equipamentos_list.filter(
-            Q(nome__icontains=busca) | 
-            Q(codigo__icontains=busca) |
-            Q(energia__numero__icontains=busca)
-        )
+        equipamentos_list = equipamentos_list.filter(id__in=buscar_ids(busca, 'equipamento'))
 
     paginator = Paginator(equipamentos_list, 10)
     page_number = request.GET.get('page')
@@ -680,16 +987,62 @@ def gerenciar_energia(request):
     energias = Energia.objects.all().order_by('numero')
     return render(request, 'manutencao/gerenciar_energia.html', {'energias': energias})
 
-@login_required
-def get_equipamentos_por_setor(request, setor_id):
+def _equipamentos_json(setor_id):
     equipamentos = Equipamento.objects.filter(setor_id=setor_id).values('id', 'nome','codigo', 'imagem')
-    # Converter caminho da imagem para URL completa
+    # Converter caminho da imagem para URL (original + versões reduzidas). URLs relativas:
+    # o JSON fica em cache e atrás de ETag por setor, então não pode depender do host
     for eq in equipamentos:
         if eq['imagem']:
-            eq['imagem'] = request.build_absolute_uri('/media/' + eq['imagem'])
-    return JsonResponse(list(equipamentos), safe=False)
+            eq['imagem_mini'] = url_derivado(eq['imagem'], 'mini')
+            eq['imagem_media'] = url_derivado(eq['imagem'], 'medio')
+            eq['imagem'] = settings.MEDIA_URL + eq['imagem']
+    return list(equipamentos)
+
+
+def _etag_setor(request, setor_id):
+    # Só lê a versão do setor no cache: nenhuma consulta ao banco para responder 304
+    return etag(ns_setor(setor_id))
+
+
+def _etag_equipamento(request, pk):
+    # Sem permissão não há ETag: o @condition não responde 304 e a view devolve o 403
+    if not request.user.is_manutencao:
+        return None
+    return etag(ns_equipamento(pk))
+
+
+# Respostas condicionais: o navegador guarda o JSON e sempre revalida (no-cache) com
+# If-None-Match; enquanto o setor não muda, a resposta é um 304 sem corpo
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_setor)
+def get_equipamentos_por_setor(request, setor_id):
+    # Mesmo quando muda, a lista é montada uma vez por versão
+    equipamentos = obter_do_cache((ns_setor(setor_id),), 'equipamentos_setor',
+                                  lambda: _equipamentos_json(setor_id), setor_id)
+    return JsonResponse(equipamentos, safe=False)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_setor)
+def api_pacote_setor(request, setor_id):
+    """
+    Tudo que a tela de abrir chamado precisa de um setor numa chamada só:
+    o setor e os equipamentos com código e imagens (dispensa o /detalhes/ por equipamento).
+    """
+    def montar():
+        setor = get_object_or_404(Setor, pk=setor_id)
+        return {
+            'setor': {'id': setor.id, 'nome': setor.nome},
+            'equipamentos': [{**eq, 'setor_id': setor.id} for eq in _equipamentos_json(setor_id)],
+        }
+    return JsonResponse(obter_do_cache((ns_setor(setor_id),), 'pacote_setor', montar, setor_id))
+
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_equipamento)
 def api_detalhes_equipamento(request, pk):
     if not request.user.is_manutencao:
         return JsonResponse({'error': 'Acesso negado. Permissão insuficiente.'}, status=403)
@@ -698,11 +1051,57 @@ def api_detalhes_equipamento(request, pk):
     return JsonResponse({
         'id': equip.id,
         'nome': equip.nome,
-        'setor_id': equip.setor.id if equip.setor else None,
+        'setor_id': equip.setor_id,
         'imagem_url': equip.imagem.url if equip.imagem else None,
+        'imagem_media_url': url_derivado(equip.imagem.name, 'medio') if equip.imagem else None,
         'codigo': equip.codigo
     })
 
+@login_required
+def imagem_derivada(request, preset, nome):
+    if preset not in PRESETS:
+        raise Http404
+    
+    # Só gera derivado de arquivos que existem dentro do MEDIA_ROOT
+    try:
+        origem = safe_join(settings.MEDIA_ROOT, nome)
+    except ValueError:
+        raise Http404
+    if nome.startswith(PASTA_DERIVADOS) or not os.path.isfile(origem):
+        raise Http404
+
+    try:
+        caminho = obter_derivado(nome, preset)
+    except OSError:
+        raise Http404  # arquivo que não é imagem ou corrompido
+
+    # O nome da origem é o hash do conteúdo: o navegador pode guardar para sempre
+    nome_relativo = os.path.relpath(caminho, settings.MEDIA_ROOT)
+    return responder_arquivo(request, caminho, nome_relativo, cache_control='private, max-age=31536000, immutable')
+
+# Pastas que os ImageField gravam (upload_to). O resto do MEDIA_ROOT (checkpoint do
+# backfill, cache de derivados, arquivos ocultos) não é servido pelo /media/
+PASTAS_MIDIA = ('chamados', 'equipamentos')
+
+
+def _midia_publica(caminho):
+    partes = caminho.split('/')
+    return len(partes) > 1 and partes[0] in PASTAS_MIDIA and not any(parte.startswith('.') for parte in partes)
+
+
+@login_required
+def servir_midia(request, caminho):
+    # A permissão é conferida aqui; os bytes vão pelo nginx (X-Accel-Redirect) em produção
+    if not _midia_publica(caminho):
+        raise Http404
+    try:
+        arquivo = safe_join(settings.MEDIA_ROOT, caminho)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(arquivo):
+        raise Http404
+    return responder_arquivo(request, arquivo, caminho)
+
 @login_required
 def painel_qr_equipamento(request, pk):
     if not request.user.is_manutencao:
@@ -727,17 +1126,16 @@ def gerador_etiquetas(request):
     
     # pegam todos os setores únicos para preencher o select no HTML
 
-    # .values_list('setor', flat=True) traz uma lista simples de nomes
-    setores = Equipamento.objects.values('setor__id', 'setor__nome').distinct().order_by('setor__nome')
+    # (em cache; muda só quando setores/equipamentos mudam)
+    setores = setores_com_equipamentos()
 
-    host = request.get_host() 
-    for eq in equipamentos:
-        eq.link_qr = f"http://{host}/painel-qr/{eq.id}/"
-        
+    # Os QR codes são montados no template, dentro de um fragmento em cache:
+    # o queryset só é lido quando o fragmento precisa ser renderizado de novo
     context = {
         'equipamentos': equipamentos,
         'setores': setores,
-        'setor_selecionado': setor_filtrado
+        'setor_selecionado': setor_filtrado,
+        'host': request.get_host(),
     }
         
     return render(request, 'manutencao/gerador_etiquetas.html', context)